@@ -1,21 +1,97 @@
-from django.contrib import admin
+import datetime
+
+from django.contrib import admin, messages
+from django.db.models import Prefetch
+from django.forms.models import BaseInlineFormSet
+from django.urls import reverse
 
 # Register your models here.
 
 from .models import Author, Genre, Book, BookInstance, Language
+from .forms import validate_renewal_date
+from .pagination import EstimatedCountPaginator
+from . import loans
 
 
 #admin.site.register(Author)
 # admin.site.register(Book)
 # admin.site.register(BookInstance)
-admin.site.register(Genre)
 admin.site.register(Language)
 
+
+################################################################
+#有上限的inline：作者有上萬本書、一本書有幾千本副本的時候，編輯頁面只放前max_rows筆，
+#下面顯示總共幾筆，和一個只列出這些資料的changelist連結
+class BoundedInlineFormSet(BaseInlineFormSet):
+    max_rows = 20
+    admin_site_name = 'admin'
+
+    def get_queryset(self):
+        #同一個(切過的)queryset，len()和[i]共用同一次查詢的結果
+        if not hasattr(self, '_bounded_queryset'):
+            self._bounded_queryset = super().get_queryset()[:self.max_rows]
+        return self._bounded_queryset
+
+    @property
+    def total_count(self):
+        if not hasattr(self, '_total_count'):
+            shown = len(self.get_queryset())
+            #沒有滿max_rows就是全部了，不用再COUNT
+            self._total_count = super().get_queryset().count() if shown == self.max_rows else shown
+        return self._total_count
+
+    @property
+    def is_truncated(self):
+        return self.total_count > len(self.get_queryset())
+
+    def changelist_url(self):
+        opts = self.model._meta
+        return '{0}?{1}__{2}__exact={3}'.format(
+            reverse('{0}:{1}_{2}_changelist'.format(self.admin_site_name, opts.app_label, opts.model_name)),
+            self.fk.name, self.fk.target_field.name, self.instance.pk)
+
+
+class BoundedTabularInline(admin.TabularInline):
+    """
+    TabularInline showing at most `max_rows` related rows (ordered by
+    `ordering`, then pk), with the total count and a link to the filtered
+    changelist when there are more. New rows can still be added.
+    """
+    formset = BoundedInlineFormSet
+    template = 'admin/catalog/bounded_tabular.html'
+    max_rows = 20
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.max_rows = self.max_rows
+        formset.admin_site_name = self.admin_site.name
+        return formset
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        #切片之前要有固定的順序
+        return queryset.order_by(*(list(self.get_ordering(request) or queryset.query.order_by
+                                        or self.model._meta.ordering) + ['pk']))
+################################################################
+
+
+#Book的genre欄位用autocomplete，GenreAdmin要有search_fields
+@admin.register(Genre)
+class GenreAdmin(admin.ModelAdmin):
+    search_fields = ('name',)
+
 ################################################################
 #自行練習Author + BookInline的同時編輯
-class BookInline(admin.TabularInline):
+class BookInline(BoundedTabularInline):
     model = Book
     extra = 1
+    #每一列的種類不要各列一個<select>
+    autocomplete_fields = ('genre',)
+    ordering = ('title',)
+
+    def get_queryset(self, request):
+        #每一列表單的種類初始值從prefetch拿
+        return super().get_queryset(request).prefetch_related('genre')
 ################################################################
 
 
@@ -37,6 +113,13 @@ class AuthorAdmin(admin.ModelAdmin):
     #以下的方式，就可以把date_of_birth, date_of_death放在同一列
     fields = ['first_name', 'last_name', ('date_of_birth', 'date_of_death')]
 
+    #Book的author欄位用autocomplete，用這裡的search_fields搜尋
+    search_fields = ('last_name', 'first_name')
+    #不要為了「共幾筆」再對整張表COUNT(*)一次
+    show_full_result_count = False
+    #admin會在排序最後補上-pk，直接排id才能整個走author_name_idx(索引裡本來就有id)
+    ordering = ('last_name', 'first_name', 'id')
+
     #pass表示AuthorAdmin不變更原本Author類別的行為
     #當不打算變更原本Author類別的行為的時候，寫pass就可以了
     # pass
@@ -54,9 +137,15 @@ admin.site.register(Author, AuthorAdmin)
 #BooksInstanceInline:
 #這是讓Book可以同時跟BooksInstance
 #被編輯的大絕招，不用像以前那樣，自己要把Book跟BookInstance的PK關連起來才能顯示
-class BooksInstanceInline(admin.TabularInline):
+class BooksInstanceInline(BoundedTabularInline):
     model = BookInstance
     extra = 1
+    #不要每一列都列出全部使用者的<select>
+    autocomplete_fields = ('borrower',)
+
+    def get_queryset(self, request):
+        #每一列上面顯示的副本名稱(__str__)會用到book.title
+        return super().get_queryset(request).select_related('book')
 ################################################################
 
 ################################################################
@@ -79,6 +168,19 @@ class BookAdmin(admin.ModelAdmin):
     inlines = [BooksInstanceInline]    
     #pass
 
+    #每一列的author跟genre不要各查一次：author用JOIN，genre整頁一起查(display_genre()用的是prefetch的結果)
+    list_select_related = ('author',)
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    #幾百萬本書的時候不能把作者和種類全部列在<select>裡
+    autocomplete_fields = ('author', 'genre')
+    #BookInstance的book欄位用autocomplete搜尋書名；ISBN要完全一樣
+    search_fields = ('title', '=isbn')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(
+            Prefetch('genre', queryset=Genre.objects.only('id', 'name')))
+
 ################################################################
 
 
@@ -86,12 +188,53 @@ class BookAdmin(admin.ModelAdmin):
 #BookInstanceAdmin:
 # Register the Admin classes for BookInstance using the decorator
 
+#批次動作：勾選(或用右邊的過濾條件篩選後全選)的副本一次處理，每一批只下一個UPDATE
+def _report(modeladmin, request, results, done):
+    ok = sum(1 for result in results if result)
+    modeladmin.message_user(request, '{0} of {1} cop{2} {3}.'.format(ok, len(results), 'y' if len(results) == 1 else 'ies', done),
+                            messages.SUCCESS if ok else messages.WARNING)
+    #失敗的依原因統計，不要一筆一筆列出來
+    reasons = {}
+    for result in results:
+        if not result:
+            reasons[result.message] = reasons.get(result.message, 0) + 1
+    for message, count in reasons.items():
+        modeladmin.message_user(request, '{0}: {1}'.format(message, count), messages.WARNING)
+
+
+@admin.action(description='Renew selected loans for 3 weeks', permissions=['change'])
+def renew_loans(modeladmin, request, queryset):
+    due_back = datetime.date.today() + loans.DEFAULT_LOAN_PERIOD
+    validate_renewal_date(due_back)
+    _report(modeladmin, request, loans.bulk_renew(queryset, due_back, actor=request.user), 'renewed until {0}'.format(due_back))
+
+
+@admin.action(description='Mark selected copies available (returned)', permissions=['change'])
+def mark_available(modeladmin, request, queryset):
+    _report(modeladmin, request, loans.bulk_set_status(queryset, 'a', actor=request.user), 'marked available')
+
+
+@admin.action(description='Send selected copies to maintenance', permissions=['change'])
+def mark_maintenance(modeladmin, request, queryset):
+    _report(modeladmin, request, loans.bulk_set_status(queryset, 'm', actor=request.user), 'sent to maintenance')
+
+
 @admin.register(BookInstance) 
 class BookInstanceAdmin(admin.ModelAdmin):    
     #pass
     list_display = ('book', 'status','borrower', 'due_back', 'id')   
     #在畫面旁邊加入過濾條件的欄位
     list_filter = ('status', 'due_back')
+    actions = [renew_loans, mark_available, mark_maintenance]
+
+    #book跟borrower一起JOIN進來，不要每一列查兩次
+    list_select_related = ('book', 'borrower')
+    #副本是最大的表：沒有篩選的時候用估計的筆數，也不另外算全部筆數
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    #用bookinst_due_id_idx排序，不用把整張表排過一次
+    ordering = ('due_back', 'id')
+    autocomplete_fields = ('book', 'borrower')
 
     #fieldsets:
     #用來進階客製化的欄位排序以及大標題(大標題可以為空)（編輯資料時）
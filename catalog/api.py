@@ -0,0 +1,307 @@
+"""
+Read-only JSON API for the catalog (/catalog/api/<resource>/).
+
+    ?fields=title,author        only these fields (default: all of them)
+    ?include=author,genres      replace related ids by the related objects
+    ?ids=1,2,3                  just these rows (at most MAX_IDS), no pagination
+    ?cursor=...&limit=N         keyset pagination, see catalog/pagination.py
+
+Rows are read with .values(), never as model instances. Every field or
+include that needs another table costs one extra query per page, whatever
+the number of rows (a batched IN lookup, like prefetch_related does).
+Borrowers are never exposed.
+
+The API needs a logged-in user (the session cookie), like the dashboard and
+the author list: a whole table can be read a page at a time, which the HTML
+pages don't allow anonymously. Anonymous requests get 401.
+"""
+import functools
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse
+from django.utils.http import urlencode
+from django.views.decorators.http import require_safe
+
+from .models import Author, Book, BookInstance, Genre, Language
+from .pagination import InvalidCursor, KeysetPaginator, field_value
+from .routers import replica_reads
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+MAX_IDS = 100
+
+
+class ApiError(Exception):
+    """
+    Bad request parameters; answered with 400 and the message.
+    """
+
+
+class Resource:
+    """
+    Describes one API resource.
+
+    `fields` maps the JSON field name to the lookup used in .values(). Fields
+    that are not a column (many-to-many ids) are in `list_fields`, mapped to
+    the method that returns {pk: [ids]} for a list of pks. `includes` maps a
+    field name to (kind, resource name, lookup): 'one' replaces an id by the
+    object, 'many' replaces a list of ids by the objects and 'reverse' adds
+    the objects pointing at this row through `lookup`.
+    """
+    model = None
+    fields = {}
+    list_fields = {}
+    includes = {}
+    ordering = ('pk',)
+
+    def get_queryset(self):
+        return self.model.objects.all()
+
+    def all_fields(self):
+        return list(self.fields) + list(self.list_fields)
+
+    def parse_pk(self, value):
+        try:
+            return field_value(self.model._meta.pk, value)
+        except ValueError:
+            raise ApiError('Invalid id: {0}'.format(value))
+
+    def values(self, queryset, fields, extra=()):
+        """
+        queryset.values() with the columns of `fields`, plus the pk and the ordering columns.
+        """
+        lookups = [self.model._meta.pk.name] + [self.fields[name] for name in fields if name in self.fields]
+        #排序用的欄位也要查出來，分頁才算得出cursor
+        lookups += [name.lstrip('-') for name in self.ordering if name.lstrip('-') != 'pk']
+        return queryset.values(*dict.fromkeys(lookups + list(extra)))
+
+    def records(self, rows, fields, includes=()):
+        """
+        Turns rows of values() into the JSON objects, resolving list fields and includes.
+        """
+        pk_name = self.model._meta.pk.name
+        records = []
+        for row in rows:
+            record = {'id': row[pk_name]}
+            record.update((name, row[self.fields[name]]) for name in fields if name in self.fields)
+            records.append(record)
+        if not records:
+            return records
+        pks = [record['id'] for record in records]
+        for name in fields:
+            if name in self.list_fields:
+                values = getattr(self, self.list_fields[name])(pks)
+                for record in records:
+                    record[name] = values.get(record['id'], [])
+        for name in includes:
+            self._include(name, records)
+        return records
+
+    def serialize(self, queryset, fields, includes=()):
+        return self.records(list(self.values(queryset, fields)), fields, includes)
+
+    def _include(self, name, records):
+        kind, resource_name, lookup = self.includes[name]
+        resource = RESOURCES[resource_name]
+        fields = resource.all_fields()
+        if kind == 'reverse':
+            related = resource.get_queryset().filter(**{lookup + '__in': [record['id'] for record in records]})
+            rows = list(resource.values(related.order_by(*resource.ordering), fields, extra=[lookup]))
+            grouped = {}
+            for row, obj in zip(rows, resource.records(rows, fields)):
+                grouped.setdefault(row[lookup], []).append(obj)
+            for record in records:
+                record[name] = grouped.get(record['id'], [])
+            return
+
+        if kind == 'one':
+            ids = {record[name] for record in records if record[name] is not None}
+        else:
+            ids = {pk for record in records for pk in record[name]}
+        by_id = {obj['id']: obj for obj in resource.serialize(resource.get_queryset().filter(pk__in=ids), fields)}
+        for record in records:
+            if kind == 'one':
+                record[name] = by_id.get(record[name])
+            else:
+                record[name] = [by_id[pk] for pk in record[name] if pk in by_id]
+
+
+class BookResource(Resource):
+    model = Book
+    fields = {
+        'title': 'title',
+        'summary': 'summary',
+        'isbn': 'isbn',
+        'author': 'author_id',
+        'language': 'language_id',
+        'copies_available': 'copies_available',
+        'copies_on_loan': 'copies_on_loan',
+        'copies_maintenance': 'copies_maintenance',
+        'copies_reserved': 'copies_reserved',
+        'updated_at': 'updated_at',
+    }
+    list_fields = {'genres': 'genre_ids'}
+    includes = {
+        'author': ('one', 'authors', None),
+        'language': ('one', 'languages', None),
+        'genres': ('many', 'genres', None),
+        'copies': ('reverse', 'copies', 'book'),
+    }
+    ordering = ('title', 'pk')
+
+    def genre_ids(self, pks):
+        genres = {}
+        for book_id, genre_id in (Book.genre.through.objects.filter(book_id__in=pks).order_by('pk')
+                                  .values_list('book_id', 'genre_id')):
+            genres.setdefault(book_id, []).append(genre_id)
+        return genres
+
+
+class AuthorResource(Resource):
+    model = Author
+    fields = {
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+        'date_of_birth': 'date_of_birth',
+        'date_of_death': 'date_of_death',
+        'updated_at': 'updated_at',
+    }
+    includes = {'books': ('reverse', 'books', 'author')}
+    ordering = ('last_name', 'first_name', 'pk')
+
+
+class CopyResource(Resource):
+    model = BookInstance
+    #不公開借書人(borrower)
+    fields = {
+        'book': 'book_id',
+        'imprint': 'imprint',
+        'status': 'status',
+        'due_back': 'due_back',
+        'updated_at': 'updated_at',
+    }
+    includes = {'book': ('one', 'books', None)}
+
+
+class GenreResource(Resource):
+    model = Genre
+    fields = {'name': 'name'}
+    ordering = ('name', 'pk')
+
+
+class LanguageResource(Resource):
+    model = Language
+    fields = {'name': 'name'}
+    ordering = ('name', 'pk')
+
+
+RESOURCES = {
+    'books': BookResource(),
+    'authors': AuthorResource(),
+    'copies': CopyResource(),
+    'genres': GenreResource(),
+    'languages': LanguageResource(),
+}
+
+
+def _names(request, param, allowed):
+    value = request.GET.get(param, '')
+    names = [name for name in value.split(',') if name]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ApiError('Unknown {0}: {1}. Choose from: {2}.'.format(param, ', '.join(unknown), ', '.join(allowed)))
+    return names
+
+
+def _fields_and_includes(request, resource):
+    fields = _names(request, 'fields', resource.all_fields()) or resource.all_fields()
+    includes = _names(request, 'include', list(resource.includes))
+    #include的欄位一定要查出來
+    fields += [name for name in includes if name not in fields and name in resource.all_fields()]
+    return fields, includes
+
+
+def _page_url(request, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return request.path + '?' + urlencode(sorted(params.lists()), doseq=True)
+
+
+def _error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def api_login_required(view):
+    """
+    login_required for the API: 401 with a JSON error instead of a redirect to the login page.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return _error('Authentication required.', status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+@require_safe
+@api_login_required
+@replica_reads
+def resource_list(request, resource):
+    """
+    GET /catalog/api/<resource>/: a page of rows, or the rows given by ?ids=.
+    """
+    if resource not in RESOURCES:
+        return _error('Unknown resource: {0}'.format(resource), status=404)
+    resource = RESOURCES[resource]
+    try:
+        fields, includes = _fields_and_includes(request, resource)
+        if 'ids' in request.GET:
+            ids = [resource.parse_pk(value) for value in request.GET['ids'].split(',') if value]
+            if len(ids) > MAX_IDS:
+                raise ApiError('At most {0} ids per request.'.format(MAX_IDS))
+            records = resource.serialize(resource.get_queryset().filter(pk__in=ids), fields, includes)
+            #照ids的順序回傳，查不到的就略過
+            by_id = {record['id']: record for record in records}
+            return JsonResponse({'data': [by_id[pk] for pk in ids if pk in by_id]}, encoder=DjangoJSONEncoder)
+
+        try:
+            limit = min(int(request.GET.get('limit', PAGE_SIZE)), MAX_PAGE_SIZE)
+        except ValueError:
+            raise ApiError('limit must be a number.')
+        if limit < 1:
+            raise ApiError('limit must be at least 1.')
+        paginator = KeysetPaginator(resource.values(resource.get_queryset(), fields), limit, resource.ordering)
+        try:
+            #page()先用欄位檢查cursor裡的值，也在裡面把資料查完，錯的cursor都是InvalidCursor
+            page = paginator.page(request.GET.get('cursor'))
+        except InvalidCursor:
+            raise ApiError('Invalid cursor.')
+    except ApiError as e:
+        return _error(str(e))
+    return JsonResponse({
+        'data': resource.records(page.object_list, fields, includes),
+        'next': _page_url(request, page.next_cursor),
+        'previous': _page_url(request, page.previous_cursor),
+    }, encoder=DjangoJSONEncoder)
+
+
+@require_safe
+@api_login_required
+@replica_reads
+def resource_detail(request, resource, pk):
+    """
+    GET /catalog/api/<resource>/<pk>/: one row.
+    """
+    if resource not in RESOURCES:
+        return _error('Unknown resource: {0}'.format(resource), status=404)
+    resource = RESOURCES[resource]
+    try:
+        fields, includes = _fields_and_includes(request, resource)
+        records = resource.serialize(resource.get_queryset().filter(pk=resource.parse_pk(pk)), fields, includes)
+    except ApiError as e:
+        return _error(str(e))
+    if not records:
+        return _error('Not found.', status=404)
+    return JsonResponse({'data': records[0]}, encoder=DjangoJSONEncoder)
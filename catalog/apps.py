@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CatalogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'catalog'
+
+    def ready(self):
+        #載入signals.py、db.py、perf.py和slowlog.py，讓裡面的@receiver生效
+        from . import db, perf, signals, slowlog  # noqa: F401
@@ -0,0 +1,49 @@
+"""
+Helpers for running ORM queries from async views.
+
+Django 3.2 has no async ORM, so a query has to run in a thread. The default
+sync_to_async() runs everything in one shared thread, one call after the
+other. db_thread() instead gives every call its own worker thread (and
+database connection), so independent queries awaited with asyncio.gather()
+really run at the same time.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+
+def db_thread(func):
+    """
+    Wraps func so that calling it returns an awaitable running func in a worker thread.
+    The worker's connection is closed afterwards, or kept according to CONN_MAX_AGE.
+    """
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            #工作執行緒不會收到request_finished，要自己清連線
+            close_old_connections()
+    return sync_to_async(run, thread_sensitive=False)
+
+
+def set_prefetched(instance, name, objects):
+    """
+    Stores already fetched related objects on instance as if prefetch_related(name) had run,
+    so instance.<name>.all() in a template does not query again.
+    """
+    manager = getattr(instance, name)
+    objects = list(objects)
+    if hasattr(manager, 'prefetch_cache_name'):
+        #多對多
+        cache_name = manager.prefetch_cache_name
+    else:
+        #反向外鍵(例如book.bookinstance_set)：每個副本的copy.book也直接指回instance
+        cache_name = manager.field.remote_field.get_cache_name()
+        for obj in objects:
+            manager.field.set_cached_value(obj, instance)
+    queryset = manager.get_queryset()
+    queryset._result_cache = objects
+    queryset._prefetch_done = True
+    instance.__dict__.setdefault('_prefetched_objects_cache', {})[cache_name] = queryset
@@ -0,0 +1,156 @@
+"""
+Async variants of the read-only catalog views, for the ASGI deployment
+(locallibrary/asgi.py). They are routed under /catalog/async/ and render
+the same templates as the views in catalog/views.py.
+
+The queries a page needs that do not depend on each other (the dashboard
+counters, a book and its copies and genres, a page of rows and the total
+count) are started together with asyncio.gather(), each in its own thread
+(see catalog/async_utils.py), instead of one after the other. Template
+rendering, sessions and request.user stay in the regular sync thread.
+
+These views do not use the ETag/page cache of CachedPageMixin. Like the
+sync catalog pages, they read from a replica when there is one
+(catalog/routers.py).
+"""
+import asyncio
+import functools
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.http import Http404
+from django.shortcuts import render
+
+from .async_utils import db_thread, set_prefetched
+from .models import Author, Book, BookInstance, Genre
+from .pagination import InvalidCursor, KeysetPaginator
+from .routers import replica_reads
+from .search import SearchResults
+from .stats import aget_dashboard_counts
+from .visits import count_visit, remember_visit
+
+PAGE_SIZE = 10
+
+_render = sync_to_async(render)
+
+
+def async_login_required(view):
+    """
+    login_required for async views (the one in django.contrib.auth only wraps sync views in 3.2).
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not await sync_to_async(lambda: request.user.is_authenticated)():
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+@async_login_required
+async def index(request):
+    """
+    Async view function for home page of site.
+    """
+    counts, num_visits = await asyncio.gather(aget_dashboard_counts(), sync_to_async(count_visit)(request))
+    response = await _render(request, 'index.html', context=dict(counts, num_visits=num_visits))
+    return remember_visit(request, response)
+
+
+async def _paginate(request, queryset, ordering=None, clamp=False):
+    """
+    Returns the template context of a paginated list: ?page=N (rows and total count
+    queried at the same time), or ?cursor= keyset pages when ordering is given.
+    A bad or out of range ?page= is a 404 like in ListView, or with `clamp` the
+    first/last page like Paginator.get_page() (used by the sync search view).
+    """
+    if ordering and 'cursor' in request.GET:
+        with_count = request.GET.get('count') == '1'
+        paginator = KeysetPaginator(queryset, PAGE_SIZE, ordering)
+        get_page = db_thread(lambda: paginator.page(request.GET['cursor']))
+        count = db_thread(queryset.count)() if with_count else asyncio.sleep(0)
+        try:
+            page, total = await asyncio.gather(get_page(), count)
+        except InvalidCursor:
+            raise Http404('Invalid cursor.')
+        if with_count:
+            paginator.with_count, paginator._count = True, total
+    else:
+        if ordering:
+            queryset = queryset.order_by(*KeysetPaginator(queryset, PAGE_SIZE, ordering).order_by_expressions())
+        paginator = Paginator(queryset, PAGE_SIZE)
+        try:
+            number = int(request.GET.get('page') or 1)
+        except ValueError:
+            if not clamp:
+                raise Http404('Invalid page.')
+            number = 1
+        rows_of = db_thread(lambda number: list(queryset[(number - 1) * PAGE_SIZE:number * PAGE_SIZE]))
+        rows, total = await asyncio.gather(rows_of(max(number, 1)), db_thread(queryset.count)())
+        #總數已經查好了，Paginator不用再COUNT一次
+        paginator.__dict__['count'] = total
+        try:
+            page = Page(rows, paginator.validate_number(number), paginator)
+        except InvalidPage:
+            if not clamp:
+                raise Http404('Invalid page.')
+            #超出範圍就顯示最後一頁，要再查一次那一頁的資料
+            page = Page(await rows_of(paginator.num_pages), paginator.num_pages, paginator)
+    return {
+        'paginator': paginator,
+        'page_obj': page,
+        'is_paginated': page.has_other_pages(),
+        'object_list': page.object_list,
+    }
+
+
+@replica_reads
+async def book_list(request):
+    context = await _paginate(request, Book.objects.select_related('author'), ('title', 'pk'))
+    context['book_list'] = context['object_list']
+    return await _render(request, 'catalog/book_list.html', context)
+
+
+@async_login_required
+@replica_reads
+async def author_list(request):
+    context = await _paginate(request, Author.objects.all(), ('last_name', 'first_name', 'id'))
+    context['author_list'] = context['object_list']
+    return await _render(request, 'catalog/author_list.html', context)
+
+
+@replica_reads
+async def book_detail(request, pk):
+    book, copies, genres = await asyncio.gather(
+        db_thread(Book.objects.select_related('author', 'language').filter(pk=pk).first)(),
+        db_thread(lambda: list(BookInstance.objects.filter(book_id=pk)))(),
+        db_thread(lambda: list(Genre.objects.filter(book=pk)))(),
+    )
+    if book is None:
+        raise Http404('No book found matching the query')
+    set_prefetched(book, 'bookinstance_set', copies)
+    set_prefetched(book, 'genre', genres)
+    return await _render(request, 'catalog/book_detail.html', {'book': book, 'object': book})
+
+
+@replica_reads
+async def author_detail(request, pk):
+    author, books = await asyncio.gather(
+        db_thread(Author.objects.filter(pk=pk).first)(),
+        db_thread(lambda: list(Book.objects.filter(author_id=pk).only('id', 'author_id', 'title', 'summary')))(),
+    )
+    if author is None:
+        raise Http404('No author found matching the query')
+    set_prefetched(author, 'book_set', books)
+    return await _render(request, 'catalog/author_detail.html', {'author': author, 'object': author})
+
+
+@replica_reads
+async def search(request):
+    query = request.GET.get('q', '').strip()
+    context = await _paginate(request, SearchResults(query), clamp=True)
+    return await _render(request, 'catalog/search_results.html', {
+        'query': query,
+        'page_obj': context['page_obj'],
+        'hits': context['object_list'],
+    })
@@ -0,0 +1,314 @@
+"""
+Page benchmarks (used by the bench_catalog, bench_visits and bench_change_forms commands).
+
+Every named URL of catalog/urls.py and the changelist of every model in
+the admin is requested through the Django test client as a superuser.
+No server or network is involved. Each URL gets:
+- one cold request: empty cache, and its number of queries is counted;
+- `repeat` warm requests, reported as p50/p95/max.
+URLs that need an object (a book, an on-loan copy, ...) use the first
+matching row; they are skipped when there is none.
+
+The results are plain dicts in a fixed order, so the JSON of two commits
+can be diffed. Run it on a scratch database filled by seeding.py.
+
+The cold requests empty the whole cache first. With a cache shared by
+other processes (Redis, files) that would also drop their sessions and
+cached pages, so it is refused unless flush_cache is True
+("--flush-cache"); better point DJANGO_CACHE_BACKEND at locmem.
+
+run_visits() requests the home page with each visit counter engine
+(catalog/visits.py) and counts the writes per request. run_change_forms()
+times the admin change forms of an author with thousands of books and of
+a book with thousands of copies ("manage.py bench_change_forms").
+"""
+import datetime
+import os
+import platform
+import subprocess
+import time
+
+import django
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, reset_queries
+from django.db.models import F
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from .counters import STATUS_COUNTER_FIELDS
+from .models import Author, Book, BookInstance, FacetCount
+from .seeding import seed_catalog
+from .visits import ENGINES
+
+BENCH_USERNAME = 'bench-admin'
+#run_change_forms()的作者
+PROLIFIC_AUTHOR = {'first_name': 'Prolific', 'last_name': 'Benchmark'}
+PAGE_SIZE = 10
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+#只屬於這個process的cache，clear()不會清到別人的資料
+LOCAL_CACHE_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache')
+
+
+def _sample():
+    """
+    The rows the URLs with parameters are built from.
+    """
+    book = Book.objects.order_by('pk').values_list('pk', 'title').first()
+    return {
+        'book': book[0] if book else None,
+        'word': book[1].split()[0] if book else 'book',
+        'author': Author.objects.order_by('pk').values_list('pk', flat=True).first(),
+        #書最多的種類跟語言
+        'genre': FacetCount.objects.filter(language=None, genre__isnull=False).order_by('-books').values_list('genre_id', flat=True).first(),
+        'language': FacetCount.objects.filter(genre=None, language__isnull=False).order_by('-books').values_list('language_id', flat=True).first(),
+        'copy': BookInstance.objects.filter(status='o').order_by('pk').values_list('pk', flat=True).first(),
+        #中間那一頁：OFFSET分頁最慢的情況之一
+        'book_page': Book.objects.count() // PAGE_SIZE // 2 + 1,
+        'author_page': Author.objects.count() // PAGE_SIZE // 2 + 1,
+    }
+
+
+def _url(name, args=(), query=''):
+    return reverse(name, args=args) + ('?' + query if query else '')
+
+
+def _with(key, make):
+    return lambda sample: make(sample[key]) if sample[key] is not None else None
+
+
+#url name(或是name:變化) => 由sample算出網址，None表示缺資料跳過
+CATALOG_CASES = (
+    ('index', lambda sample: _url('index')),
+    ('books', lambda sample: _url('books')),
+    ('books:middle-page', lambda sample: _url('books', query='page={0}'.format(sample['book_page']))),
+    ('books:language', _with('language', lambda pk: _url('books', query='language={0}'.format(pk)))),
+    ('genre-detail', _with('genre', lambda pk: _url('genre-detail', [pk]))),
+    ('genre-detail:language', lambda sample: _url('genre-detail', [sample['genre']], 'language={0}'.format(sample['language']))
+     if sample['genre'] is not None and sample['language'] is not None else None),
+    ('book-detail', _with('book', lambda pk: _url('book-detail', [pk]))),
+    ('author-detail', _with('author', lambda pk: _url('author-detail', [pk]))),
+    ('renew-book-librarian', _with('copy', lambda pk: _url('renew-book-librarian', [pk]))),
+    ('my-borrowed', lambda sample: _url('my-borrowed')),
+    ('all-borrowed', lambda sample: _url('all-borrowed')),
+    ('overdue-borrowed', lambda sample: _url('overdue-borrowed')),
+    ('renew-books-bulk', lambda sample: _url('renew-books-bulk')),
+    ('renew-book-librarian-modelform', _with('copy', lambda pk: _url('renew-book-librarian-modelform', [pk]))),
+    ('author_create', lambda sample: _url('author_create')),
+    ('author_update', _with('author', lambda pk: _url('author_update', [pk]))),
+    ('author_delete', _with('author', lambda pk: _url('author_delete', [pk]))),
+    ('authors', lambda sample: _url('authors')),
+    ('authors:middle-page', lambda sample: _url('authors', query='page={0}'.format(sample['author_page']))),
+    ('search', lambda sample: _url('search', query='q={0}'.format(sample['word']))),
+    ('export-books', lambda sample: _url('export-books', ['ndjson'])),
+    ('api-list', lambda sample: _url('api-list', ['books'])),
+    ('api-list:include', lambda sample: _url('api-list', ['books'], 'include=author,genres,copies')),
+    ('api-detail', _with('book', lambda pk: _url('api-detail', ['books', pk]))),
+    ('async-index', lambda sample: _url('async-index')),
+    ('async-books', lambda sample: _url('async-books')),
+    ('async-book-detail', _with('book', lambda pk: _url('async-book-detail', [pk]))),
+    ('async-authors', lambda sample: _url('async-authors')),
+    ('async-author-detail', _with('author', lambda pk: _url('async-author-detail', [pk]))),
+    ('async-search', lambda sample: _url('async-search', query='q={0}'.format(sample['word']))),
+)
+
+
+def cases(sample):
+    """
+    [(name, url or None)] for the catalog pages and the admin changelists.
+    """
+    result = [(name, make(sample)) for name, make in CATALOG_CASES]
+    for model in sorted(admin.site._registry, key=lambda model: model._meta.label):
+        name = 'admin:{0}_{1}_changelist'.format(model._meta.app_label, model._meta.model_name)
+        result.append((name, reverse(name)))
+    return result
+
+
+def _percentile(timings, p):
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(len(timings) * p / 100.0))]
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+def _get(client, url):
+    started = time.perf_counter()
+    response = client.get(url)
+    if response.streaming:
+        #串流的回應要讀完才算
+        for chunk in response.streaming_content:
+            pass
+    return response, time.perf_counter() - started
+
+
+def _writes(queries):
+    return sum(1 for query in queries if query['sql'].lstrip().upper().startswith(WRITE_STATEMENTS))
+
+
+def check_cache(flush_cache=False):
+    """
+    Raises ValueError if the cold requests would clear a cache other processes use, unless flush_cache is True.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if backend not in LOCAL_CACHE_BACKENDS and not flush_cache:
+        raise ValueError('The benchmark clears the whole cache ({0}), which other processes share. Use the '
+                         'locmem cache (DJANGO_CACHE_BACKEND=locmem) or pass --flush-cache.'.format(backend))
+
+
+def time_url(client, name, url, repeat=5):
+    """
+    Returns the result dict of one URL: status, queries and timings in milliseconds.
+    """
+    if url is None:
+        return {'name': name, 'url': None, 'skipped': 'no row to build the URL from'}
+    cache.clear()
+    #request_started會清空queries_log，從0開始算才不會漏掉
+    reset_queries()
+    with CaptureQueriesContext(connection) as queries:
+        response, cold = _get(client, url)
+    #下一個請求又會清空queries_log，先記下數量
+    query_count, write_count = len(queries), _writes(queries)
+    timings = [_get(client, url)[1] for _ in range(repeat)] or [cold]
+    return {
+        'name': name,
+        'url': url,
+        'status': response.status_code,
+        'queries': query_count,
+        'writes': write_count,
+        'bytes': 0 if response.streaming else len(response.content),
+        'cold_ms': _ms(cold),
+        'p50_ms': _ms(_percentile(timings, 50)),
+        'p95_ms': _ms(_percentile(timings, 95)),
+        'max_ms': _ms(max(timings)),
+    }
+
+
+def run_visits(engines=ENGINES, requests=50):
+    """
+    Requests the home page `requests` times with each visit counter engine (catalog/visits.py)
+    and returns the queries and writes per request and the timings of each engine.
+    """
+    results = []
+    for engine in engines:
+        with _bench_settings(VISIT_COUNTER=engine):
+            client = _client()
+            #第一次有dashboard計數器要算，不列入
+            client.get(reverse('index'))
+            queries = writes = 0
+            timings = []
+            for _ in range(requests):
+                reset_queries()
+                with CaptureQueriesContext(connection) as captured:
+                    timings.append(_get(client, reverse('index'))[1])
+                queries += len(captured)
+                writes += _writes(captured)
+        results.append({
+            'engine': engine,
+            'requests': requests,
+            'queries_per_request': round(queries / float(requests), 2),
+            'writes_per_request': round(writes / float(requests), 2),
+            'p50_ms': _ms(_percentile(timings, 50)),
+            'p95_ms': _ms(_percentile(timings, 95)),
+        })
+    return results
+
+
+def run_change_forms(books=10000, copies=5000, repeat=5, flush_cache=False):
+    """
+    Times the admin change form of an author with `books` books and of the
+    book of that author with the most copies (about `copies`). They are
+    seeded the first time (use a scratch database).
+    """
+    check_cache(flush_cache)
+    author, created = Author.objects.get_or_create(**PROLIFIC_AUTHOR)
+    total_copies = sum((F(field) for field in STATUS_COUNTER_FIELDS.values()), 0)
+    books_of_author = Book.objects.filter(author=author).annotate(total_copies=total_copies)
+    book = books_of_author.order_by('-total_copies').first()
+    if book is None or book.total_copies < copies:
+        seed_catalog(1, copies_per_book=copies, users=10, author_id=author.pk)
+    missing = books - books_of_author.count()
+    if missing > 0:
+        seed_catalog(missing, copies_per_book=1, users=10, author_id=author.pk)
+    book = books_of_author.order_by('-total_copies').first()
+
+    client = _client()
+    with _bench_settings():
+        results = [
+            dict(time_url(client, 'admin:catalog_author_change', reverse('admin:catalog_author_change', args=[author.pk]),
+                          repeat), rows=Book.objects.filter(author=author).count()),
+            dict(time_url(client, 'admin:catalog_book_change', reverse('admin:catalog_book_change', args=[book.pk]),
+                          repeat), rows=book.total_copies),
+        ]
+    return results
+
+
+def row_counts():
+    return {
+        'books': Book.objects.count(),
+        'copies': BookInstance.objects.count(),
+        'authors': Author.objects.count(),
+        'users': User.objects.count(),
+    }
+
+
+def _client():
+    user = User.objects.filter(username=BENCH_USERNAME).first()
+    if user is None:
+        user = User.objects.create_superuser(BENCH_USERNAME, BENCH_USERNAME + '@example.com', None)
+    client = Client()
+    client.force_login(user)
+    return client
+
+
+def _bench_settings(**options):
+    #DEBUG會把每個查詢都記在connection.queries裡，量出來會偏慢
+    return override_settings(DEBUG=False, ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ['testserver'], **options)
+
+
+def run_pages(repeat=5, only=None, flush_cache=False):
+    """
+    Times the pages on the current database. `only` limits the run to these names.
+    """
+    check_cache(flush_cache)
+    client = _client()
+    results = []
+    with _bench_settings():
+        for name, url in cases(_sample()):
+            if only and name not in only:
+                continue
+            results.append(time_url(client, name, url, repeat))
+    return {'rows': row_counts(), 'results': results}
+
+
+def metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'commit': commit,
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'database': connection.vendor,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(old, new):
+    """
+    Yields (books, name, old p50, new p50) for the results that are in both runs.
+    """
+    old_runs = {run['rows']['books']: {result['name']: result for result in run['results']} for run in old['runs']}
+    for run in new['runs']:
+        previous = old_runs.get(run['rows']['books'], {})
+        for result in run['results']:
+            before = previous.get(result['name'])
+            if before and 'p50_ms' in before and 'p50_ms' in result:
+                yield run['rows']['books'], result['name'], before['p50_ms'], result['p50_ms']
@@ -0,0 +1,132 @@
+"""
+Redis cache backend for Django 3.2 (Django only ships one from 4.0 on).
+
+    CACHES = {'default': {
+        'BACKEND': 'catalog.cache_backends.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379/0',
+    }}
+
+It needs the `redis` package, unless OPTIONS['CLIENT_CLASS'] points to
+another client with the same interface (the tests use
+catalog.testing.FakeRedis). Integers are stored as plain numbers so that
+incr() is atomic on the server; everything else is pickled.
+"""
+import pickle
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.functional import cached_property
+from django.utils.module_loading import import_string
+
+
+class RedisCache(BaseCache):
+
+    def __init__(self, server, params):
+        super().__init__(params)
+        self._server = server.split(',')[0] if isinstance(server, str) else server[0]
+        self._options = params.get('OPTIONS', {})
+
+    @cached_property
+    def _client(self):
+        options = dict(self._options)
+        client_class = options.pop('CLIENT_CLASS', None)
+        if client_class is None:
+            try:
+                import redis
+            except ImportError:
+                raise ImproperlyConfigured('The Redis cache backend needs the "redis" package (pip install redis).')
+            return redis.Redis.from_url(self._server, **options)
+        return import_string(client_class).from_url(self._server, **options)
+
+    def get_backend_timeout(self, timeout=DEFAULT_TIMEOUT):
+        """
+        Seconds until expiry for redis (None = forever), instead of an absolute time.
+        """
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return None if timeout is None else max(0, int(timeout))
+
+    def _dumps(self, value):
+        #bool也是int，但要原樣取回來，所以只有真正的int存成數字
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    def _loads(self, value):
+        try:
+            return int(value)
+        except ValueError:
+            return pickle.loads(value)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self.get_backend_timeout(timeout)
+        if timeout == 0:
+            return False
+        return bool(self._client.set(self._key(key, version), self._dumps(value), ex=timeout, nx=True))
+
+    def get(self, key, default=None, version=None):
+        value = self._client.get(self._key(key, version))
+        return default if value is None else self._loads(value)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        timeout = self.get_backend_timeout(timeout)
+        if timeout == 0:
+            self._client.delete(key)
+        else:
+            self._client.set(key, self._dumps(value), ex=timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is None:
+            return bool(self._client.persist(key))
+        return bool(self._client.expire(key, timeout))
+
+    def delete(self, key, version=None):
+        return bool(self._client.delete(self._key(key, version)))
+
+    def has_key(self, key, version=None):
+        return bool(self._client.exists(self._key(key, version)))
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        if not self._client.exists(key):
+            raise ValueError("Key '%s' not found." % key)
+        return self._client.incrby(key, delta)
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = self._client.mget([self._key(key, version) for key in keys])
+        return {key: self._loads(value) for key, value in zip(keys, values) if value is not None}
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self.get_backend_timeout(timeout)
+        #一次送出，不用每個key來回一趟
+        pipeline = self._client.pipeline()
+        for key, value in data.items():
+            if timeout == 0:
+                pipeline.delete(self._key(key, version))
+            else:
+                pipeline.set(self._key(key, version), self._dumps(value), ex=timeout)
+        pipeline.execute()
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self._client.delete(*keys)
+
+    def clear(self):
+        self._client.flushdb()
+
+    def close(self, **kwargs):
+        #redis-py自己有connection pool，不用每個request關掉
+        pass
@@ -0,0 +1,79 @@
+"""
+cached_query(): caches the result of an expensive query without letting
+many workers recompute it at the same time (cache stampede).
+
+- Versioned keys: pass the version of the data (see catalog/versions.py)
+  and a change simply makes a new key; nothing has to be deleted.
+- Probabilistic early expiration ("XFetch"): shortly before an entry
+  expires, a random reader recomputes it while the others keep using the
+  cached value. The longer the computation takes, the earlier this starts.
+- Single flight: on a miss only the worker that gets the lock (cache.add)
+  computes. The others get the last value computed for the same key (any
+  version) or wait for the winner, so an invalidated hot key costs one
+  query instead of one per worker.
+
+The lock and the stale value live in the cache itself, so this works across
+processes as long as the cache is shared (file or Redis, see CACHES in the
+settings). With locmem it only protects the threads of one process.
+"""
+import math
+import random
+import time
+
+from django.core.cache import cache
+
+LOCK_SUFFIX = ':lock'
+STALE_SUFFIX = ':stale'
+#沒有version的最後一個結果要留比較久，重算的時候拿來先頂著
+STALE_TIMEOUT_FACTOR = 10
+
+
+def _versioned_key(key, version):
+    return key if version is None else '{0}:v{1}'.format(key, version)
+
+
+def _recompute(key, full_key, compute, timeout):
+    started = time.time()
+    try:
+        value = compute()
+        delta = time.time() - started
+        cache.set(full_key, (value, delta, time.time() + timeout), timeout)
+        cache.set(key + STALE_SUFFIX, value, timeout * STALE_TIMEOUT_FACTOR)
+        return value
+    finally:
+        cache.delete(full_key + LOCK_SUFFIX)
+
+
+def cached_query(key, compute, timeout=300, version=None, beta=1.0, lock_timeout=10, wait=2.0):
+    """
+    Returns compute(), cached for `timeout` seconds under key and version.
+
+    beta > 1 favours earlier recomputation, 0 turns it off. A worker that lost the
+    race for the lock and has no stale value waits up to `wait` seconds for the
+    winner before computing the value itself.
+    """
+    full_key = _versioned_key(key, version)
+    lock_key = full_key + LOCK_SUFFIX
+    entry = cache.get(full_key)
+    if entry is not None:
+        value, delta, expires = entry
+        #-log(0~1]是0以上的隨機數，離到期越近、上次算越久，越有可能提早重算
+        if time.time() - delta * beta * math.log(1 - random.random()) < expires:
+            return value
+        if not cache.add(lock_key, 1, lock_timeout):
+            #別人已經在重算了
+            return value
+        return _recompute(key, full_key, compute, timeout)
+
+    if cache.add(lock_key, 1, lock_timeout):
+        return _recompute(key, full_key, compute, timeout)
+    stale = cache.get(key + STALE_SUFFIX)
+    if stale is not None:
+        return stale
+    deadline = time.time() + wait
+    while time.time() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(full_key)
+        if entry is not None:
+            return entry[0]
+    return compute()
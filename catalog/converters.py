@@ -0,0 +1,14 @@
+from django.urls.converters import IntConverter
+
+
+class IdConverter(IntConverter):
+    """
+    Like <int:...>, but only matches ids that fit a 64-bit integer column.
+    """
+
+    def to_python(self, value):
+        value = int(value)
+        #SQLite查詢超過64位元的整數會OverflowError(500)，ValueError讓這個url不符合，回404
+        if value >= 2 ** 63:
+            raise ValueError(value)
+        return value
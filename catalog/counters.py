@@ -0,0 +1,105 @@
+"""
+Maintenance of the denormalized per-status copy counters on Book
+(copies_available, copies_on_loan, copies_maintenance, copies_reserved).
+
+The signal handlers in catalog/signals.py call apply_copy_transition()
+whenever a BookInstance is created, changes status/book or is deleted.
+Code that changes BookInstance rows with QuerySet.update() or
+bulk_create() bypasses the signals and must call these functions itself
+(or rebuild_copy_counts() afterwards).
+"""
+from django.db.models import Count, F
+
+from .models import Book, BookInstance
+
+#BookInstance.status的代碼 => Book上面對應的計數欄位
+#status可以是空白''，空白的副本不算在任何一個欄位裡
+STATUS_COUNTER_FIELDS = {
+    'a': 'copies_available',
+    'o': 'copies_on_loan',
+    'm': 'copies_maintenance',
+    'r': 'copies_reserved',
+}
+
+
+def _shift(book_id, status, delta):
+    field = STATUS_COUNTER_FIELDS.get(status)
+    if book_id is None or field is None or delta == 0:
+        return
+    Book.objects.filter(pk=book_id).update(**{field: F(field) + delta})
+
+
+def apply_copy_transition(old_book_id, old_status, new_book_id, new_status, count=1):
+    """
+    Moves `count` copies from (old_book_id, old_status) to (new_book_id, new_status).
+    Use None for the old side when copies were created and for the new side when
+    they were deleted.
+    """
+    if (old_book_id, old_status) == (new_book_id, new_status):
+        return
+    _shift(old_book_id, old_status, -count)
+    _shift(new_book_id, new_status, count)
+
+
+def count_copies(book_ids=None):
+    """
+    Counts the copies per book and status straight from BookInstance.
+    Returns {book_id: {counter_field: n}}.
+    """
+    rows = BookInstance.objects.exclude(book=None)
+    if book_ids is not None:
+        rows = rows.filter(book_id__in=book_ids)
+    counts = {}
+    for row in rows.values('book_id', 'status').annotate(n=Count('pk')).order_by():
+        field = STATUS_COUNTER_FIELDS.get(row['status'])
+        if field:
+            counts.setdefault(row['book_id'], {})[field] = row['n']
+    return counts
+
+
+def _book_id_batches(batch_size, book_ids=None):
+    books = Book.objects.order_by('pk')
+    if book_ids is not None:
+        books = books.filter(pk__in=book_ids)
+    last_pk = 0
+    while True:
+        batch = list(books.filter(pk__gt=last_pk).values_list('pk', *STATUS_COUNTER_FIELDS.values())[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1][0]
+
+
+def find_copy_count_mismatches(book_ids=None, batch_size=1000):
+    """
+    Yields (book_id, stored, actual) for every book whose counters are wrong.
+    Both stored and actual are dicts keyed by counter field.
+    """
+    fields = list(STATUS_COUNTER_FIELDS.values())
+    for batch in _book_id_batches(batch_size, book_ids):
+        actual_counts = count_copies([row[0] for row in batch])
+        for row in batch:
+            stored = dict(zip(fields, row[1:]))
+            actual = {field: actual_counts.get(row[0], {}).get(field, 0) for field in fields}
+            if stored != actual:
+                yield row[0], stored, actual
+
+
+def rebuild_copy_counts(book_ids=None, batch_size=1000):
+    """
+    Recomputes the counters of the given books (all books if None) in batches.
+    Only books whose counters are wrong are written. Returns the number of fixed books.
+    """
+    fields = list(STATUS_COUNTER_FIELDS.values())
+    pending = []
+    fixed = 0
+    for book_id, stored, actual in find_copy_count_mismatches(book_ids, batch_size):
+        pending.append(Book(pk=book_id, **actual))
+        if len(pending) >= batch_size:
+            Book.objects.bulk_update(pending, fields)
+            fixed += len(pending)
+            pending = []
+    if pending:
+        Book.objects.bulk_update(pending, fields)
+        fixed += len(pending)
+    return fixed
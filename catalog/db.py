@@ -0,0 +1,32 @@
+"""
+Settings applied to every new database connection.
+
+SQLite keeps most of its tuning per connection, so the PRAGMAS of a
+database in settings.DATABASES are run by a connection_created handler
+(connected in CatalogConfig.ready()):
+
+    DATABASES['default']['PRAGMAS'] = {'journal_mode': 'WAL', 'busy_timeout': 5000}
+
+Other backends ignore PRAGMAS.
+"""
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+def apply_sqlite_pragmas(connection, pragmas):
+    """
+    Runs "PRAGMA name = value" for every item of pragmas on a sqlite3 connection.
+    """
+    cursor = connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute('PRAGMA {0} = {1}'.format(name, value))
+    finally:
+        cursor.close()
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    pragmas = connection.settings_dict.get('PRAGMAS')
+    if connection.vendor == 'sqlite' and pragmas:
+        apply_sqlite_pragmas(connection.connection, pragmas)
@@ -0,0 +1,97 @@
+"""
+PostgreSQL backend with a connection pool shared by the threads of a
+process (Django 3.2 only has persistent connections, one per thread).
+
+    DATABASES['default']['ENGINE'] = 'catalog.db_backends.postgresql_pool'
+    DATABASES['default']['POOL'] = {'MIN_SIZE': 2, 'MAX_SIZE': 20, 'TIMEOUT': 10}
+
+Closing the connection (at the end of a request when CONN_MAX_AGE is 0, or
+when a db_thread() of the async views is done) gives it back to the pool
+instead of disconnecting, so the next thread does not pay for a new
+PostgreSQL backend process. MIN_SIZE idle connections are kept open, at
+most MAX_SIZE are in use at the same time and a thread waits up to TIMEOUT
+seconds for one to be given back. With several processes (gunicorn
+workers), every process has its own pool; put pgbouncer in front of the
+server when their sum gets near max_connections.
+"""
+import os
+import threading
+
+import psycopg2.extensions
+import psycopg2.extras
+import psycopg2.pool
+from django.db.backends.postgresql import base
+
+DEFAULT_POOL = {'MIN_SIZE': 2, 'MAX_SIZE': 20, 'TIMEOUT': 10}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """
+    psycopg2's ThreadedConnectionPool, waiting for a free connection instead of failing when all are in use.
+    """
+
+    def __init__(self, min_size, max_size, timeout, conn_params):
+        self.timeout = timeout
+        self._pool = psycopg2.pool.ThreadedConnectionPool(min_size, max_size, **conn_params)
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def getconn(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise psycopg2.OperationalError('No database connection was free after {0} seconds.'.format(self.timeout))
+        try:
+            connection = self._pool.getconn()
+            #server重開或連線被切掉的話換一條新的
+            while connection.closed or connection.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                self._pool.putconn(connection, close=True)
+                connection = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+        return connection
+
+    def putconn(self, connection):
+        try:
+            self._pool.putconn(connection)
+        finally:
+            self._slots.release()
+
+    def closeall(self):
+        self._pool.closeall()
+
+
+def get_pool(alias, options, conn_params):
+    #fork出來的process不能用parent的連線，所以每個pid各自一個pool；
+    #連線參數也算進去(建測試資料庫時NAME會改)
+    key = (alias, os.getpid(), tuple(sorted(conn_params.items())))
+    with _pools_lock:
+        if key not in _pools:
+            options = dict(DEFAULT_POOL, **options)
+            _pools[key] = ConnectionPool(options['MIN_SIZE'], options['MAX_SIZE'], options['TIMEOUT'], conn_params)
+        return _pools[key]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_new_connection(self, conn_params):
+        self.pool = get_pool(self.alias, self.settings_dict.get('POOL', {}), conn_params)
+        connection = self.pool.getconn()
+        #以下跟postgresql backend的get_new_connection一樣，只是連線從pool拿
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                #還回pool；還在transaction裡的連線pool會先rollback
+                self.pool.putconn(self.connection)
@@ -0,0 +1,149 @@
+"""
+A concurrent read/write benchmark for SQLite (used by "manage.py bench_db").
+
+`workers` threads each open their own connection to a scratch database
+file, like the threads of a server do; `writers` of them run loan-like
+write transactions (update a copy, add an event row) and the others run
+the reads of a detail page. Every profile starts from a new file, so
+journal_mode=WAL of one run does not leak into the next one:
+
+    default     a new connection per operation (CONN_MAX_AGE = 0), no PRAGMAS
+    persistent  one connection per thread for the whole run, no PRAGMAS
+    tuned       one connection per thread with settings.SQLITE_PRAGMAS
+
+Without PRAGMAS, `timeout` is the busy timeout, as for Django's SQLite
+backend (5 seconds unless OPTIONS says otherwise).
+"""
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from .db import apply_sqlite_pragmas
+
+SCHEMA = '''
+CREATE TABLE copy (id INTEGER PRIMARY KEY, book_id INTEGER NOT NULL, status TEXT NOT NULL, due_back TEXT);
+CREATE INDEX copy_book_idx ON copy (book_id);
+CREATE TABLE event (id INTEGER PRIMARY KEY, copy_id INTEGER NOT NULL, action TEXT NOT NULL, created TEXT NOT NULL);
+'''
+BOOKS = 200
+
+
+class BenchResult:
+
+    def __init__(self, profile, workers, writers, reads, writes, errors, elapsed):
+        self.profile = profile
+        self.workers = workers
+        self.writers = writers
+        self.reads = sorted(reads)
+        self.writes = sorted(writes)
+        self.errors = errors
+        self.elapsed = elapsed
+
+    def per_second(self, latencies):
+        return len(latencies) / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'profile': self.profile,
+            'workers': self.workers,
+            'writers': self.writers,
+            'seconds': round(self.elapsed, 3),
+            'reads': len(self.reads),
+            'writes': len(self.writes),
+            'errors': self.errors,
+            'reads_per_second': round(self.per_second(self.reads), 1),
+            'writes_per_second': round(self.per_second(self.writes), 1),
+            'read_p99_ms': _p99_ms(self.reads),
+            'write_p99_ms': _p99_ms(self.writes),
+        }
+
+
+def _p99_ms(latencies):
+    if not latencies:
+        return None
+    return round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2)
+
+
+def create_database(path, rows):
+    connection = sqlite3.connect(path)
+    try:
+        connection.executescript(SCHEMA)
+        connection.executemany('INSERT INTO copy (book_id, status) VALUES (?, ?)',
+                               ((i % BOOKS, 'a') for i in range(rows)))
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def _read(connection, rows):
+    copy_id = random.randint(1, rows)
+    connection.execute('SELECT id, book_id, status, due_back FROM copy WHERE id = ?', (copy_id,)).fetchall()
+    connection.execute('SELECT status, COUNT(*) FROM copy WHERE book_id = ? GROUP BY status',
+                       (copy_id % BOOKS,)).fetchall()
+
+
+def _write(connection, rows):
+    copy_id = random.randint(1, rows)
+    #with會commit(出錯就rollback)
+    with connection:
+        connection.execute("UPDATE copy SET status = 'o', due_back = date('now', '+21 days') WHERE id = ?", (copy_id,))
+        connection.execute("INSERT INTO event (copy_id, action, created) VALUES (?, 'checkout', datetime('now'))",
+                           (copy_id,))
+
+
+def run_benchmark(profile='tuned', persistent=True, pragmas=None, workers=8, writers=2, duration=5.0,
+                  rows=2000, timeout=5.0):
+    """
+    Runs the read/write mix for `duration` seconds on a new database file and returns a BenchResult.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.sqlite3')
+        create_database(path, rows)
+
+        def connect():
+            connection = sqlite3.connect(path, timeout=timeout)
+            if pragmas:
+                apply_sqlite_pragmas(connection, pragmas)
+            return connection
+
+        reads, writes = [], []
+        errors = []
+        start = threading.Barrier(workers)
+
+        def worker(writer):
+            operation, latencies = (_write, writes) if writer else (_read, reads)
+            shared = connect() if persistent else None
+            failed = 0
+            #大家一起開始，才是真的同時在讀寫
+            start.wait()
+            deadline = time.perf_counter() + duration
+            try:
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    connection = shared or connect()
+                    try:
+                        operation(connection, rows)
+                    except sqlite3.OperationalError:
+                        #database is locked：等超過busy timeout
+                        failed += 1
+                        continue
+                    finally:
+                        if shared is None:
+                            connection.close()
+                    latencies.append(time.perf_counter() - started)
+            finally:
+                if shared is not None:
+                    shared.close()
+                errors.append(failed)
+
+        threads = [threading.Thread(target=worker, args=(i < writers,)) for i in range(workers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    return BenchResult(profile, workers, writers, reads, writes, sum(errors), elapsed)
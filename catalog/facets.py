@@ -0,0 +1,135 @@
+"""
+Precomputed book counts for browsing by genre and language (facets).
+
+FacetCount has one row per genre (language NULL), per language (genre
+NULL) and per (genre, language) pair, so the facet lists on the book
+pages are a single indexed lookup instead of a GROUP BY over the
+Book.genre through table on every request. A book without a language only
+counts for its genres.
+
+The signal handlers in catalog/signals.py apply the change of every Book
+save/delete and genre add/remove/clear. Deleting a genre or a language
+deletes its rows (CASCADE). Code that writes books or their genres with
+bulk_create() or QuerySet.update() must call add_books()/remove_books()
+itself, or rebuild_facet_counts() ("manage.py rebuild_facet_counts")
+afterwards.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import Book, FacetCount
+
+
+def genre_keys(genre_id, language_id):
+    """
+    The rows that one link of a book (in `language_id`) to a genre counts in.
+    """
+    return [(genre_id, None)] + ([(genre_id, language_id)] if language_id is not None else [])
+
+
+def book_keys(genre_ids, language_id):
+    """
+    The (genre_id, language_id) rows that one book counts in (None = any).
+    """
+    keys = [(None, language_id)] if language_id is not None else []
+    for genre_id in genre_ids:
+        keys.extend(genre_keys(genre_id, language_id))
+    return keys
+
+
+def _order(key):
+    #固定的順序更新，兩個transaction不會互相卡住
+    return key[0] or 0, key[1] or 0
+
+
+def apply_deltas(deltas):
+    """
+    Adds {(genre_id, language_id): delta} to the counts.
+    """
+    for (genre_id, language_id), delta in sorted(deltas.items(), key=lambda item: _order(item[0])):
+        if delta == 0:
+            continue
+        rows = FacetCount.objects.filter(genre_id=genre_id, language_id=language_id)
+        if rows.update(books=F('books') + delta):
+            continue
+        try:
+            with transaction.atomic():
+                FacetCount.objects.create(genre_id=genre_id, language_id=language_id, books=delta)
+        except IntegrityError:
+            #另一個worker剛好先建了這一列
+            rows.update(books=F('books') + delta)
+
+
+def count_books(book_ids=None):
+    """
+    Counter {(genre_id, language_id): books} of the given books (all books if None), computed with GROUP BY.
+    """
+    books = Book.objects.all() if book_ids is None else Book.objects.filter(pk__in=book_ids)
+    links = Book.genre.through.objects.all() if book_ids is None else Book.genre.through.objects.filter(book_id__in=book_ids)
+    counts = Counter()
+    for language_id, number in (books.exclude(language=None).order_by().values_list('language_id')
+                                .annotate(number=Count('pk'))):
+        counts[(None, language_id)] = number
+    for genre_id, number in links.order_by().values_list('genre_id').annotate(number=Count('pk')):
+        counts[(genre_id, None)] = number
+    for genre_id, language_id, number in (links.exclude(book__language=None).order_by()
+                                          .values_list('genre_id', 'book__language_id').annotate(number=Count('pk'))):
+        counts[(genre_id, language_id)] = number
+    return counts
+
+
+def add_books(book_ids):
+    """
+    Counts books that were written without signals (call it after their genres are inserted).
+    """
+    apply_deltas(count_books(book_ids))
+
+
+def remove_books(book_ids):
+    """
+    Uncounts books that are about to be deleted or changed without signals.
+    """
+    apply_deltas({key: -number for key, number in count_books(book_ids).items()})
+
+
+def rebuild_facet_counts():
+    """
+    Recomputes every count from the books. Returns the number of rows.
+    """
+    counts = count_books()
+    with transaction.atomic():
+        FacetCount.objects.all().delete()
+        FacetCount.objects.bulk_create([FacetCount(genre_id=genre_id, language_id=language_id, books=number)
+                                        for (genre_id, language_id), number in sorted(counts.items(), key=lambda item: _order(item[0]))])
+    return len(counts)
+
+
+def find_mismatches():
+    """
+    Yields (genre_id, language_id, stored, actual) for every wrong count.
+    """
+    stored = {(row.genre_id, row.language_id): row.books for row in FacetCount.objects.all()}
+    actual = count_books()
+    for key in sorted(set(stored) | set(actual), key=_order):
+        if stored.get(key, 0) != actual.get(key, 0):
+            yield key + (stored.get(key, 0), actual.get(key, 0))
+
+
+def genre_facets(language_id=None):
+    """
+    [(genre, books)] by genre name, only genres with books (in `language_id` if given). One query.
+    """
+    rows = (FacetCount.objects.filter(genre__isnull=False, language_id=language_id, books__gt=0)
+            .select_related('genre').order_by('genre__name', 'genre_id'))
+    return [(row.genre, row.books) for row in rows]
+
+
+def language_facets(genre_id=None):
+    """
+    [(language, books)] by language name, only languages with books (of `genre_id` if given). One query.
+    """
+    rows = (FacetCount.objects.filter(language__isnull=False, genre_id=genre_id, books__gt=0)
+            .select_related('language').order_by('language__name', 'language_id'))
+    return [(row.language, row.books) for row in rows]
@@ -3,6 +3,21 @@ from django import forms
 from django.core.exceptions import ValidationError
 from django.utils.translation import ugettext_lazy as _
 import datetime #for checking renewal date range.
+import uuid
+
+from .models import BookInstance
+
+
+#續借日期的規則，單筆續借、批次續借跟admin的批次動作都用這一個
+def validate_renewal_date(data):
+    #Check date is not in past. 
+    if data < datetime.date.today():
+        raise ValidationError(_('Invalid date - renewal in past'))
+
+    #Check date is in range librarian allowed to change (+4 weeks).
+    if data > datetime.date.today() + datetime.timedelta(weeks=4):
+        raise ValidationError(_('Invalid date - renewal more than 4 weeks ahead'))
+
     
 class RenewBookForm(forms.Form):
     #取得表單的input資料
@@ -11,23 +26,58 @@ class RenewBookForm(forms.Form):
     #clean_OOXX就是用來驗證這個欄位的
     def clean_renewal_date(self):
         data = self.cleaned_data['renewal_date']
-        
-        #Check date is not in past. 
-        if data < datetime.date.today():
-            raise ValidationError(_('Invalid date - renewal in past'))
-
-        #Check date is in range librarian allowed to change (+4 weeks).
-        if data > datetime.date.today() + datetime.timedelta(weeks=4):
-            raise ValidationError(_('Invalid date - renewal more than 4 weeks ahead'))
+        validate_renewal_date(data)
 
         # Remember to always return the cleaned data.
         return data
 
 
+class BulkRenewForm(RenewBookForm):
+    """
+    Selects the loans to renew either by copy id (one per line) or by a filter.
+    """
+    ids = forms.CharField(widget=forms.Textarea, required=False, help_text='Copy ids, one per line.')
+    borrower = forms.CharField(required=False, help_text='Username of the borrower.')
+    due_after = forms.DateField(required=False)
+    due_before = forms.DateField(required=False)
+    status = forms.ChoiceField(choices=BookInstance.LOAN_STATUS, initial='o', required=False)
+
+    def clean_ids(self):
+        ids = []
+        for line in self.cleaned_data['ids'].split():
+            try:
+                ids.append(uuid.UUID(line))
+            except ValueError:
+                raise ValidationError(_('Invalid copy id: %(id)s'), params={'id': line})
+        return ids
+
+    def clean(self):
+        cleaned_data = super().clean()
+        #什麼條件都沒給的話，不要把全部的書都續借了
+        if not (cleaned_data.get('ids') or cleaned_data.get('borrower')
+                or cleaned_data.get('due_after') or cleaned_data.get('due_before')):
+            raise ValidationError(_('Enter copy ids or at least one of borrower and due date range.'))
+        return cleaned_data
+
+    def get_queryset(self):
+        data = self.cleaned_data
+        copies = BookInstance.objects.all()
+        if data['ids']:
+            copies = copies.filter(pk__in=data['ids'])
+        if data['borrower']:
+            copies = copies.filter(borrower__username=data['borrower'])
+        if data['due_after']:
+            copies = copies.filter(due_back__gte=data['due_after'])
+        if data['due_before']:
+            copies = copies.filter(due_back__lte=data['due_before'])
+        if data['status']:
+            copies = copies.filter(status=data['status'])
+        return copies
+
+
 #利用modelform快速建立create,delete,update功能
 #類似asp.net MVC的skeleton
 from django.forms import ModelForm
-from .models import BookInstance
 
 class RenewBookModelForm(ModelForm):
     #clean_OOXX就是用來驗證這個欄位的
@@ -0,0 +1,99 @@
+"""
+Conditional GET and rendered page caching for the read-only catalog views.
+
+The ETag of a page is built from its URL, the current user and the versions
+(catalog/versions.py) of the models the page shows. When a browser or CDN
+sends that ETag back (If-None-Match) or an If-Modified-Since that is not
+older than the newest version, the view answers 304 without running.
+Pages of logged-in users have no Last-Modified and ignore If-Modified-Since:
+a date is the same for every user, so only the ETag can tell them apart.
+Otherwise the rendered page is looked up in the cache under the same ETag,
+so a warm hit skips the ORM and the template engine.
+"""
+import datetime
+import hashlib
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils import timezone
+from django.utils.http import http_date, quote_etag
+
+from .versions import get_versions, user_version_label
+
+PAGE_CACHE_PREFIX = 'catalog:page:'
+
+#每一頁的側邊欄都會顯示使用者名稱與權限，使用者自己的資料或群組權限變動也要讓頁面失效
+USER_MODEL_LABELS = ('auth.group', 'auth.permission')
+
+
+class CachedPageMixin:
+    """
+    Mixin for class-based views whose GET output only depends on the URL, the
+    user and the models listed in cache_models (model labels such as 'catalog.book').
+
+    Put it after LoginRequiredMixin/PermissionRequiredMixin, so the access check
+    runs before any cached page is served.
+    """
+    cache_models = ()
+    page_cache_timeout = 600
+    #頁面內容跟今天的日期有關(例如逾期的標示)，過了午夜就要失效
+    cache_vary_on_date = False
+
+    def get_cache_models(self):
+        labels = tuple(self.cache_models) + USER_MODEL_LABELS
+        if self.request.user.is_authenticated:
+            labels += (user_version_label(self.request.user.pk),)
+        return labels
+
+    def _validators(self, request):
+        versions = get_versions(self.get_cache_models())
+        user_id = request.user.pk if request.user.is_authenticated else 0
+        #每個使用者的ETag都不一樣，個人的頁面不會給到別人
+        parts = [request.get_full_path(), str(user_id)]
+        last_modified = max(versions.values()) // 1000 + 1
+        if self.cache_vary_on_date:
+            today = timezone.localdate()
+            parts.append(today.isoformat())
+            midnight = timezone.make_aware(datetime.datetime.combine(today, datetime.time()))
+            last_modified = max(last_modified, int(midnight.timestamp()))
+        if request.user.is_authenticated:
+            #If-Modified-Since沒有使用者的資訊，換了使用者也可能得到304，所以個人的頁面只用ETag
+            last_modified = None
+        source = '|'.join(parts + ['{0}={1}'.format(label, versions[label]) for label in sorted(versions)])
+        etag = quote_etag(hashlib.md5(source.encode()).hexdigest())
+        return etag, last_modified
+
+    def _patch_headers(self, request, response, etag, last_modified):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True, max_age=0, must_revalidate=True)
+        else:
+            patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+        patch_vary_headers(response, ('Cookie',))
+        return response
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+
+        etag, last_modified = self._validators(request)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            return self._patch_headers(request, response, etag, last_modified)
+
+        key = PAGE_CACHE_PREFIX + etag.strip('"')
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+        else:
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            if hasattr(response, 'render'):
+                response.render()
+            cache.set(key, (response.content, response['Content-Type']), self.page_cache_timeout)
+        return self._patch_headers(request, response, etag, last_modified)
@@ -0,0 +1,409 @@
+"""
+Bulk catalog import (used by "manage.py import_catalog").
+
+Records are streamed from CSV, JSONL or MARC21 (ISO 2709) files, so memory
+does not grow with the size of the file. Each chunk of records is written
+inside its own transaction with bulk_create():
+
+* Authors, genres and languages are deduplicated through in-memory lookup
+  tables loaded from the database once.
+* Books, their genre M2M rows and their copies (BookInstance) are inserted
+  in batches.
+* The derived data that the signal handlers normally maintain (copy
+  counters, search index, facet counts, page versions, dashboard
+  counters) is updated per chunk, because bulk_create() does not send
+  signals.
+
+With a checkpoint name, the number of processed records is saved in an
+ImportCheckpoint row in the same transaction as the chunk, so the
+checkpoint and the rows can never disagree (even if the process is killed
+right after a commit). Running the same import again with that checkpoint
+skips the records that are already in the database.
+
+A normalized record is a dict with the keys: title, summary, isbn, author
+('Last, First'), genres (list), language, copies (list of dicts with
+imprint, status, due_back).
+"""
+import csv
+import datetime
+import json
+import os
+import time
+
+from django.db import connection, transaction
+from django.db.models import Max
+
+from . import facets, search
+from .counters import STATUS_COUNTER_FIELDS
+from .models import Author, Book, BookInstance, Genre, ImportCheckpoint, Language
+from .stats import invalidate_dashboard_counts
+from .versions import bump_versions
+
+VALID_STATUSES = {code for code, label in BookInstance.LOAN_STATUS}
+
+
+class RecordError(ValueError):
+    """
+    A record that cannot be imported. The import goes on and the record is reported as rejected.
+    """
+
+
+#---------------------------------------------------------------- readers
+#每個reader都是generator：一次讀一筆，回傳還沒驗證過的dict
+
+def _split_list(value):
+    if isinstance(value, list):
+        items = [_text(item, 'genres') for item in value]
+        return [item.strip() for item in items if item.strip()]
+    return [item.strip() for item in _text(value, 'genres').split('|') if item.strip()]
+
+
+def read_csv(path):
+    """
+    CSV with a header row: title, summary, isbn, author, genres (separated by |),
+    language, copies (number of copies), imprint, status, due_back.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            yield row
+
+
+def read_jsonl(path):
+    """
+    One JSON object per line, same keys as the CSV. 'genres' may be a list and
+    'copies' may be a list of {imprint, status, due_back} objects.
+    """
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    yield RecordError('Invalid JSON: {0}'.format(e))
+
+
+MARC_RECORD_END = b'\x1d'
+MARC_FIELD_END = b'\x1e'
+MARC_SUBFIELD = b'\x1f'
+
+
+def parse_marc_record(data):
+    """
+    Parses one ISO 2709 record into {tag: [field, ...]}. Control fields (00X)
+    are strings, data fields are lists of (subfield code, value).
+    """
+    try:
+        base_address = int(data[12:17])
+    except ValueError:
+        raise RecordError('Invalid MARC leader')
+    directory = data[24:base_address - 1]
+    fields = {}
+    for start in range(0, len(directory) - 11, 12):
+        entry = directory[start:start + 12]
+        tag = entry[:3].decode('ascii', 'replace')
+        length, offset = int(entry[3:7]), int(entry[7:12])
+        value = data[base_address + offset:base_address + offset + length].rstrip(MARC_FIELD_END)
+        if tag < '010':
+            fields.setdefault(tag, []).append(value.decode('utf-8', 'replace'))
+            continue
+        subfields = []
+        for chunk in value.split(MARC_SUBFIELD)[1:]:
+            if chunk:
+                subfields.append((chr(chunk[0]), chunk[1:].decode('utf-8', 'replace')))
+        fields.setdefault(tag, []).append(subfields)
+    return fields
+
+
+def _subfield(fields, tag, code):
+    for field in fields.get(tag, []):
+        for subfield_code, value in field:
+            if subfield_code == code:
+                return value
+    return ''
+
+
+def marc_to_record(fields):
+    """
+    Maps the MARC21 bibliographic fields we need onto a record dict:
+    020$a ISBN, 100$a author, 245$a$b title, 520$a summary, 650$a genres,
+    041$a or 008/35-37 language.
+    """
+    title = ' '.join(part for part in (_subfield(fields, '245', 'a'), _subfield(fields, '245', 'b')) if part)
+    language = _subfield(fields, '041', 'a')
+    if not language and fields.get('008') and len(fields['008'][0]) >= 38:
+        language = fields['008'][0][35:38]
+    return {
+        'title': title.rstrip(' /:;,.'),
+        'summary': _subfield(fields, '520', 'a'),
+        'isbn': _subfield(fields, '020', 'a').split(' ')[0],
+        'author': _subfield(fields, '100', 'a').rstrip(' ,.'),
+        'genres': [value.rstrip(' .') for field in fields.get('650', [])
+                   for code, value in field if code == 'a'],
+        'language': language.strip(),
+    }
+
+
+def read_marc(path, buffer_size=64 * 1024):
+    with open(path, 'rb') as f:
+        pending = b''
+        while True:
+            chunk = f.read(buffer_size)
+            pending += chunk
+            *records, pending = pending.split(MARC_RECORD_END)
+            for data in records:
+                data = data.lstrip(b'\r\n')
+                if data:
+                    try:
+                        yield marc_to_record(parse_marc_record(data))
+                    except (RecordError, ValueError, IndexError) as e:
+                        yield RecordError('Invalid MARC record: {0}'.format(e))
+            if not chunk:
+                return
+
+
+READERS = {
+    'csv': read_csv,
+    'jsonl': read_jsonl,
+    'marc': read_marc,
+}
+
+
+def guess_format(path):
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    return {'ndjson': 'jsonl', 'json': 'jsonl', 'mrc': 'marc', 'marc21': 'marc'}.get(extension, extension)
+
+
+#---------------------------------------------------------------- normalization
+
+def _text(value, name):
+    """
+    A text value of a record: '' for missing values, numbers as strings (JSONL
+    may have ISBNs as numbers). Raises RecordError for anything else.
+    """
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return value
+    #bool也是int，但True不會是ISBN
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise RecordError('{0} must be a string, not {1!r}'.format(name, value))
+
+
+def _parse_date(value):
+    if not value:
+        return None
+    if isinstance(value, datetime.date):
+        return value
+    try:
+        return datetime.date.fromisoformat(str(value))
+    except ValueError:
+        raise RecordError('Invalid due_back date: {0!r}'.format(value))
+
+
+def _copy(data, default_imprint):
+    if not isinstance(data, dict):
+        raise RecordError('Copy is not an object')
+    status = _text(data.get('status'), 'status').strip() or 'm'
+    if status not in VALID_STATUSES:
+        raise RecordError('Invalid status: {0!r}'.format(status))
+    return {
+        'imprint': (_text(data.get('imprint'), 'imprint') or _text(default_imprint, 'imprint'))[:200],
+        'status': status,
+        'due_back': _parse_date(data.get('due_back')),
+    }
+
+
+def normalize_record(raw, default_copies=0):
+    """
+    Validates a raw record from a reader and returns the normalized dict.
+    Raises RecordError for records that cannot be imported.
+    """
+    if isinstance(raw, RecordError):
+        raise raw
+    if not isinstance(raw, dict):
+        raise RecordError('Record is not an object')
+    title = _text(raw.get('title'), 'title').strip()
+    if not title:
+        raise RecordError('Missing title')
+    author = _text(raw.get('author'), 'author').strip()
+    last_name, _, first_name = author.partition(',')
+
+    copies = raw.get('copies')
+    if isinstance(copies, list):
+        copies = [_copy(copy, raw.get('imprint')) for copy in copies]
+    else:
+        try:
+            number = int(copies) if copies not in (None, '') else default_copies
+        except (TypeError, ValueError):
+            raise RecordError('Invalid number of copies: {0!r}'.format(copies))
+        copies = [_copy(raw, raw.get('imprint')) for _ in range(number)]
+
+    return {
+        'title': title[:200],
+        'summary': _text(raw.get('summary'), 'summary').strip()[:1000],
+        'isbn': _text(raw.get('isbn'), 'isbn').strip()[:13],
+        'author': (last_name.strip()[:100], first_name.strip()[:100]) if author else None,
+        'genres': [genre[:200] for genre in _split_list(raw.get('genres'))],
+        'language': _text(raw.get('language'), 'language').strip()[:200] or None,
+        'copies': copies,
+    }
+
+
+#---------------------------------------------------------------- importer
+
+class ImportStats:
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.records = 0
+        self.books = 0
+        self.copies = 0
+        self.rejects = 0
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.start
+
+    @property
+    def records_per_second(self):
+        return self.records / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return ('{0.records} records, {0.books} books, {0.copies} copies, {0.rejects} rejected '
+                'in {0.elapsed:.1f}s ({0.records_per_second:.0f} records/s)').format(self)
+
+
+def bulk_create_with_pks(model, objects, batch_size):
+    """
+    bulk_create() that always sets the primary keys of `objects`.
+    Backends that cannot return the new rows (SQLite on this Django version) get
+    primary keys allocated after the current maximum, so this must run inside the
+    import transaction and not next to other writers of the same table.
+    """
+    if objects and not connection.features.can_return_rows_from_bulk_insert:
+        next_pk = (model.objects.aggregate(max_pk=Max('pk'))['max_pk'] or 0) + 1
+        for offset, obj in enumerate(objects):
+            obj.pk = next_pk + offset
+    return model.objects.bulk_create(objects, batch_size=batch_size)
+
+
+class CatalogImporter:
+    """
+    Imports normalized records chunk by chunk. See the module docstring.
+    """
+
+    def __init__(self, chunk_size=1000, batch_size=500, default_copies=0, on_chunk=None, on_reject=None,
+                 checkpoint=None, source=None):
+        self.chunk_size = chunk_size
+        #checkpoint的名稱跟來源檔案，見save_checkpoint()
+        self.checkpoint = checkpoint
+        self.source = source
+        self.batch_size = batch_size
+        self.default_copies = default_copies
+        self.on_chunk = on_chunk
+        self.on_reject = on_reject
+        self.stats = ImportStats()
+        #名稱 => id 的對照表，同一個作者/種類/語言只會新增一次
+        self.authors = {(last, first): pk for pk, last, first in
+                        Author.objects.values_list('pk', 'last_name', 'first_name').iterator()}
+        self.genres = {name: pk for pk, name in Genre.objects.values_list('pk', 'name')}
+        self.languages = {name: pk for pk, name in Language.objects.values_list('pk', 'name')}
+
+    def run(self, raw_records, skip=0):
+        """
+        Imports every record of the `raw_records` iterable, skipping the first `skip`
+        (already imported) ones. Returns the ImportStats.
+        """
+        chunk = []
+        position = 0
+        for position, raw in enumerate(raw_records, 1):
+            if position <= skip:
+                continue
+            try:
+                chunk.append(normalize_record(raw, self.default_copies))
+            except RecordError as e:
+                self.stats.rejects += 1
+                if self.on_reject:
+                    self.on_reject(position, raw, e)
+            if len(chunk) >= self.chunk_size:
+                self._flush(chunk, position)
+                chunk = []
+        self._flush(chunk, max(position, skip))
+        return self.stats
+
+    def _flush(self, chunk, position):
+        with transaction.atomic():
+            if chunk:
+                book_ids = self._import_chunk(chunk)
+                search.index_books(book_ids)
+                facets.add_books(book_ids)
+            #跟這一批的資料一起commit，不會有資料已經寫入但checkpoint還沒更新的時候
+            if self.checkpoint:
+                save_checkpoint(self.checkpoint, self.source, position)
+        if chunk:
+            invalidate_dashboard_counts()
+            bump_versions('catalog.book', 'catalog.author', 'catalog.genre', 'catalog.language', 'catalog.bookinstance')
+        self.stats.records = position
+        if self.on_chunk:
+            self.on_chunk(position, self.stats)
+
+    def _missing(self, lookup, model, keys, make):
+        missing = sorted({key for key in keys if key not in lookup})
+        if missing:
+            objects = bulk_create_with_pks(model, [make(key) for key in missing], self.batch_size)
+            lookup.update(zip(missing, (obj.pk for obj in objects)))
+
+    def _import_chunk(self, chunk):
+        self._missing(self.authors, Author, [r['author'] for r in chunk if r['author']],
+                      lambda key: Author(last_name=key[0], first_name=key[1]))
+        self._missing(self.genres, Genre, [genre for r in chunk for genre in r['genres']],
+                      lambda name: Genre(name=name))
+        self._missing(self.languages, Language, [r['language'] for r in chunk if r['language']],
+                      lambda name: Language(name=name))
+
+        books = []
+        for record in chunk:
+            book = Book(title=record['title'], summary=record['summary'], isbn=record['isbn'],
+                        author_id=self.authors[record['author']] if record['author'] else None,
+                        language_id=self.languages[record['language']] if record['language'] else None)
+            #bulk_create不會觸發signal，副本數量直接在這裡算好
+            for copy in record['copies']:
+                field = STATUS_COUNTER_FIELDS[copy['status']]
+                setattr(book, field, getattr(book, field) + 1)
+            books.append(book)
+        books = bulk_create_with_pks(Book, books, self.batch_size)
+
+        Book.genre.through.objects.bulk_create(
+            [Book.genre.through(book_id=book.pk, genre_id=self.genres[genre])
+             for book, record in zip(books, chunk) for genre in dict.fromkeys(record['genres'])],
+            batch_size=self.batch_size)
+        copies = [BookInstance(book_id=book.pk, **copy) for book, record in zip(books, chunk) for copy in record['copies']]
+        BookInstance.objects.bulk_create(copies, batch_size=self.batch_size)
+
+        self.stats.books += len(books)
+        self.stats.copies += len(copies)
+        return [book.pk for book in books]
+
+
+#---------------------------------------------------------------- checkpoints
+
+def read_checkpoint(name, source):
+    """
+    Number of records of `source` already imported according to the checkpoint `name`.
+    """
+    if not name:
+        return 0
+    checkpoint = ImportCheckpoint.objects.filter(name=name).first()
+    if checkpoint is None or checkpoint.source != os.path.abspath(source):
+        return 0
+    return checkpoint.records
+
+
+def save_checkpoint(name, source, records):
+    """
+    Saves the checkpoint `name`. Call it inside the transaction that imported the records.
+    """
+    ImportCheckpoint.objects.update_or_create(name=name, defaults={'source': os.path.abspath(source),
+                                                                   'records': records})
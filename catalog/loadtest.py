@@ -0,0 +1,108 @@
+"""
+A small HTTP load generator (used by "manage.py loadtest").
+
+`concurrency` clients send GET requests to one URL until `total` requests
+have been made, each over a new connection. Throughput and latency
+percentiles are measured on the client side, so the same run can be
+pointed at the WSGI and at the ASGI deployment of the site.
+"""
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+
+class LoadResult:
+
+    def __init__(self, url, concurrency, latencies, errors, statuses, elapsed):
+        self.url = url
+        self.concurrency = concurrency
+        self.latencies = sorted(latencies)
+        self.errors = errors
+        self.statuses = statuses
+        self.elapsed = elapsed
+
+    @property
+    def requests(self):
+        return len(self.latencies) + self.errors
+
+    @property
+    def throughput(self):
+        return len(self.latencies) / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, p):
+        """
+        Latency (seconds) below which p percent of the successful requests finished.
+        """
+        if not self.latencies:
+            return None
+        index = min(len(self.latencies) - 1, max(0, int(round(p / 100.0 * len(self.latencies))) - 1))
+        return self.latencies[index]
+
+    def as_dict(self):
+        return {
+            'url': self.url,
+            'concurrency': self.concurrency,
+            'requests': self.requests,
+            'errors': self.errors,
+            'statuses': {str(status): count for status, count in sorted(self.statuses.items())},
+            'seconds': round(self.elapsed, 3),
+            'requests_per_second': round(self.throughput, 1),
+            'p50_ms': _ms(self.percentile(50)),
+            'p99_ms': _ms(self.percentile(99)),
+            'max_ms': _ms(self.latencies[-1] if self.latencies else None),
+        }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+async def fetch(url, timeout=30):
+    """
+    GETs url over a new connection. Returns the HTTP status code.
+    """
+    parts = urlsplit(url)
+    https = parts.scheme == 'https'
+    port = parts.port or (443 if https else 80)
+    path = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+
+    async def request():
+        reader, writer = await asyncio.open_connection(parts.hostname, port, ssl=https or None)
+        try:
+            writer.write('GET {0} HTTP/1.1\r\nHost: {1}\r\nConnection: close\r\n\r\n'.format(path, parts.netloc).encode())
+            await writer.drain()
+            status_line = await reader.readline()
+            #把整個回應讀完才算這個request結束
+            while await reader.read(65536):
+                pass
+        finally:
+            writer.close()
+        return int(status_line.split()[1])
+
+    return await asyncio.wait_for(request(), timeout)
+
+
+async def run_load(url, concurrency=500, total=5000, timeout=30):
+    """
+    Sends `total` requests to url from `concurrency` clients at the same time.
+    """
+    latencies, statuses = [], {}
+    errors = 0
+    remaining = total
+
+    async def client():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                status = await fetch(url, timeout)
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(min(concurrency, total))))
+    return LoadResult(url, concurrency, latencies, errors, statuses, time.perf_counter() - started)
@@ -0,0 +1,312 @@
+"""
+Loan operations on BookInstance: checkout, return, renew, reserve and
+cancel_reservation.
+
+Every operation is one conditional UPDATE (e.g. ... SET status='o' WHERE
+id=? AND status='a') inside a transaction (retried when SQLite reports
+that the database is locked). The database decides who wins
+when two requests race for the same copy: the loser's UPDATE matches no
+row, so nothing is overwritten and it gets a conflict result instead.
+The UPDATE itself is the check, so this works without select_for_update
+(which SQLite ignores).
+
+The same transaction writes a LoanEvent and moves the copy counters on
+Book. QuerySet.update() does not send signals, so the page versions and
+the dashboard counters are refreshed here once the transaction commits.
+
+bulk_renew() and bulk_set_status() change many copies with one UPDATE per
+batch and return one LoanResult per copy.
+"""
+import datetime
+import functools
+import random
+import threading
+import time
+
+from django.db import OperationalError, connection, models, transaction
+from django.utils import timezone
+
+from .counters import apply_copy_transition
+from .models import BookInstance, LoanEvent
+from .stats import invalidate_dashboard_counts
+from .versions import bump_versions
+
+#預設借期
+DEFAULT_LOAN_PERIOD = datetime.timedelta(weeks=3)
+
+#SQLite同時只能有一個寫入者，搶不到鎖的會直接丟OperationalError，整個transaction重做就好
+#最多重試幾秒(跟sqlite3預設的busy timeout一樣)
+LOCK_TIMEOUT = 5
+#同一個process裡的執行緒先在這裡排隊，不要一起去搶SQLite的鎖
+_sqlite_writer = threading.Lock()
+
+#衝突的原因
+NOT_FOUND = 'not_found'
+NOT_AVAILABLE = 'not_available'
+NOT_ON_LOAN = 'not_on_loan'
+NOT_RESERVED = 'not_reserved'
+RESERVED_FOR_OTHER = 'reserved_for_other'
+LOAN_CHANGED = 'loan_changed'
+UNCHANGED = 'unchanged'
+
+CONFLICT_MESSAGES = {
+    NOT_FOUND: 'This copy does not exist.',
+    NOT_AVAILABLE: 'This copy is not available.',
+    NOT_ON_LOAN: 'This copy is not on loan.',
+    NOT_RESERVED: 'This copy is not reserved.',
+    RESERVED_FOR_OTHER: 'This copy is reserved for another reader.',
+    LOAN_CHANGED: 'This loan was changed by someone else in the meantime.',
+    UNCHANGED: 'This copy already has that status.',
+}
+
+
+class LoanResult:
+    """
+    Outcome of a loan operation. It is true when the copy was changed; otherwise
+    `reason` is one of the conflict codes above and `status` is the current status.
+    """
+
+    def __init__(self, action, copy_id, ok, status=None, due_back=None, reason=None):
+        self.action = action
+        self.copy_id = copy_id
+        self.ok = ok
+        self.status = status
+        self.due_back = due_back
+        self.reason = reason
+
+    def __bool__(self):
+        return self.ok
+
+    @property
+    def message(self):
+        return CONFLICT_MESSAGES.get(self.reason, '')
+
+    def __repr__(self):
+        return '<LoanResult {0} {1} {2}>'.format(self.action, self.copy_id, 'ok' if self.ok else self.reason)
+
+
+def _refresh_derived_data():
+    bump_versions('catalog.bookinstance', 'catalog.book')
+    invalidate_dashboard_counts('bookinstance')
+
+
+def _atomic(operation):
+    """
+    Runs operation() in a transaction. On SQLite, a transaction that could not get
+    the write lock is rolled back and run again (other databases wait for the row lock).
+    """
+    if connection.vendor == 'sqlite' and not connection.in_atomic_block:
+        with _sqlite_writer:
+            return _retry_when_locked(operation)
+    return _retry_when_locked(operation)
+
+
+def _retry_when_locked(operation):
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    attempt = 0
+    while True:
+        try:
+            with transaction.atomic():
+                return operation()
+        except OperationalError as e:
+            #外面已經有transaction的話，不能只重做這一段
+            if (connection.vendor != 'sqlite' or connection.in_atomic_block
+                    or 'locked' not in str(e) or time.monotonic() > deadline):
+                raise
+            attempt += 1
+            time.sleep(random.uniform(0, min(0.05, 0.001 * 2 ** attempt)))
+
+
+def _transition(action, copy_id, old_status, new_status, changes, match=None, borrower=None, actor=None):
+    """
+    Moves one copy from old_status to new_status if, and only if, it is still in old_status
+    (and matches `match`). Must be called inside transaction.atomic().
+    """
+    rows = BookInstance.objects.filter(pk=copy_id, status=old_status, **(match or {}))
+    changes = dict(changes, status=new_status, updated_at=timezone.now())
+    if not rows.update(**changes):
+        return None
+    #UPDATE之後這一列已經被這個transaction鎖住，再讀book_id不會讀到別人改到一半的值
+    book_id = BookInstance.objects.filter(pk=copy_id).values_list('book_id', flat=True).get()
+    apply_copy_transition(book_id, old_status, book_id, new_status)
+    LoanEvent.objects.create(book_instance_id=copy_id, action=action, actor=actor,
+                             borrower_id=borrower if borrower is not None else changes.get('borrower_id'),
+                             due_back=changes.get('due_back'))
+    transaction.on_commit(_refresh_derived_data)
+    return LoanResult(action, copy_id, True, status=new_status, due_back=changes.get('due_back'))
+
+
+def _conflict(action, copy_id, reason_for):
+    row = BookInstance.objects.filter(pk=copy_id).values('status', 'borrower_id', 'due_back').first()
+    if row is None:
+        return LoanResult(action, copy_id, False, reason=NOT_FOUND)
+    return LoanResult(action, copy_id, False, status=row['status'], due_back=row['due_back'], reason=reason_for(row))
+
+
+def _user_id(user):
+    return getattr(user, 'pk', user)
+
+
+def checkout(copy_id, borrower, due_back=None, actor=None):
+    """
+    Lends an available copy to borrower, or a copy reserved for that borrower.
+    """
+    borrower_id = _user_id(borrower)
+    due_back = due_back or datetime.date.today() + DEFAULT_LOAN_PERIOD
+    changes = {'borrower_id': borrower_id, 'due_back': due_back}
+
+    def operation():
+        result = (_transition('checkout', copy_id, 'a', 'o', changes, actor=actor)
+                  or _transition('checkout', copy_id, 'r', 'o', changes, match={'borrower_id': borrower_id},
+                                 actor=actor))
+        return result or _conflict('checkout', copy_id,
+                                   lambda row: RESERVED_FOR_OTHER if row['status'] == 'r' else NOT_AVAILABLE)
+    return _atomic(operation)
+
+
+def _current_borrower(copy_id):
+    return BookInstance.objects.filter(pk=copy_id).values_list('borrower_id', flat=True).first()
+
+
+def _reason(expected_status, reason):
+    #狀態沒變但借書人變了：中間被別人還書又借出去了，這個操作已經過時
+    return lambda row: LOAN_CHANGED if row['status'] == expected_status else reason
+
+
+def _for_current_borrower(action, copy_id, old_status, new_status, changes, reason, actor=None):
+    """
+    Transition on a loan or reservation of whoever holds the copy now. The UPDATE also
+    matches that borrower, so the history never records the wrong reader.
+    """
+    def operation():
+        borrower_id = _current_borrower(copy_id)
+        result = _transition(action, copy_id, old_status, new_status, changes,
+                             match={'borrower_id': borrower_id}, borrower=borrower_id, actor=actor)
+        return result or _conflict(action, copy_id, _reason(old_status, reason))
+    return _atomic(operation)
+
+
+def return_copy(copy_id, actor=None):
+    """
+    Takes a copy on loan back, so it is available again.
+    """
+    return _for_current_borrower('return', copy_id, 'o', 'a', {'borrower_id': None, 'due_back': None},
+                                 NOT_ON_LOAN, actor=actor)
+
+
+def renew(copy_id, due_back, actor=None):
+    """
+    Sets a new due date on a copy that is still on loan.
+    """
+    return _for_current_borrower('renew', copy_id, 'o', 'o', {'due_back': due_back}, NOT_ON_LOAN, actor=actor)
+
+
+def reserve(copy_id, borrower, actor=None):
+    """
+    Holds an available copy for borrower; only that borrower can check it out.
+    """
+    changes = {'borrower_id': _user_id(borrower), 'due_back': None}
+    return _atomic(lambda: _transition('reserve', copy_id, 'a', 'r', changes, actor=actor)
+                   or _conflict('reserve', copy_id, lambda row: NOT_AVAILABLE))
+
+
+def cancel_reservation(copy_id, actor=None):
+    return _for_current_borrower('cancel', copy_id, 'r', 'a', {'borrower_id': None}, NOT_RESERVED, actor=actor)
+
+
+#批次操作可以轉成的狀態：還書/取消預約/送修，都會清掉借書人跟到期日
+BULK_STATUSES = ('a', 'm')
+
+#結束借閱或預約時寫入的歷史紀錄
+_CLOSING_ACTIONS = {'o': 'return', 'r': 'cancel'}
+
+
+def _id_batches(copies, batch_size):
+    if isinstance(copies, models.QuerySet):
+        copies = copies.order_by('pk').values_list('pk', flat=True)
+    ids = [BookInstance._meta.pk.to_python(pk) for pk in copies]
+    for start in range(0, len(ids), batch_size):
+        yield ids[start:start + batch_size]
+
+
+def _locked_rows(ids):
+    rows = (BookInstance.objects.filter(pk__in=ids).select_for_update()
+            .values('id', 'book_id', 'status', 'borrower_id', 'due_back'))
+    return {row['id']: row for row in rows}
+
+
+def _renew_batch(ids, due_back, actor):
+    rows = _locked_rows(ids)
+    renewed = [pk for pk, row in rows.items() if row['status'] == 'o']
+    if renewed:
+        BookInstance.objects.filter(pk__in=renewed, status='o').update(due_back=due_back, updated_at=timezone.now())
+        LoanEvent.objects.bulk_create([
+            LoanEvent(book_instance_id=pk, action='renew', borrower_id=rows[pk]['borrower_id'], actor=actor,
+                      due_back=due_back) for pk in renewed])
+        transaction.on_commit(_refresh_derived_data)
+    results = []
+    for pk in ids:
+        row = rows.get(pk)
+        if row is None:
+            results.append(LoanResult('renew', pk, False, reason=NOT_FOUND))
+        elif row['status'] != 'o':
+            results.append(LoanResult('renew', pk, False, status=row['status'], due_back=row['due_back'],
+                                      reason=NOT_ON_LOAN))
+        else:
+            results.append(LoanResult('renew', pk, True, status='o', due_back=due_back))
+    return results
+
+
+def bulk_renew(copies, due_back, actor=None, batch_size=500):
+    """
+    Sets due_back on every copy in `copies` (a queryset or a list of ids) that is on loan.
+    Returns one LoanResult per copy.
+    """
+    results = []
+    for ids in _id_batches(copies, batch_size):
+        results.extend(_atomic(functools.partial(_renew_batch, ids, due_back, actor)))
+    return results
+
+
+def _set_status_batch(ids, status, actor):
+    rows = _locked_rows(ids)
+    changed = [row for row in rows.values() if row['status'] != status]
+    if changed:
+        (BookInstance.objects.filter(pk__in=[row['id'] for row in changed])
+         .update(status=status, borrower_id=None, due_back=None, updated_at=timezone.now()))
+        #每一種(書, 原本狀態)只要更新一次計數
+        transitions = {}
+        for row in changed:
+            key = (row['book_id'], row['status'])
+            transitions[key] = transitions.get(key, 0) + 1
+        for (book_id, old_status), count in transitions.items():
+            apply_copy_transition(book_id, old_status, book_id, status, count=count)
+        LoanEvent.objects.bulk_create([
+            LoanEvent(book_instance_id=row['id'], action=_CLOSING_ACTIONS[row['status']],
+                      borrower_id=row['borrower_id'], actor=actor)
+            for row in changed if row['status'] in _CLOSING_ACTIONS])
+        transaction.on_commit(_refresh_derived_data)
+    results = []
+    for pk in ids:
+        row = rows.get(pk)
+        if row is None:
+            results.append(LoanResult('status', pk, False, reason=NOT_FOUND))
+        elif row['status'] == status:
+            results.append(LoanResult('status', pk, False, status=status, due_back=row['due_back'],
+                                      reason=UNCHANGED))
+        else:
+            results.append(LoanResult('status', pk, True, status=status))
+    return results
+
+
+def bulk_set_status(copies, status, actor=None, batch_size=500):
+    """
+    Makes every copy in `copies` available ('a') or sends it to maintenance ('m'),
+    ending its loan or reservation. Returns one LoanResult per copy.
+    """
+    if status not in BULK_STATUSES:
+        raise ValueError('Copies can only be made available or sent to maintenance in bulk.')
+    results = []
+    for ids in _id_batches(copies, batch_size):
+        results.extend(_atomic(functools.partial(_set_status_batch, ids, status, actor)))
+    return results
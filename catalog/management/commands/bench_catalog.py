@@ -0,0 +1,65 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.benchmark import check_cache, compare, metadata, run_pages
+from catalog.models import Book
+from catalog.seeding import seed_catalog
+
+
+class Command(BaseCommand):
+    help = ('Times every catalog page and admin changelist and prints the results as JSON. With --sizes the '
+            'catalog is first seeded up to each number of books (only use it on a scratch database, e.g. '
+            'DATABASE_URL=sqlite:////tmp/bench.sqlite3 after "manage.py migrate").')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', help='Comma separated numbers of books, e.g. 1000,100000,1000000.')
+        parser.add_argument('--copies-per-book', type=int, default=3)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=5, help='Warm requests per URL.')
+        parser.add_argument('--only', action='append', help='Only this URL name (can be repeated).')
+        parser.add_argument('--output', help='Write the JSON to this file instead of standard output.')
+        parser.add_argument('--compare', help='JSON of an earlier run; prints the p50 changes.')
+        parser.add_argument('--flush-cache', action='store_true',
+                            help='Allow clearing a shared cache (Redis, files) before each cold request.')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')] if options['sizes'] else [None]
+        except ValueError:
+            raise CommandError('--sizes must be numbers separated by commas.')
+        #在seed之前就檢查，不要seed完才發現不能跑
+        try:
+            check_cache(options['flush_cache'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        runs = []
+        for step, size in enumerate(sorted(sizes, key=lambda size: size or 0)):
+            if size is not None:
+                missing = size - Book.objects.count()
+                if missing > 0:
+                    #每一段用不同的seed，同樣的--sizes跟--seed每次產生一樣的資料
+                    stats = seed_catalog(missing, options['copies_per_book'], options['users'],
+                                         seed=options['seed'] + step)
+                    self.stderr.write('Seeded {0}'.format(stats))
+            run = run_pages(options['repeat'], options['only'], options['flush_cache'])
+            self.stderr.write('Timed {0} URLs at {1} books.'.format(len(run['results']), run['rows']['books']))
+            runs.append(run)
+
+        report = {'meta': metadata(), 'runs': runs}
+        text = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.write(text + '\n')
+        else:
+            self.stdout.write(text)
+
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as old:
+                changes = list(compare(json.load(old), report))
+            for books, name, before, after in changes:
+                change = (after - before) / before * 100 if before else 0.0
+                self.stderr.write('{0:>9} books  {1:<40} {2:>9.2f} ms -> {3:>9.2f} ms  {4:+.0f}%'.format(
+                    books, name, before, after, change))
@@ -0,0 +1,30 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.benchmark import run_change_forms
+
+
+class Command(BaseCommand):
+    help = ('Times the admin change forms of an author with many books and of a book with many copies '
+            '(seeded the first time, only use it on a scratch database).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=10000, help='Books of the author.')
+        parser.add_argument('--copies', type=int, default=5000, help='About this many copies of one book.')
+        parser.add_argument('--repeat', type=int, default=5, help='Warm requests per form.')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+        parser.add_argument('--flush-cache', action='store_true',
+                            help='Allow clearing a shared cache (Redis, files) before each cold request.')
+
+    def handle(self, *args, **options):
+        try:
+            results = run_change_forms(options['books'], options['copies'], options['repeat'], options['flush_cache'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for result in results:
+            self.stdout.write('{name:<28} {rows:>7} rows  {queries:>4} queries  {bytes:>9} bytes  '
+                              'cold {cold_ms:>8} ms  p50 {p50_ms:>8} ms  p95 {p95_ms:>8} ms'.format(**result))
@@ -0,0 +1,45 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.dbbench import run_benchmark
+
+#profile名稱: (每個thread一條持久連線, 加上SQLITE_PRAGMAS)
+PROFILES = {
+    'default': (False, False),
+    'persistent': (True, False),
+    'tuned': (True, True),
+}
+
+
+class Command(BaseCommand):
+    help = ('Measures concurrent SQLite read/write throughput on a scratch database, without and with '
+            'persistent connections and settings.SQLITE_PRAGMAS (WAL, synchronous=NORMAL, mmap, busy timeout).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', action='append', choices=list(PROFILES),
+                            help='Profile to run, can be repeated (default: all of them).')
+        parser.add_argument('--workers', type=int, default=8, help='Threads, each with its own connection.')
+        parser.add_argument('--writers', type=int, default=2, help='How many of the workers write.')
+        parser.add_argument('--duration', type=float, default=5, help='Seconds per profile.')
+        parser.add_argument('--rows', type=int, default=2000, help='Rows in the scratch table.')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        if not 0 <= options['writers'] <= options['workers']:
+            raise CommandError('--writers must be between 0 and --workers.')
+        results = []
+        for profile in options['profile'] or list(PROFILES):
+            persistent, tuned = PROFILES[profile]
+            result = run_benchmark(profile, persistent, settings.SQLITE_PRAGMAS if tuned else None,
+                                   workers=options['workers'], writers=options['writers'],
+                                   duration=options['duration'], rows=options['rows'])
+            results.append(result.as_dict())
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for result in results:
+            self.stdout.write('{profile}: {workers} workers ({writers} writing) for {seconds}s: '
+                              '{reads_per_second} reads/s (p99 {read_p99_ms} ms), '
+                              '{writes_per_second} writes/s (p99 {write_p99_ms} ms), {errors} errors'.format(**result))
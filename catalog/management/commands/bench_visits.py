@@ -0,0 +1,27 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from catalog.benchmark import run_visits
+from catalog.visits import ENGINES
+
+
+class Command(BaseCommand):
+    help = ('Requests the home page with each visit counter engine (settings.VISIT_COUNTER) and shows the '
+            'database queries and writes per request.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100, help='Home page requests per engine.')
+        parser.add_argument('--engine', action='append', choices=ENGINES, help='Only this engine (can be repeated).')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        results = run_visits(options['engine'] or ENGINES, options['requests'])
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write('{0:<8} {1:>11} {2:>10} {3:>9} {4:>9}'.format('engine', 'queries/req', 'writes/req',
+                                                                         'p50 ms', 'p95 ms'))
+        for result in results:
+            self.stdout.write('{engine:<8} {queries_per_request:>11} {writes_per_request:>10} {p50_ms:>9} '
+                              '{p95_ms:>9}'.format(**result))
@@ -0,0 +1,49 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from catalog.models import Author, Book, BookInstance
+
+
+class Command(BaseCommand):
+    help = ('Prints the query plan and run time of the main catalog list queries. '
+            'To compare plans with and without the indexes, run it once after '
+            '"manage.py migrate catalog 0005" and once after "manage.py migrate".')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Run every query this many times and report the best time.')
+
+    def catalog_queries(self):
+        """
+        The querysets of the catalog list views, as (name, queryset) pairs.
+        """
+        #借最多本書的讀者，最能看出有沒有index的差別
+        borrower = (User.objects.filter(bookinstance__status='o')
+                    .annotate(loans=Count('bookinstance')).order_by('-loans').first())
+        queries = [
+            ('all-borrowed', BookInstance.objects.filter(status__exact='o')
+                .select_related('book', 'borrower').order_by('-due_back')[:10]),
+            ('books', Book.objects.select_related('author').order_by('title', 'pk')[:10]),
+            ('authors', Author.objects.order_by('last_name', 'first_name', 'id')[:10]),
+            ('index:book-title-icontains', Book.objects.filter(title__icontains='how')),
+        ]
+        if borrower is not None:
+            queries.insert(0, ('my-borrowed', BookInstance.objects.filter(borrower=borrower)
+                               .filter(status__exact='o').select_related('book').order_by('due_back')[:10]))
+        return queries
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rows: {0} books, {1} copies, {2} authors'.format(
+            Book.objects.count(), BookInstance.objects.count(), Author.objects.count()))
+        for name, queryset in self.catalog_queries():
+            best = None
+            for _ in range(max(options['repeat'], 1)):
+                start = time.perf_counter()
+                list(queryset.all())
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            self.stdout.write(self.style.MIGRATE_HEADING('\n{0} ({1:.2f} ms)'.format(name, best * 1000)))
+            self.stdout.write(queryset.explain())
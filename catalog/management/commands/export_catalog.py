@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.export import FORMATS, iter_book_records, parse_since
+from catalog.routers import use_replicas
+
+
+class Command(BaseCommand):
+    help = 'Streams all books (with author, genres, language and copies) as NDJSON or CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(FORMATS), default='ndjson')
+        parser.add_argument('--since', help='Only books changed at or after this ISO 8601 date/time.')
+        parser.add_argument('--output', help='Output file (default: standard output).')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            since = parse_since(options['since'])
+        except ValueError as e:
+            raise CommandError(e)
+        lines, content_type = FORMATS[options['format']]
+        #整份目錄從副本讀，不跟借還書搶主資料庫
+        with use_replicas():
+            records = iter_book_records(since=since, chunk_size=options['chunk_size'])
+            if not options['output']:
+                for line in lines(records):
+                    self.stdout.write(line, ending='')
+                return
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                for line in lines(records):
+                    output.write(line)
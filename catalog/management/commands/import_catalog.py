@@ -0,0 +1,56 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.importer import READERS, CatalogImporter, guess_format, read_checkpoint
+
+
+class Command(BaseCommand):
+    help = ('Streams books (with authors, genres, languages and copies) from a CSV, JSONL '
+            'or MARC21 file into the catalog. See catalog/importer.py for the record format.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=sorted(READERS), help='Default: guessed from the file extension.')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Records per transaction (and per checkpoint).')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows per INSERT.')
+        parser.add_argument('--copies', type=int, default=0,
+                            help='Copies to create for records that do not say how many (e.g. MARC).')
+        parser.add_argument('--checkpoint', help='Checkpoint name (saved in the database with every chunk). '
+                                                 'An existing checkpoint of the same file resumes the import.')
+        parser.add_argument('--rejects', help='Write rejected records to this JSONL file.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or guess_format(path)
+        if file_format not in READERS:
+            raise CommandError('Unknown format {0!r}, use --format.'.format(file_format))
+
+        checkpoint = options['checkpoint']
+        skip = read_checkpoint(checkpoint, path)
+        if skip:
+            self.stdout.write('Resuming after record {0}.'.format(skip))
+
+        rejects_file = open(options['rejects'], 'a', encoding='utf-8') if options['rejects'] else None
+
+        def on_reject(position, raw, error):
+            if rejects_file:
+                record = raw if isinstance(raw, dict) else None
+                rejects_file.write(json.dumps({'record': position, 'error': str(error), 'data': record}, default=str) + '\n')
+            if options['verbosity'] >= 2:
+                self.stderr.write('Record {0} rejected: {1}'.format(position, error))
+
+        def on_chunk(position, stats):
+            if options['verbosity'] >= 1:
+                self.stdout.write(str(stats))
+
+        importer = CatalogImporter(chunk_size=options['chunk_size'], batch_size=options['batch_size'],
+                                   default_copies=options['copies'], on_chunk=on_chunk, on_reject=on_reject,
+                                   checkpoint=checkpoint, source=path)
+        try:
+            stats = importer.run(READERS[file_format](path), skip=skip)
+        finally:
+            if rejects_file:
+                rejects_file.close()
+        self.stdout.write(self.style.SUCCESS('Done: {0}'.format(stats)))
@@ -0,0 +1,33 @@
+import asyncio
+import json
+
+from django.core.management.base import BaseCommand
+
+from catalog.loadtest import run_load
+
+
+class Command(BaseCommand):
+    help = ('Load-tests running servers and reports throughput and p50/p99 latency. To compare the '
+            'deployments, start e.g. "gunicorn -w 4 locallibrary.wsgi" on :8000 and '
+            '"uvicorn --workers 4 locallibrary.asgi:application" on :8001, then run '
+            '"manage.py loadtest http://127.0.0.1:8000/catalog/books/ http://127.0.0.1:8001/catalog/async/books/".')
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help='URLs to test, one after the other.')
+        parser.add_argument('--concurrency', type=int, default=500, help='Clients sending requests at the same time.')
+        parser.add_argument('--requests', type=int, default=5000, help='Requests per URL.')
+        parser.add_argument('--timeout', type=float, default=30, help='Seconds before a request counts as an error.')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        results = []
+        for url in options['urls']:
+            result = asyncio.run(run_load(url, options['concurrency'], options['requests'], options['timeout']))
+            results.append(result.as_dict())
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for result in results:
+            self.stdout.write('{url}\n  {requests} requests ({errors} errors) in {seconds}s at concurrency {concurrency}: '
+                              '{requests_per_second} req/s, p50 {p50_ms} ms, p99 {p99_ms} ms, max {max_ms} ms, '
+                              'statuses {statuses}'.format(**result))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.counters import find_copy_count_mismatches, rebuild_copy_counts
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds (or with --verify only checks) the per-status copy counters on Book.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='Only report books with wrong counters, do not fix them.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if options['verify']:
+            mismatches = 0
+            for book_id, stored, actual in find_copy_count_mismatches(batch_size=batch_size):
+                mismatches += 1
+                self.stdout.write('Book {0}: stored {1}, actual {2}'.format(book_id, stored, actual))
+            if mismatches:
+                raise CommandError('{0} book(s) have wrong copy counters.'.format(mismatches))
+            self.stdout.write(self.style.SUCCESS('All copy counters are correct.'))
+            return
+
+        fixed = rebuild_copy_counts(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS('Fixed copy counters of {0} book(s).'.format(fixed)))
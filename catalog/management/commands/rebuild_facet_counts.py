@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.facets import find_mismatches, rebuild_facet_counts
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds (or with --verify only checks) the precomputed genre and language book counts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='Only report wrong counts, do not fix them.')
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            mismatches = 0
+            for genre_id, language_id, stored, actual in find_mismatches():
+                mismatches += 1
+                self.stdout.write('Genre {0}, language {1}: stored {2}, actual {3}'.format(
+                    genre_id or 'any', language_id or 'any', stored, actual))
+            if mismatches:
+                raise CommandError('{0} facet count(s) are wrong.'.format(mismatches))
+            self.stdout.write(self.style.SUCCESS('All facet counts are correct.'))
+            return
+
+        rows = rebuild_facet_counts()
+        self.stdout.write(self.style.SUCCESS('Rebuilt {0} facet count(s).'.format(rows)))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.seeding import seed_catalog
+
+
+class Command(BaseCommand):
+    help = ('Fills the catalog with synthetic books, copies, authors and readers (deterministic by --seed). '
+            'See catalog/seeding.py for the distributions.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=1000)
+        parser.add_argument('--copies-per-book', type=int, default=3, help='Average number of copies per book.')
+        parser.add_argument('--users', type=int, default=100, help='Readers borrowing the copies on loan.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=1000, help='Books per transaction.')
+
+    def handle(self, *args, **options):
+        if options['books'] < 0 or options['copies_per_book'] < 0 or options['users'] < 0:
+            raise CommandError('--books, --copies-per-book and --users cannot be negative.')
+
+        def on_batch(stats):
+            if options['verbosity'] >= 2:
+                self.stdout.write(str(stats))
+
+        stats = seed_catalog(options['books'], options['copies_per_book'], options['users'], seed=options['seed'],
+                             batch_size=options['batch_size'], on_batch=on_batch)
+        self.stdout.write(self.style.SUCCESS('Done: {0}'.format(stats)))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from catalog.notices import send_overdue_notices
+
+
+class Command(BaseCommand):
+    help = ('Emails one digest per borrower listing their overdue books. '
+            'Loans already notified for their current due date are skipped, so it is safe to rerun.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Loans read per query.')
+        parser.add_argument('--send-batch-size', type=int, default=50, help='Emails per backend connection.')
+        parser.add_argument('--workers', type=int, default=4, help='Concurrent sending threads.')
+        parser.add_argument('--dry-run', action='store_true', help='Count the digests without sending them.')
+
+    def handle(self, *args, **options):
+        stats = send_overdue_notices(batch_size=options['batch_size'], send_batch_size=options['send_batch_size'],
+                                     workers=options['workers'], dry_run=options['dry_run'])
+        self.stdout.write(self.style.SUCCESS(str(stats)))
@@ -0,0 +1,43 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from catalog.slowlog import clear_entries, read_entries, top_offenders
+
+
+class Command(BaseCommand):
+    help = ('Lists the slowest SQL statements of the catalog views and the admin (settings.SLOW_QUERY_LOG), '
+            'grouped by fingerprint, most total time first.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=10, help='Number of statements to show.')
+        parser.add_argument('--plan', action='store_true', help='Show the query plan of each statement.')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+        parser.add_argument('--clear', action='store_true', help='Empty the log.')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            clear_entries()
+            self.stdout.write('Slow query log cleared.')
+            return
+        entries = read_entries()
+        offenders = top_offenders(entries, options['limit'])
+        if options['json']:
+            self.stdout.write(json.dumps(offenders, indent=2))
+            return
+        if not offenders:
+            self.stdout.write('No slow queries logged.')
+            return
+        self.stdout.write('{0} slow queries logged, top {1} by total time:'.format(len(entries), len(offenders)))
+        for rank, offender in enumerate(offenders, 1):
+            self.stdout.write('\n{0}. [{fingerprint}] {total_ms} ms total, {count} times, mean {mean_ms} ms, '
+                              'max {max_ms} ms'.format(rank, **offender))
+            self.stdout.write('   {0}'.format(offender['statement']))
+            self.stdout.write('   views: {0}'.format(', '.join(offender['views'])))
+            if offender['call_sites']:
+                self.stdout.write('   called from: {0}'.format(', '.join(offender['call_sites'])))
+            if offender['params'] is not None:
+                self.stdout.write('   params: {0}'.format(offender['params']))
+            if options['plan'] and offender['plan']:
+                for line in offender['plan']:
+                    self.stdout.write('   | {0}'.format(line))
@@ -0,0 +1,54 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:43
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+STATUS_COUNTER_FIELDS = {
+    'a': 'copies_available',
+    'o': 'copies_on_loan',
+    'm': 'copies_maintenance',
+    'r': 'copies_reserved',
+}
+
+
+def populate_copy_counters(apps, schema_editor):
+    Book = apps.get_model('catalog', 'Book')
+    BookInstance = apps.get_model('catalog', 'BookInstance')
+    rows = (BookInstance.objects.exclude(book=None)
+            .values('book_id', 'status').annotate(n=Count('pk')).order_by())
+    for row in rows:
+        field = STATUS_COUNTER_FIELDS.get(row['status'])
+        if field:
+            Book.objects.filter(pk=row['book_id']).update(**{field: row['n']})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0004_alter_bookinstance_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='copies_available',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='copies_maintenance',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='copies_on_loan',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='copies_reserved',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_copy_counters, migrations.RunPython.noop),
+    ]
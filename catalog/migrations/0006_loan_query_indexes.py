@@ -0,0 +1,30 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_book_copy_counters'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='book',
+            name='title',
+            field=models.CharField(db_index=True, max_length=200),
+        ),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['last_name', 'first_name'], name='author_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookinstance',
+            index=models.Index(fields=['status', 'due_back'], name='bookinst_status_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookinstance',
+            index=models.Index(fields=['borrower', 'status', 'due_back'], name='bookinst_borrower_status_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations
+
+
+#只有sqlite會建立FTS5的全文檢索表，其他資料庫由catalog/search.py改用各自的作法
+CREATE_FTS_TABLE = """
+CREATE VIRTUAL TABLE catalog_book_fts USING fts5(
+    title, author, genre, isbn, summary, tokenize='unicode61 remove_diacritics 2'
+)
+"""
+
+POPULATE_FTS_TABLE = """
+INSERT INTO catalog_book_fts (rowid, title, author, genre, isbn, summary)
+SELECT b.id, b.title, TRIM(COALESCE(a.first_name, '') || ' ' || COALESCE(a.last_name, '')),
+       COALESCE((SELECT group_concat(g.name, ', ') FROM catalog_book_genre bg
+                 JOIN catalog_genre g ON g.id = bg.genre_id WHERE bg.book_id = b.id), ''),
+       b.isbn, b.summary
+FROM catalog_book b LEFT JOIN catalog_author a ON a.id = b.author_id
+"""
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_FTS_TABLE)
+    schema_editor.execute(POPULATE_FTS_TABLE)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS catalog_book_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0006_loan_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
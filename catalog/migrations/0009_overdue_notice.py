@@ -0,0 +1,30 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalog', '0008_modification_timestamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OverdueNotice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('due_back', models.DateField()),
+                ('sent_at', models.DateTimeField(auto_now_add=True)),
+                ('book_instance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='overdue_notices', to='catalog.bookinstance')),
+                ('borrower', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='overdue_notices', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='overduenotice',
+            constraint=models.UniqueConstraint(fields=('book_instance', 'due_back'), name='unique_overdue_notice'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:57
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalog', '0009_overdue_notice'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('checkout', 'Checked out'), ('return', 'Returned'), ('renew', 'Renewed'), ('reserve', 'Reserved'), ('cancel', 'Reservation cancelled')], max_length=10)),
+                ('due_back', models.DateField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('book_instance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='loan_events', to='catalog.bookinstance')),
+                ('borrower', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='loan_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='loanevent',
+            index=models.Index(fields=['book_instance', 'created_at'], name='loanevent_copy_created_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_loan_events'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookinstance',
+            index=models.Index(fields=['due_back', 'id'], name='bookinst_due_id_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 3.2.25 on 2026-10-18 11:03
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def populate_facet_counts(apps, schema_editor):
+    Book = apps.get_model('catalog', 'Book')
+    FacetCount = apps.get_model('catalog', 'FacetCount')
+    links = Book.genre.through.objects.order_by()
+    rows = [FacetCount(language_id=row['language_id'], books=row['n'])
+            for row in Book.objects.exclude(language=None).order_by().values('language_id').annotate(n=Count('pk'))]
+    rows += [FacetCount(genre_id=row['genre_id'], books=row['n'])
+             for row in links.values('genre_id').annotate(n=Count('pk'))]
+    rows += [FacetCount(genre_id=row['genre_id'], language_id=row['book__language_id'], books=row['n'])
+             for row in links.exclude(book__language=None).values('genre_id', 'book__language_id').annotate(n=Count('pk'))]
+    FacetCount.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_bookinstance_admin_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('books', models.IntegerField(default=0)),
+                ('genre', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='catalog.genre')),
+                ('language', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='catalog.language')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='facetcount',
+            constraint=models.UniqueConstraint(fields=('genre', 'language'), name='facet_genre_language_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='facetcount',
+            constraint=models.UniqueConstraint(condition=models.Q(('language', None)), fields=('genre',), name='facet_genre_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='facetcount',
+            constraint=models.UniqueConstraint(condition=models.Q(('genre', None)), fields=('language',), name='facet_language_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['language', 'title', 'id'], name='book_language_title_idx'),
+        ),
+        migrations.RunPython(populate_facet_counts, migrations.RunPython.noop),
+    ]
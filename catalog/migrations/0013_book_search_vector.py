@@ -0,0 +1,51 @@
+from django.db import migrations
+
+
+#只有postgresql會建立：每本書一列預先算好的tsvector，加上GIN index(sqlite用0007的FTS5表)
+#權重跟catalog/search.py的PostgresBackend一樣：title A, author B, genre/isbn C, summary D
+#沒有外鍵：flush/TRUNCATE catalog_book的時候不會被擋住，刪書時由signal刪掉這一列
+CREATE_SEARCH_TABLE = """
+CREATE TABLE catalog_book_search (
+    book_id integer PRIMARY KEY,
+    document tsvector NOT NULL
+)
+"""
+
+CREATE_SEARCH_INDEX = 'CREATE INDEX catalog_book_search_document_idx ON catalog_book_search USING gin (document)'
+
+POPULATE_SEARCH_TABLE = """
+INSERT INTO catalog_book_search (book_id, document)
+SELECT b.id,
+       setweight(to_tsvector(b.title), 'A')
+       || setweight(to_tsvector(TRIM(COALESCE(a.first_name, '') || ' ' || COALESCE(a.last_name, ''))), 'B')
+       || setweight(to_tsvector(COALESCE((SELECT string_agg(g.name, ', ') FROM catalog_book_genre bg
+                                          JOIN catalog_genre g ON g.id = bg.genre_id WHERE bg.book_id = b.id), '')), 'C')
+       || setweight(to_tsvector(b.isbn), 'C')
+       || setweight(to_tsvector(b.summary), 'D')
+FROM catalog_book b LEFT JOIN catalog_author a ON a.id = b.author_id
+"""
+
+
+def create_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(CREATE_SEARCH_TABLE)
+    schema_editor.execute(POPULATE_SEARCH_TABLE)
+    schema_editor.execute(CREATE_SEARCH_INDEX)
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS catalog_book_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0012_facet_counts'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
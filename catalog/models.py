@@ -24,6 +24,12 @@ class Genre(models.Model):
         """
         return self.name
 
+    def get_absolute_url(self):
+        """
+        Returns the url to browse the books of this genre.
+        """
+        return reverse('genre-detail', args=[str(self.id)])
+
 
 class Language(models.Model):
     """
@@ -45,7 +51,8 @@ class Book(models.Model):
     """
     Model representing a book (but not a specific copy of a book).
     """
-    title = models.CharField(max_length=200)
+    #db_index:書單依title排序(含keyset分頁)用的
+    title = models.CharField(max_length=200, db_index=True)
     #ForeignKey:就是讓你在使用QuerySet的時候可以方便的直接連接到外部的class....
     #根據之前的經驗，在一對多或是多對一的時候
     #很容易導致程式碼run到不可預測的地方……不知道Django為什麼要導入ForeignKey
@@ -61,6 +68,40 @@ class Book(models.Model):
     # ManyToManyField used because genre can contain many books. Books can cover many genres.
     # Genre class has already been defined so we can specify the object above.
     language = models.ForeignKey('Language', on_delete=models.SET_NULL, null=True)
+
+    #以下是反正規化denormalized的欄位：每種借閱狀態各有幾本副本
+    #由catalog/counters.py在BookInstance新增/修改/刪除的時候增減，不要手動修改
+    #對不起來的時候可以用 manage.py rebuild_copy_counts 重建
+    copies_available = models.PositiveIntegerField(default=0, editable=False)
+    copies_on_loan = models.PositiveIntegerField(default=0, editable=False)
+    copies_maintenance = models.PositiveIntegerField(default=0, editable=False)
+    copies_reserved = models.PositiveIntegerField(default=0, editable=False)
+
+    #最後修改時間，匯出時可以只匯出某個時間點之後有變動的資料
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    COPY_COUNTER_FIELDS = ('copies_available', 'copies_on_loan', 'copies_maintenance', 'copies_reserved')
+
+    def save(self, *args, **kwargs):
+        """
+        Saves the book without its copy counters (unless update_fields names them):
+        the instance may have been loaded before a copy changed, and writing its
+        counters back would undo the F() updates of catalog/counters.py.
+        """
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            #跟Django一樣，延遲載入(defer/only)的欄位也不存
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.attname not in deferred
+                                       and field.name not in self.COPY_COUNTER_FIELDS]
+        super().save(*args, **kwargs)
+
+    @property
+    def copies_total(self):
+        """
+        Number of copies of this book in any status.
+        """
+        return self.copies_available + self.copies_on_loan + self.copies_maintenance + self.copies_reserved
     
     #顯示這本書的所有種類，以逗點區隔，最多三筆
     #而self.genre.all()這部分的程式碼，自動幫你把多對多會用到的中介資料表junction table
@@ -72,6 +113,10 @@ class Book(models.Model):
         return ', '.join([ genre.name for genre in self.genre.all()[:3] ])
     display_genre.short_description = 'Genre'
 
+    class Meta:
+        #書單用?language=篩選的時候，同一個語言的書已經依title排好，分頁直接走index
+        indexes = [models.Index(fields=['language', 'title', 'id'], name='book_language_title_idx')]
+
     def __str__(self):
         """
         String for representing the Model object.
@@ -93,6 +138,62 @@ class Book(models.Model):
 #就要import uuid
 import uuid # Required for unique book instances
 
+#逾期的判斷改在db裡算，不用把每一筆借出的書都載入Python再一筆一筆呼叫is_overdue
+class DaysSince(models.Func):
+    """
+    Number of days from a date column to `today` (negative if the date is in the future).
+    """
+    output_field = models.IntegerField()
+
+    def __init__(self, expression, today, **extra):
+        super().__init__(expression, models.Value(today, output_field=models.DateField()), **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        date_sql, date_params = compiler.compile(self.source_expressions[0])
+        today_sql, today_params = compiler.compile(self.source_expressions[1])
+        return '({0} - {1})'.format(today_sql, date_sql), today_params + date_params
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        date_sql, date_params = compiler.compile(self.source_expressions[0])
+        today_sql, today_params = compiler.compile(self.source_expressions[1])
+        return ('CAST(julianday({0}) - julianday({1}) AS INTEGER)'.format(today_sql, date_sql),
+                today_params + date_params)
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        date_sql, date_params = compiler.compile(self.source_expressions[0])
+        today_sql, today_params = compiler.compile(self.source_expressions[1])
+        return 'DATEDIFF({0}, {1})'.format(today_sql, date_sql), today_params + date_params
+
+
+class BookInstanceQuerySet(models.QuerySet):
+    """
+    Loan queries evaluated in SQL, e.g. BookInstance.objects.overdue().
+    """
+
+    def on_loan(self):
+        return self.filter(status__exact='o')
+
+    def overdue(self, today=None):
+        """
+        Copies on loan whose due_back is before today.
+        """
+        return self.on_loan().filter(due_back__lt=today or date.today())
+
+    def annotate_overdue(self, today=None):
+        """
+        Adds `overdue` (bool) and `days_overdue` (int, 0 if not overdue) to every row.
+        """
+        today = today or date.today()
+        is_overdue = models.Q(status__exact='o', due_back__lt=today)
+        return self.annotate(
+            #用Case而不是直接用Q，due_back是NULL的時候才會是False而不是NULL
+            overdue=models.Case(models.When(is_overdue, then=models.Value(True)),
+                                default=models.Value(False), output_field=models.BooleanField()),
+            days_overdue=models.Case(models.When(is_overdue, then=DaysSince('due_back', today)),
+                                     default=models.Value(0), output_field=models.IntegerField()),
+        )
+
+
 class BookInstance(models.Model):
     """
     Model representing a specific copy of a book (i.e. that can be borrowed from the library).
@@ -101,6 +202,7 @@ class BookInstance(models.Model):
     #不過～實務上，用這樣子的方式當成primary key的時候，在做join的時候
     #就會搞的自己很頭大就是了
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, help_text="Unique ID for this particular book across whole library")
+    objects = BookInstanceQuerySet.as_manager()
     book = models.ForeignKey('Book', on_delete=models.SET_NULL, null=True) 
     imprint = models.CharField(max_length=200)
     due_back = models.DateField(null=True, blank=True)
@@ -117,6 +219,7 @@ class BookInstance(models.Model):
     )
 
     status = models.CharField(max_length=1, choices=LOAN_STATUS, blank=True, default='m', help_text='Book availability')
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     #ordering:預設的排序方式。可以在Meta的class類別定義
     class Meta:
@@ -125,6 +228,15 @@ class BookInstance(models.Model):
         #can_view_all_borrowed_books是此權限的代碼名稱codename
         #one can view all borrowed books是口語化的名稱name
         permissions = (("can_view_all_borrowed_books", "one can view all borrowed books"),) 
+        #對應借閱清單的查詢：
+        #AllLoanedBooksListView => WHERE status='o' ORDER BY due_back
+        #LoanedBooksByUserListView => WHERE borrower=? AND status='o' ORDER BY due_back
+        indexes = [
+            models.Index(fields=['status', 'due_back'], name='bookinst_status_due_idx'),
+            models.Index(fields=['borrower', 'status', 'due_back'], name='bookinst_borrower_status_idx'),
+            #admin的副本清單：ORDER BY due_back, id
+            models.Index(fields=['due_back', 'id'], name='bookinst_due_id_idx'),
+        ]
         
 
     def __str__(self):
@@ -138,8 +250,11 @@ class BookInstance(models.Model):
     #表示借這本書的人是誰
     borrower = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     #是否到期，自動回傳false or true
+    #有用annotate_overdue()查詢的話，直接用db算好的結果
     @property
     def is_overdue(self):
+        if 'overdue' in self.__dict__:
+            return self.overdue
         if self.due_back and date.today() > self.due_back:
             return True
         return False
@@ -153,9 +268,12 @@ class Author(models.Model):
     #DateField:欄位型態是datetime
     date_of_birth = models.DateField(null=True, blank=True)
     date_of_death = models.DateField('Died', null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ["last_name","first_name"]
+        #跟ordering一樣的欄位順序，作者清單排序可以直接走index
+        indexes = [models.Index(fields=['last_name', 'first_name'], name='author_name_idx')]
     
     def get_absolute_url(self):
         """
@@ -171,3 +289,88 @@ class Author(models.Model):
         return '{0}, {1}'.format(self.last_name,self.first_name)
 
 
+
+
+class OverdueNotice(models.Model):
+    """
+    Model recording that an overdue notice was sent for a loan.
+    One notice per copy and due date, so reruns of send_overdue_notices do not send it twice
+    (a renewed loan gets a new due date and can get a new notice).
+    """
+    book_instance = models.ForeignKey('BookInstance', on_delete=models.CASCADE, related_name='overdue_notices')
+    borrower = models.ForeignKey('auth.User', on_delete=models.CASCADE, related_name='overdue_notices')
+    due_back = models.DateField()
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['book_instance', 'due_back'], name='unique_overdue_notice'),
+        ]
+
+    def __str__(self):
+        return '{0} ({1})'.format(self.book_instance_id, self.due_back)
+
+
+class LoanEvent(models.Model):
+    """
+    Model representing one entry of the loan history of a copy (written by catalog/loans.py).
+    """
+    LOAN_ACTIONS = (
+        ('checkout', 'Checked out'),
+        ('return', 'Returned'),
+        ('renew', 'Renewed'),
+        ('reserve', 'Reserved'),
+        ('cancel', 'Reservation cancelled'),
+    )
+
+    book_instance = models.ForeignKey('BookInstance', on_delete=models.CASCADE, related_name='loan_events')
+    action = models.CharField(max_length=10, choices=LOAN_ACTIONS)
+    #借書/預約的讀者，以及是哪個圖書館員操作的
+    borrower = models.ForeignKey('auth.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='loan_events')
+    actor = models.ForeignKey('auth.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    due_back = models.DateField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        #一本副本的借閱歷史 => WHERE book_instance=? ORDER BY created_at DESC
+        indexes = [models.Index(fields=['book_instance', 'created_at'], name='loanevent_copy_created_idx')]
+
+    def __str__(self):
+        return '{0} {1}'.format(self.book_instance_id, self.action)
+
+
+class FacetCount(models.Model):
+    """
+    Model holding a precomputed number of books (maintained by catalog/facets.py):
+    per genre (language is NULL), per language (genre is NULL) and per (genre, language).
+    """
+    genre = models.ForeignKey('Genre', on_delete=models.CASCADE, null=True, related_name='+')
+    language = models.ForeignKey('Language', on_delete=models.CASCADE, null=True, related_name='+')
+    books = models.IntegerField(default=0)
+
+    class Meta:
+        #NULL跟NULL不算重複，「任何語言」、「任何種類」的兩種列各要一個partial unique
+        constraints = [
+            models.UniqueConstraint(fields=['genre', 'language'], name='facet_genre_language_uniq'),
+            models.UniqueConstraint(fields=['genre'], condition=models.Q(language=None), name='facet_genre_uniq'),
+            models.UniqueConstraint(fields=['language'], condition=models.Q(genre=None), name='facet_language_uniq'),
+        ]
+
+    def __str__(self):
+        return '{0} / {1}: {2}'.format(self.genre_id or '*', self.language_id or '*', self.books)
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Model holding how many records of a source file "manage.py import_catalog" has imported.
+    It is written in the same transaction as the chunk, so a resumed import never repeats one.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    #檔案的絕對路徑；換了檔案就從頭開始
+    source = models.CharField(max_length=1024)
+    records = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return '{0}: {1} records'.format(self.name, self.records)
@@ -0,0 +1,166 @@
+"""
+Overdue notices (used by "manage.py send_overdue_notices").
+
+Overdue loans that have a borrower and no OverdueNotice yet are read in
+keyset batches ordered by (borrower, due_back, id), so one borrower's
+loans are next to each other and can be grouped into a single digest
+without holding all loans in memory. The (borrower, status, due_back)
+index on BookInstance covers this ordering.
+
+Digests are rendered in the main thread and handed in batches to a pool
+of worker threads that only talk to the email backend. The number of
+batches in flight is bounded. Each message of a batch is sent on its own,
+and a notice is recorded in OverdueNotice once its email was sent, so a
+failure partway through a batch doesn't resend the digests before it and
+reruns are idempotent.
+"""
+import datetime
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Exists, OuterRef, Q
+from django.template.loader import render_to_string
+
+from .models import BookInstance, OverdueNotice
+
+SUBJECT_TEMPLATE = 'catalog/email/overdue_notice_subject.txt'
+BODY_TEMPLATE = 'catalog/email/overdue_notice.txt'
+
+
+def pending_overdue_loans(today=None):
+    """
+    Overdue loans with a borrower that have not been notified for their current due date.
+    """
+    already_sent = OverdueNotice.objects.filter(book_instance=OuterRef('pk'), due_back=OuterRef('due_back'))
+    return (BookInstance.objects.overdue(today).filter(borrower__isnull=False)
+            .annotate(notified=Exists(already_sent)).filter(notified=False))
+
+
+def iter_loans_by_borrower(today=None, batch_size=1000):
+    """
+    Yields (borrower, [loan, ...]) with every pending overdue loan, one borrower at a time.
+    Rows are plain dicts read in keyset batches.
+    """
+    loans = pending_overdue_loans(today).order_by('borrower_id', 'due_back', 'id').values(
+        'id', 'due_back', 'book__title', 'borrower_id', 'borrower__username',
+        'borrower__first_name', 'borrower__email')
+    position = None
+    borrower, group = None, []
+    while True:
+        batch = loans
+        if position is not None:
+            borrower_id, due_back, pk = position
+            batch = batch.filter(Q(borrower_id__gt=borrower_id)
+                                 | Q(borrower_id=borrower_id, due_back__gt=due_back)
+                                 | Q(borrower_id=borrower_id, due_back=due_back, id__gt=pk))
+        rows = list(batch[:batch_size])
+        for row in rows:
+            if borrower is not None and row['borrower_id'] != borrower['id']:
+                yield borrower, group
+                group = []
+            borrower = {'id': row['borrower_id'], 'username': row['borrower__username'],
+                        'first_name': row['borrower__first_name'], 'email': row['borrower__email']}
+            group.append({'id': row['id'], 'due_back': row['due_back'], 'title': row['book__title']})
+        if len(rows) < batch_size:
+            break
+        last = rows[-1]
+        position = (last['borrower_id'], last['due_back'], last['id'])
+    if group:
+        yield borrower, group
+
+
+def build_digest(borrower, loans, today):
+    context = {'borrower': borrower, 'loans': loans, 'today': today}
+    for loan in loans:
+        loan['days_overdue'] = (today - loan['due_back']).days
+    subject = ' '.join(render_to_string(SUBJECT_TEMPLATE, context).split())
+    return EmailMessage(subject, render_to_string(BODY_TEMPLATE, context),
+                        settings.DEFAULT_FROM_EMAIL, [borrower['email']])
+
+
+def _deliver(messages):
+    """
+    Runs in a worker thread: sends a batch of messages over one backend connection.
+    Each message is sent on its own; returns a list with True for the ones that were sent.
+    """
+    connection = get_connection()
+    sent = []
+    connection.open()
+    try:
+        for message in messages:
+            #一封失敗(例如收件人被拒)不影響同一批的其他封，已經寄出的也會記錄下來
+            try:
+                connection.send_messages([message])
+            except Exception:
+                sent.append(False)
+            else:
+                sent.append(True)
+    finally:
+        connection.close()
+    return sent
+
+
+class NoticeStats:
+
+    def __init__(self):
+        self.borrowers = 0
+        self.loans = 0
+        self.sent = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def __str__(self):
+        return ('{0.sent} digest(s) sent for {0.loans} loan(s) of {0.borrowers} borrower(s), '
+                '{0.skipped} skipped (no email), {0.failed} failed').format(self)
+
+
+def send_overdue_notices(today=None, batch_size=1000, send_batch_size=50, workers=4, dry_run=False):
+    """
+    Sends one digest per borrower with overdue loans. Returns NoticeStats.
+    """
+    today = today or datetime.date.today()
+    stats = NoticeStats()
+    pending = {}
+
+    def record(future):
+        messages, loan_groups = pending.pop(future)
+        #連不上寄信的server：整批都沒寄出
+        sent = future.result() if future.exception() is None else [False] * len(messages)
+        stats.sent += sent.count(True)
+        stats.failed += sent.count(False)
+        OverdueNotice.objects.bulk_create(
+            [OverdueNotice(book_instance_id=loan['id'], borrower_id=borrower_id, due_back=loan['due_back'])
+             for ok, (borrower_id, loans) in zip(sent, loan_groups) if ok for loan in loans],
+            ignore_conflicts=True)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        messages, loan_groups = [], []
+
+        def submit():
+            #最多workers*2批同時在送，不會一次把所有信都塞進記憶體
+            while len(pending) >= workers * 2:
+                for future in wait(pending, return_when=FIRST_COMPLETED).done:
+                    record(future)
+            future = executor.submit(_deliver, list(messages))
+            pending[future] = (list(messages), list(loan_groups))
+
+        for borrower, loans in iter_loans_by_borrower(today, batch_size):
+            stats.borrowers += 1
+            stats.loans += len(loans)
+            if not borrower['email']:
+                stats.skipped += 1
+                continue
+            if dry_run:
+                continue
+            messages.append(build_digest(borrower, loans, today))
+            loan_groups.append((borrower['id'], loans))
+            if len(messages) >= send_batch_size:
+                submit()
+                messages, loan_groups = [], []
+        if messages:
+            submit()
+        for future in list(pending):
+            wait([future])
+            record(future)
+    return stats
@@ -0,0 +1,319 @@
+"""
+Keyset (cursor) pagination for the catalog list views.
+
+Page-number pagination needs OFFSET (the database still walks over all the
+skipped rows) plus a COUNT(*). Keyset pagination remembers the ordering
+values of the last row shown and asks for the rows after it, so every page
+costs the same as the first one. The position is passed around as an
+opaque cursor token.
+
+EstimatedCountPaginator is for the admin changelists of big tables: it
+takes the row count of an unfiltered list from the database statistics
+instead of running COUNT(*). KnownCountPaginator is given the count by the
+view (e.g. from the precomputed facet counts of catalog/facets.py).
+"""
+import base64
+import binascii
+import datetime
+import json
+import uuid
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import F, Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _to_json(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def encode_cursor(direction, values):
+    """
+    Turns a direction (NEXT/PREVIOUS) and the ordering values of a row into an opaque token.
+    """
+    data = json.dumps([direction, [_to_json(value) for value in values]], separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, size):
+    """
+    Inverse of encode_cursor(). Raises InvalidCursor for anything that was not made by it.
+    """
+    try:
+        data = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, values = json.loads(data.decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise InvalidCursor(token)
+    if direction not in (NEXT, PREVIOUS) or not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor(token)
+    return direction, values
+
+
+def field_value(field, value):
+    """
+    A value from the request (URL, cursor, ...) converted with field.to_python()
+    and checked with the field's validators. Raises ValueError if it does not fit.
+    """
+    try:
+        value = field.to_python(value)
+        field.run_validators(value)
+    except (ValidationError, TypeError):
+        raise ValueError(value)
+    #SQLite的整數欄位沒有範圍的validator，超過64位元查詢時才會OverflowError
+    if isinstance(value, int) and not -2 ** 63 <= value < 2 ** 63:
+        raise ValueError(value)
+    return value
+
+
+class KeysetPage:
+    """
+    One page of a KeysetPaginator. It has the same has_next()/has_previous()
+    interface as django.core.paginator.Page, with cursors instead of page numbers.
+    """
+    is_keyset = True
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginates `queryset` on `ordering`, a sequence of field names ('-' prefix
+    for descending) whose last field must be unique (normally 'pk').
+    NULLs sort first in ascending and last in descending order, so that a
+    descending page is the exact mirror of the ascending one.
+
+    The total row count is only computed if with_count is True.
+    """
+
+    def __init__(self, queryset, per_page, ordering, with_count=False):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.with_count = with_count
+        self.ordering = []
+        for name in ordering:
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            field = queryset.model._meta.pk if name == 'pk' else queryset.model._meta.get_field(name)
+            self.ordering.append((field, descending))
+
+    @property
+    def count(self):
+        if not self.with_count:
+            return None
+        if not hasattr(self, '_count'):
+            self._count = self.queryset.count()
+        return self._count
+
+    def order_by_expressions(self, reverse=False):
+        expressions = []
+        for field, descending in self.ordering:
+            if descending != reverse:
+                expressions.append(F(field.name).desc(nulls_last=True) if field.null else F(field.name).desc())
+            else:
+                expressions.append(F(field.name).asc(nulls_first=True) if field.null else F(field.name).asc())
+        return expressions
+
+    def _after(self, values, reverse=False):
+        """
+        Q object matching the rows that come after `values` in the ordering
+        (before them if reverse is True).
+        """
+        condition = Q(pk__in=[])
+        equal_so_far = Q()
+        for (field, descending), value in zip(self.ordering, values):
+            if descending == reverse:
+                #遞增：NULL排最前面，所以NULL之後是所有非NULL
+                after = Q(**{field.name + '__isnull': False}) if value is None else Q(**{field.name + '__gt': value})
+            else:
+                #遞減：NULL排最後面，NULL之後就沒有資料了
+                after = Q(pk__in=[]) if value is None else (
+                    Q(**{field.name + '__lt': value}) | Q(**{field.name + '__isnull': True}) if field.null
+                    else Q(**{field.name + '__lt': value}))
+            condition |= equal_so_far & after
+            if value is None:
+                equal_so_far &= Q(**{field.name + '__isnull': True})
+            else:
+                equal_so_far &= Q(**{field.name: value})
+        return condition
+
+    def _values_of(self, obj):
+        if isinstance(obj, dict):
+            #.values()查出來的dict，key是欄位名稱(外鍵可能是author或author_id)
+            return [obj[field.attname] if field.attname in obj else obj[field.name] for field, descending in self.ordering]
+        return [getattr(obj, field.attname) for field, descending in self.ordering]
+
+    def _to_python(self, cursor, values):
+        """
+        The cursor values converted with their ordering fields (strings back to dates, ...).
+        Raises InvalidCursor for a value that does not fit its field.
+        """
+        converted = []
+        for (field, descending), value in zip(self.ordering, values):
+            if value is None:
+                if not field.null:
+                    raise InvalidCursor(cursor)
+                converted.append(None)
+                continue
+            #token是使用者給的，不能相信裡面的值，查詢之前先照欄位的型別檢查
+            if isinstance(value, (bool, list, dict)):
+                raise InvalidCursor(cursor)
+            try:
+                converted.append(field_value(field, value))
+            except ValueError:
+                raise InvalidCursor(cursor)
+        return converted
+
+    def page(self, cursor=None):
+        """
+        Returns the KeysetPage that `cursor` points to (the first page if cursor is empty).
+        Raises InvalidCursor for a malformed cursor.
+        """
+        direction, values = decode_cursor(cursor, len(self.ordering)) if cursor else (NEXT, None)
+        if values is not None:
+            values = self._to_python(cursor, values)
+        reverse = direction == PREVIOUS
+        queryset = self.queryset.order_by(*self.order_by_expressions(reverse))
+        if values is not None:
+            queryset = queryset.filter(self._after(values, reverse))
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+        if not rows:
+            return KeysetPage(rows, self)
+
+        first, last = self._values_of(rows[0]), self._values_of(rows[-1])
+        if reverse:
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+        return KeysetPage(
+            rows, self,
+            next_cursor=encode_cursor(NEXT, last) if has_next else None,
+            previous_cursor=encode_cursor(PREVIOUS, first) if has_previous else None,
+        )
+
+
+class KeysetPaginationMixin:
+    """
+    ListView mixin adding cursor pagination next to the usual ?page=N.
+
+    ?cursor= (even empty) switches the view to keyset mode, add &count=1 to
+    also get the total number of rows. Without a cursor parameter the view
+    keeps using page numbers, ordered the same way.
+    """
+    keyset_ordering = ('pk',)
+    cursor_kwarg = 'cursor'
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.cursor_kwarg not in self.request.GET:
+            #分頁數字模式也用同樣的排序，兩種模式看到的順序一致
+            queryset = queryset.order_by(*KeysetPaginator(queryset, page_size, self.keyset_ordering).order_by_expressions())
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = KeysetPaginator(queryset, page_size, self.keyset_ordering,
+                                    with_count=self.request.GET.get('count') == '1')
+        try:
+            page = paginator.page(self.request.GET[self.cursor_kwarg])
+        except InvalidCursor:
+            raise Http404('Invalid cursor.')
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+
+def estimated_row_count(model, using):
+    """
+    Approximate number of rows of model's table, without scanning it. None if the database cannot tell.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            #ANALYZE/autovacuum更新的統計值；從來沒分析過的表是-1(或0)
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'sqlite':
+            #每張表都有rowid(uuid主鍵的表也有)，最大的rowid從B-tree最後面直接拿到；刪掉的列也算在內，所以是上限
+            cursor.execute('SELECT max(rowid) FROM {0}'.format(connection.ops.quote_name(table)))
+        elif connection.vendor == 'mysql':
+            cursor.execute('SELECT table_rows FROM information_schema.tables '
+                           'WHERE table_schema = DATABASE() AND table_name = %s', [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] <= 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator whose count is estimated for unfiltered querysets over
+    `estimate_above` rows (see estimated_row_count()). The last pages may
+    then be empty or missing a few rows; filtered lists are counted exactly.
+
+        class BookInstanceAdmin(admin.ModelAdmin):
+            paginator = EstimatedCountPaginator
+            show_full_result_count = False
+    """
+    estimate_above = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if hasattr(queryset, 'query') and not queryset.query.where and not queryset.query.is_sliced:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.estimate_above:
+                return estimate
+        return super().count
+
+
+class KnownCountPaginator(Paginator):
+    """
+    Paginator that uses `count` instead of running COUNT(*) (when it is not None).
+    """
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True, count=None):
+        super().__init__(object_list, per_page, orphans, allow_empty_first_page)
+        self.known_count = count
+
+    @cached_property
+    def count(self):
+        if self.known_count is not None:
+            return self.known_count
+        return super().count
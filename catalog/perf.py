@@ -0,0 +1,283 @@
+"""
+Per-request performance instrumentation.
+
+PerformanceMiddleware profiles a sample of the requests (PERF_SAMPLE_RATE,
+0 = off, 1 = every request). For a profiled request it records:
+- the wall time;
+- the number of SQL queries and their total time;
+- the duplicate queries (same SQL and parameters run again);
+- the time spent rendering templates.
+
+The numbers go to two places:
+- a Server-Timing header, when PERF_SERVER_TIMING is on. Browser dev tools
+  show it next to the request.
+- in-process histograms labelled by URL name ('book-detail',
+  'all-borrowed', ...). /metrics exposes them in the Prometheus text
+  format (METRICS_TOKEN bearer token or a staff login). Every process has
+  its own histograms, so scrape each worker.
+
+Queries are counted by an execute wrapper that every new connection gets
+(connection_created). Template time is measured by the DjangoTemplates
+backend below, set in settings.TEMPLATES. Both find the current request
+through a context variable, so the worker threads of the async views
+(catalog/async_utils.py) are counted too. Requests that are not sampled
+cost a settings lookup. Every query outside a profiled request costs one
+context variable lookup.
+"""
+import bisect
+import collections
+import hmac
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends import django as django_backend
+
+_profile = ContextVar('catalog_request_profile', default=None)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class RequestProfile:
+    """
+    What one profiled request did. Queries may be recorded from several threads.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self._statements = collections.Counter()
+        self._lock = threading.Lock()
+
+    def record_query(self, sql, params, many, duration):
+        #executemany的參數可能很大，只比SQL
+        key = (sql, None if many else repr(params))
+        with self._lock:
+            self.queries += 1
+            self.sql_time += duration
+            self._statements[key] += 1
+
+    def record_template(self, duration):
+        with self._lock:
+            self.template_time += duration
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self._statements.values() if count > 1)
+
+    def server_timing(self, elapsed):
+        return 'total;dur={0:.1f}, db;dur={1:.1f};desc="{2} queries, {3} duplicates", tpl;dur={4:.1f}'.format(
+            elapsed * 1000, self.sql_time * 1000, self.queries, self.duplicates, self.template_time * 1000)
+
+
+def current_profile():
+    return _profile.get()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _label_text(self, values, extra=()):
+        pairs = list(zip(self.labels, values)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join('{0}="{1}"'.format(name, _escape(value)) for name, value in pairs) + '}'
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def expose(self):
+        lines = ['# HELP {0} {1}'.format(self.name, self.documentation), '# TYPE {0} {1}'.format(self.name, self.kind)]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines += [line for labels, value in items for line in self._sample_lines(labels, value)]
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def _sample_lines(self, labels, value):
+        return ['{0}{1} {2}'.format(self.name, self._label_text(labels), value)]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels, buckets):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, value):
+        with self._lock:
+            #每個bucket各自的數量，後面加上sum和count
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def _sample_lines(self, labels, counts):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), counts):
+            cumulative += count
+            lines.append('{0}_bucket{1} {2}'.format(self.name, self._label_text(labels, [('le', bound)]), cumulative))
+        lines.append('{0}_sum{1} {2}'.format(self.name, self._label_text(labels), counts[-2]))
+        lines.append('{0}_count{1} {2}'.format(self.name, self._label_text(labels), counts[-1]))
+        return lines
+
+
+REQUEST_DURATION = Histogram('catalog_request_duration_seconds', 'Wall time of profiled requests.',
+                             ('view', 'method'), DURATION_BUCKETS)
+REQUEST_QUERIES = Histogram('catalog_request_queries', 'SQL queries per profiled request.', ('view',), QUERY_BUCKETS)
+REQUEST_SQL_DURATION = Histogram('catalog_request_sql_duration_seconds', 'SQL time per profiled request.',
+                                 ('view',), DURATION_BUCKETS)
+REQUEST_TEMPLATE_DURATION = Histogram('catalog_request_template_duration_seconds',
+                                      'Template rendering time per profiled request.', ('view',), DURATION_BUCKETS)
+DUPLICATE_QUERIES = Counter('catalog_request_duplicate_queries_total',
+                            'Queries that repeated an earlier query of the same request.', ('view',))
+METRICS = (REQUEST_DURATION, REQUEST_QUERIES, REQUEST_SQL_DURATION, REQUEST_TEMPLATE_DURATION, DUPLICATE_QUERIES)
+
+
+def render_metrics():
+    return '\n'.join(line for metric in METRICS for line in metric.expose()) + '\n'
+
+
+def reset_metrics():
+    for metric in METRICS:
+        metric.clear()
+
+
+def _view_name(request):
+    #沒有name的url是view的import路徑
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else 'unresolved'
+
+
+def _sampled():
+    rate = getattr(settings, 'PERF_SAMPLE_RATE', 0)
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+class PerformanceMiddleware:
+    """
+    Profiles a sample of the requests, see the module docstring. Put it first in MIDDLEWARE.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not _sampled():
+            return self.get_response(request)
+        profile = RequestProfile()
+        token = _profile.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            _profile.reset(token)
+        elapsed = time.perf_counter() - profile.started
+        view = _view_name(request)
+        REQUEST_DURATION.observe((view, request.method), elapsed)
+        REQUEST_QUERIES.observe((view,), profile.queries)
+        REQUEST_SQL_DURATION.observe((view,), profile.sql_time)
+        REQUEST_TEMPLATE_DURATION.observe((view,), profile.template_time)
+        if profile.duplicates:
+            DUPLICATE_QUERIES.inc((view,), profile.duplicates)
+        if getattr(settings, 'PERF_SERVER_TIMING', False):
+            response['Server-Timing'] = profile.server_timing(elapsed)
+        return response
+
+
+def _record_query(execute, sql, params, many, context):
+    profile = _profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.record_query(sql, params, many, time.perf_counter() - started)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    #持久連線重連時也會再收到一次
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+class Template(django_backend.Template):
+
+    def render(self, context=None, request=None):
+        profile = _profile.get()
+        if profile is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile.record_template(time.perf_counter() - started)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """
+    The Django template backend, timing the rendering of profiled requests.
+    """
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
+
+    def from_string(self, template_code):
+        return Template(super().from_string(template_code).template, self)
+
+
+def _metrics_allowed(request):
+    #METRICS_ALLOWED_IPS只是額外的限制：在反向代理後面REMOTE_ADDR都是代理的位址
+    allowed_ips = getattr(settings, 'METRICS_ALLOWED_IPS', ())
+    if allowed_ips and request.META.get('REMOTE_ADDR') not in allowed_ips:
+        return False
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        scheme, _, value = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+        if scheme.lower() == 'bearer' and hmac.compare_digest(value.strip().encode(), token.encode()):
+            return True
+    return request.user.is_active and request.user.is_staff
+
+
+def metrics(request):
+    """
+    GET /metrics: the histograms in the Prometheus text format.
+
+    Needs the METRICS_TOKEN bearer token (Authorization: Bearer ...) or a
+    logged-in staff user, and an address in METRICS_ALLOWED_IPS if that is set.
+    """
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
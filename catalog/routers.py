@@ -0,0 +1,166 @@
+"""
+Read-replica routing for the catalog pages.
+
+Reads run inside use_replicas() go to one of settings.DATABASE_REPLICAS.
+That covers the catalog list, detail and search views, the JSON API and
+the export_catalog command. Everything else reads from the primary
+('default'), and every write goes there too, so the loan path is not
+affected.
+
+Replicas lag behind the primary. After a request that wrote something,
+PrimaryPinMiddleware sets a cookie that sends that browser's reads to the
+primary for REPLICA_LAG_SECONDS, so users see their own changes. For the
+same reason a page whose models (CachedPageMixin.cache_models) changed
+within the last REPLICA_LAG_SECONDS is read from the primary. Otherwise
+a stale page would be cached under the new versions.
+
+    DATABASE_ROUTERS = ['catalog.routers.ReplicaRouter']
+    DATABASE_REPLICAS = ['replica1']
+"""
+import asyncio
+import contextlib
+import functools
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .versions import get_versions
+
+PIN_COOKIE = 'primary_pin'
+#session存在資料庫裡，存session不算寫入，不然每個造訪首頁的人都會被釘在主資料庫
+IGNORED_WRITE_APPS = ('sessions',)
+
+_replica_reads = ContextVar('catalog_replica_reads', default=False)
+_request_state = ContextVar('catalog_request_state', default=None)
+
+
+class RequestState:
+    """
+    What PrimaryPinMiddleware knows about the current request.
+    """
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+def get_replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+def lag_seconds():
+    return getattr(settings, 'REPLICA_LAG_SECONDS', 5)
+
+
+def reading_from_primary():
+    """
+    True when this request must not read from a replica: the browser is pinned or the request already wrote.
+    """
+    state = _request_state.get()
+    return state is not None and (state.pinned or state.wrote)
+
+
+def changed_recently(labels):
+    """
+    True when one of the models (labels like 'catalog.book') changed within the replica lag.
+    """
+    versions = get_versions(labels)
+    return bool(versions) and max(versions.values()) > (time.time() - lag_seconds()) * 1000
+
+
+@contextlib.contextmanager
+def use_replicas(enabled=True):
+    """
+    Lets the reads run inside this block go to a replica.
+    """
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def replica_reads(view):
+    """
+    Decorator for sync and async function views whose reads may go to a replica.
+    """
+    if asyncio.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            with use_replicas():
+                return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with use_replicas():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaReadsMixin:
+    """
+    The replica_reads() of class-based views. Put it before CachedPageMixin.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        labels = self.get_cache_models() if hasattr(self, 'get_cache_models') else ()
+        with use_replicas(not (labels and changed_recently(labels))):
+            return super().dispatch(request, *args, **kwargs)
+
+
+class PrimaryPinMiddleware:
+    """
+    Pins a browser to the primary database for REPLICA_LAG_SECONDS after one of its requests wrote.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RequestState(pinned=PIN_COOKIE in request.COOKIES)
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        if state.wrote:
+            response.set_cookie(PIN_COOKIE, '1', max_age=lag_seconds(), httponly=True, samesite='Lax')
+        return response
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get() or reading_from_primary():
+            return None
+        replicas = get_replicas()
+        if not replicas:
+            return None
+        #關聯的物件從同一個副本讀，兩個副本的進度可能不一樣
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db in replicas:
+            return instance._state.db
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None and model._meta.app_label not in IGNORED_WRITE_APPS:
+            state.wrote = True
+        #一定要明確回傳，不然從副本讀出來的物件save()時Django會寫回那個副本
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        #副本的schema由複寫跟著主資料庫走
+        if db in get_replicas():
+            return False
+        return None
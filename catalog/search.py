@@ -0,0 +1,295 @@
+"""
+Full-text search over books (title, summary, ISBN, author name and genres).
+
+The backend depends on the database:
+
+* sqlite:     an FTS5 virtual table (catalog_book_fts, created by migration
+              0007) kept in sync by the signal handlers in catalog/signals.py.
+* postgresql: a stored, GIN indexed tsvector per book (catalog_book_search,
+              created by migration 0013), also kept in sync by the signals.
+* others:     icontains on every field, which is slow but always works.
+
+Every backend returns hits as dicts with the book id, a rank and HTML
+safe, highlighted title and summary snippets.
+"""
+import re
+
+from django.db import connection, connections, router
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Book
+
+FTS_TABLE = 'catalog_book_fts'
+SEARCH_TABLE = 'catalog_book_search'
+#bm25的欄位權重，順序必須跟FTS表的欄位一樣：title, author, genre, isbn, summary
+FTS_WEIGHTS = (10.0, 5.0, 2.0, 3.0, 1.0)
+SNIPPET_TOKENS = 24
+
+#highlight()先用控制字元標記命中的字，escape之後再換成<mark>，避免把書的內容當成HTML
+_MARK_START = '\x02'
+_MARK_END = '\x03'
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def query_terms(query):
+    """
+    Splits the user's query into words. Everything else (quotes, operators, ...) is dropped.
+    """
+    return _WORD_RE.findall(query or '')
+
+
+def _read_connection():
+    #搜尋只有讀，跟ORM查詢一樣交給router決定(可能是唯讀副本，見catalog/routers.py)
+    return connections[router.db_for_read(Book)]
+
+
+def _to_html(text):
+    return mark_safe(escape(text).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>'))
+
+
+def book_documents(book_ids):
+    """
+    Returns {book_id: {'title', 'author', 'genre', 'isbn', 'summary'}} for the
+    given books, with two queries whatever the number of books.
+    """
+    documents = {}
+    for row in Book.objects.filter(pk__in=book_ids).values(
+            'pk', 'title', 'summary', 'isbn', 'author__first_name', 'author__last_name'):
+        documents[row['pk']] = {
+            'title': row['title'],
+            'author': ' '.join(name for name in (row['author__first_name'], row['author__last_name']) if name),
+            'genre': [],
+            'isbn': row['isbn'],
+            'summary': row['summary'],
+        }
+    for book_id, genre in Book.genre.through.objects.filter(book_id__in=book_ids).values_list('book_id', 'genre__name'):
+        documents[book_id]['genre'].append(genre)
+    for document in documents.values():
+        document['genre'] = ', '.join(document['genre'])
+    return documents
+
+
+class SqliteFtsBackend:
+    """
+    SQLite FTS5 backend. The rowid of catalog_book_fts is the Book id.
+    """
+
+    def index_books(self, book_ids):
+        book_ids = list(book_ids)
+        if not book_ids:
+            return
+        documents = book_documents(book_ids)
+        with connection.cursor() as cursor:
+            self._delete(cursor, book_ids)
+            cursor.executemany(
+                'INSERT INTO {0} (rowid, title, author, genre, isbn, summary) VALUES (%s, %s, %s, %s, %s, %s)'.format(FTS_TABLE),
+                [(book_id, doc['title'], doc['author'], doc['genre'], doc['isbn'], doc['summary'])
+                 for book_id, doc in documents.items()])
+
+    def remove_books(self, book_ids):
+        book_ids = list(book_ids)
+        if book_ids:
+            with connection.cursor() as cursor:
+                self._delete(cursor, book_ids)
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM {0}'.format(FTS_TABLE))
+
+    def _delete(self, cursor, book_ids):
+        #SQLite一次最多999個參數
+        for start in range(0, len(book_ids), 500):
+            chunk = book_ids[start:start + 500]
+            cursor.execute('DELETE FROM {0} WHERE rowid IN ({1})'.format(FTS_TABLE, ', '.join(['%s'] * len(chunk))), chunk)
+
+    def _match(self, terms):
+        #每個字都加上引號並做字首比對，使用者輸入的字不會被當成FTS5語法
+        return ' '.join('"{0}"*'.format(term) for term in terms)
+
+    def count(self, terms):
+        with _read_connection().cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM {0} WHERE {0} MATCH %s'.format(FTS_TABLE), [self._match(terms)])
+            return cursor.fetchone()[0]
+
+    def search(self, terms, offset, limit):
+        sql = (
+            'SELECT rowid, bm25({0}, {1}) AS rank, '
+            "highlight({0}, 0, %s, %s), snippet({0}, 4, %s, %s, '...', %s) "
+            'FROM {0} WHERE {0} MATCH %s ORDER BY rank LIMIT %s OFFSET %s'
+        ).format(FTS_TABLE, ', '.join(str(weight) for weight in FTS_WEIGHTS))
+        params = [_MARK_START, _MARK_END, _MARK_START, _MARK_END, SNIPPET_TOKENS,
+                  self._match(terms), limit, offset]
+        with _read_connection().cursor() as cursor:
+            cursor.execute(sql, params)
+            #bm25()越小越相關，轉成越大越相關
+            return [{'book_id': row[0], 'rank': -row[1], 'title': _to_html(row[2]), 'snippet': _to_html(row[3])}
+                    for row in cursor.fetchall()]
+
+
+class PostgresBackend:
+    """
+    PostgreSQL backend. catalog_book_search (created by migration 0013) holds
+    a weighted tsvector per book with a GIN index; it is kept in sync by the
+    signal handlers like the SQLite FTS table.
+    """
+    #跟FTS表一樣的欄位，權重A最高
+    WEIGHTS = (('title', 'A'), ('author', 'B'), ('genre', 'C'), ('isbn', 'C'), ('summary', 'D'))
+
+    def index_books(self, book_ids):
+        book_ids = list(book_ids)
+        if not book_ids:
+            return
+        documents = book_documents(book_ids)
+        vector = ' || '.join("setweight(to_tsvector(%s), '{0}')".format(weight) for name, weight in self.WEIGHTS)
+        with connection.cursor() as cursor:
+            #已經刪掉的書
+            self._delete(cursor, [book_id for book_id in book_ids if book_id not in documents])
+            cursor.executemany(
+                'INSERT INTO {0} (book_id, document) VALUES (%s, {1}) '
+                'ON CONFLICT (book_id) DO UPDATE SET document = EXCLUDED.document'.format(SEARCH_TABLE, vector),
+                [[book_id] + [doc[name] for name, weight in self.WEIGHTS] for book_id, doc in documents.items()])
+
+    def remove_books(self, book_ids):
+        book_ids = list(book_ids)
+        if book_ids:
+            with connection.cursor() as cursor:
+                self._delete(cursor, book_ids)
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute('TRUNCATE {0}'.format(SEARCH_TABLE))
+
+    def _delete(self, cursor, book_ids):
+        if book_ids:
+            cursor.execute('DELETE FROM {0} WHERE book_id = ANY(%s)'.format(SEARCH_TABLE), [book_ids])
+
+    def _query(self, terms):
+        #query_terms()只留下\w+，不會有tsquery的運算子；每個字做字首比對
+        return ' & '.join(term + ':*' for term in terms)
+
+    def count(self, terms):
+        #document @@ query走GIN index，不用每一列重新算tsvector
+        with _read_connection().cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM {0} s JOIN catalog_book b ON b.id = s.book_id '
+                           'WHERE s.document @@ to_tsquery(%s)'.format(SEARCH_TABLE), [self._query(terms)])
+            return cursor.fetchone()[0]
+
+    def search(self, terms, offset, limit):
+        #先排序取出這一頁，ts_headline只算這一頁的書
+        sql = (
+            'SELECT b.id, hits.rank, ts_headline(b.title, hits.query, %s), ts_headline(b.summary, hits.query, %s) '
+            'FROM (SELECT s.book_id, ts_rank(s.document, q.query) AS rank, q.query '
+            '      FROM {0} s JOIN catalog_book b ON b.id = s.book_id, to_tsquery(%s) AS q(query) '
+            '      WHERE s.document @@ q.query ORDER BY rank DESC, s.book_id LIMIT %s OFFSET %s) hits '
+            'JOIN catalog_book b ON b.id = hits.book_id ORDER BY hits.rank DESC, b.id'
+        ).format(SEARCH_TABLE)
+        options = 'StartSel={0}, StopSel={1}'.format(_MARK_START, _MARK_END)
+        params = [options, options + ', MaxWords={0}'.format(SNIPPET_TOKENS), self._query(terms), limit, offset]
+        with _read_connection().cursor() as cursor:
+            cursor.execute(sql, params)
+            return [{'book_id': row[0], 'rank': row[1], 'title': _to_html(row[2]), 'snippet': _to_html(row[3])}
+                    for row in cursor.fetchall()]
+
+
+class SimpleBackend:
+    """
+    Fallback for databases without full-text search: icontains on every word.
+    """
+
+    def index_books(self, book_ids):
+        pass
+
+    def remove_books(self, book_ids):
+        pass
+
+    def clear(self):
+        pass
+
+    def _queryset(self, terms):
+        queryset = Book.objects.all()
+        for term in terms:
+            queryset = queryset.filter(
+                Q(title__icontains=term) | Q(summary__icontains=term) | Q(isbn__icontains=term)
+                | Q(author__first_name__icontains=term) | Q(author__last_name__icontains=term)
+                | Q(genre__name__icontains=term))
+        return queryset.distinct().order_by('title', 'pk')
+
+    def count(self, terms):
+        return self._queryset(terms).count()
+
+    def _highlight(self, text, terms):
+        pattern = re.compile('|'.join(re.escape(term) for term in terms), re.IGNORECASE)
+        return _to_html(pattern.sub(lambda m: _MARK_START + m.group(0) + _MARK_END, text))
+
+    def search(self, terms, offset, limit):
+        rows = self._queryset(terms).values_list('pk', 'title', 'summary')[offset:offset + limit]
+        return [{'book_id': pk, 'rank': 0, 'title': self._highlight(title, terms),
+                 'snippet': self._highlight(summary[:300], terms)} for pk, title, summary in rows]
+
+
+def get_backend():
+    if connection.vendor == 'sqlite':
+        return SqliteFtsBackend()
+    if connection.vendor == 'postgresql':
+        return PostgresBackend()
+    return SimpleBackend()
+
+
+class SearchResults:
+    """
+    Lazy, sliceable search results, so they can be handed to django.core.paginator.Paginator:
+    only the count and the requested slice are queried.
+    """
+
+    def __init__(self, query, backend=None):
+        self.terms = query_terms(query)
+        self.backend = backend or get_backend()
+
+    def count(self):
+        if not hasattr(self, '_count'):
+            self._count = self.backend.count(self.terms) if self.terms else 0
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        if not self.terms or stop is None or stop <= start:
+            return []
+        hits = self.backend.search(self.terms, start, stop - start)
+        #一次把這頁的書跟作者撈出來，每筆hit都帶著book物件
+        books = Book.objects.select_related('author').in_bulk([hit['book_id'] for hit in hits])
+        for hit in hits:
+            hit['book'] = books.get(hit['book_id'])
+        return [hit for hit in hits if hit['book'] is not None]
+
+
+def index_books(book_ids):
+    get_backend().index_books(book_ids)
+
+
+def remove_books(book_ids):
+    get_backend().remove_books(book_ids)
+
+
+def rebuild_index(batch_size=500):
+    """
+    Drops and rebuilds the whole search index. Returns the number of indexed books.
+    """
+    backend = get_backend()
+    backend.clear()
+    indexed = 0
+    last_pk = 0
+    while True:
+        book_ids = list(Book.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not book_ids:
+            return indexed
+        backend.index_books(book_ids)
+        indexed += len(book_ids)
+        last_pk = book_ids[-1]
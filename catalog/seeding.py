@@ -0,0 +1,191 @@
+"""
+Synthetic catalog data (used by "manage.py seed_catalog" and the benchmarks).
+
+The same seed on the same database gives the same rows (except the loan
+dates, which are relative to `today`); seeding again continues with new
+rows instead of repeating the first ones. The rows are spread like a real library:
+- a few prolific authors and many with one or two books;
+- mostly English books;
+- one to three genres per book, the common genres more often;
+- most copies available, about a third on loan (some of them overdue),
+  a few reserved or in maintenance.
+
+Rows are written with bulk_create() in chunks of `batch_size` books, one
+transaction per chunk. As in catalog/importer.py, the derived data that
+the signal handlers normally maintain is updated explicitly: copy
+counters are computed before the insert, the search index and the facet
+counts are updated per chunk, and the page versions and dashboard counters
+at the end.
+"""
+import datetime
+import random
+import time
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Max
+
+from . import facets, search
+from .counters import STATUS_COUNTER_FIELDS
+from .importer import bulk_create_with_pks
+from .models import Author, Book, BookInstance, Genre, Language
+from .stats import invalidate_dashboard_counts
+from .versions import bump_versions
+
+#名稱, 權重
+GENRES = (
+    ('Fiction', 30), ('Fantasy', 15), ('Science Fiction', 12), ('Mystery', 12), ('Romance', 10),
+    ('History', 8), ('Biography', 6), ('Poetry', 4), ('Philosophy', 3), ('Science', 6),
+    ('Children', 8), ('Travel', 3),
+)
+LANGUAGES = (
+    ('English', 60), ('Chinese', 10), ('Spanish', 8), ('French', 7), ('German', 6),
+    ('Japanese', 5), ('Italian', 3), ('Portuguese', 1),
+)
+COPY_STATUSES = (('a', 55), ('o', 30), ('r', 5), ('m', 10))
+#借出的副本有多少比例已經逾期
+OVERDUE_SHARE = 0.2
+LOAN_DAYS = 21
+BOOKS_PER_AUTHOR = 8
+READER_PREFIX = 'reader'
+
+WORDS = (
+    'shadow river night city garden winter silver stone house dream fire glass wind empire island '
+    'letter summer forest secret storm light road ocean mountain song mirror king queen war memory '
+    'kingdom star machine voyage harbor crown lantern bridge clock winter tide desert moon child '
+    'ghost north library last first long silent hidden broken golden lost'
+).split()
+FIRST_NAMES = ('Ada Alan Anne Bram Chen Clara Dara Elena Emil Farah Grace Hana Ivan Jane Jun Kofi Lena '
+               'Luis Maya Mei Nils Omar Priya Rosa Sam Sofia Tomas Ursula Wei Yara Zoe').split()
+LAST_NAMES = ('Abbott Baker Chan Dubois Evans Fischer Garcia Hughes Ito Jensen Kim Lopez Morris Nakamura '
+              'Okafor Patel Quinn Rossi Schmidt Tanaka Usman Varga Wang Xu Young Zhang').split()
+
+
+class SeedStats:
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.books = 0
+        self.copies = 0
+        self.authors = 0
+        self.users = 0
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.start
+
+    def __str__(self):
+        return ('{0.books} books, {0.copies} copies, {0.authors} authors, {0.users} users '
+                'in {0.elapsed:.1f}s').format(self)
+
+
+def _weighted(rng, choices):
+    names = [name for name, weight in choices]
+    return rng.choices(names, weights=[weight for name, weight in choices])[0]
+
+
+def _phrase(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def _named(model, names):
+    existing = dict(model.objects.filter(name__in=names).values_list('name', 'pk'))
+    missing = [model(name=name) for name in names if name not in existing]
+    with transaction.atomic():
+        for obj in bulk_create_with_pks(model, missing, len(missing) or 1):
+            existing[obj.name] = obj.pk
+    return existing
+
+
+def seed_users(count, rng, batch_size=1000):
+    """
+    Creates readers reader000001 ... (the existing ones are kept) and returns their ids.
+    They cannot log in; hashing a password per user would take longer than the rest of the seed.
+    """
+    usernames = ['{0}{1:06d}'.format(READER_PREFIX, n) for n in range(1, count + 1)]
+    password = make_password(None)
+    User.objects.bulk_create([User(username=username, password=password, email=username + '@example.com',
+                                   first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES))
+                              for username in usernames], batch_size=batch_size, ignore_conflicts=True)
+    ids = dict(User.objects.filter(username__startswith=READER_PREFIX).values_list('username', 'pk'))
+    return [ids[username] for username in usernames]
+
+
+def seed_catalog(books, copies_per_book=3, users=100, seed=0, today=None, batch_size=1000, on_batch=None,
+                 author_id=None):
+    """
+    Adds `books` books with about `copies_per_book` copies each, their authors, and
+    `users` readers who borrow the copies on loan. Returns the SeedStats.
+    With `author_id` all the books are written by that existing author.
+    """
+    #接在目前最大的book id後面：ISBN不會撞號，再執行一次也不會產生一樣的副本uuid
+    first_id = (Book.objects.aggregate(max_pk=Max('pk'))['max_pk'] or 0) + 1
+    rng = random.Random('{0}:{1}'.format(seed, first_id))
+    today = today or datetime.date.today()
+    stats = SeedStats()
+
+    genres = _named(Genre, [name for name, weight in GENRES])
+    languages = _named(Language, [name for name, weight in LANGUAGES])
+    reader_ids = seed_users(users, rng, batch_size)
+    stats.users = len(reader_ids)
+
+    if author_id is not None:
+        author_ids = [author_id]
+    else:
+        authors = [Author(first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES),
+                          date_of_birth=datetime.date(rng.randint(1850, 1995), rng.randint(1, 12), rng.randint(1, 28)))
+                   for _ in range(max(1, books // BOOKS_PER_AUTHOR))]
+        with transaction.atomic():
+            author_ids = [author.pk for author in bulk_create_with_pks(Author, authors, batch_size)]
+        stats.authors = len(author_ids)
+
+    for start in range(0, books, batch_size):
+        chunk = []
+        copies = []
+        for n in range(start, min(start + batch_size, books)):
+            #作者的書數量偏斜：少數作者寫很多本
+            book = Book(title=_phrase(rng, rng.randint(1, 4)).title(),
+                        summary=' '.join(_phrase(rng, 12).capitalize() + '.' for _ in range(3)),
+                        isbn='978{0:010d}'.format(first_id + n),
+                        author_id=author_ids[int(len(author_ids) * rng.random() ** 2)],
+                        language_id=languages[_weighted(rng, LANGUAGES)])
+            book_genres = {genres[_weighted(rng, GENRES)] for _ in range(rng.choice((1, 1, 2, 2, 3)))}
+            book_copies = []
+            for _ in range(max(0, round(rng.gauss(copies_per_book, copies_per_book / 3.0)))):
+                copy = BookInstance(id=uuid.UUID(int=rng.getrandbits(128), version=4),
+                                    imprint='{0} Press, {1}'.format(rng.choice(LAST_NAMES), rng.randint(1950, 2021)),
+                                    status=_weighted(rng, COPY_STATUSES))
+                if copy.status in ('o', 'r') and reader_ids:
+                    copy.borrower_id = rng.choice(reader_ids)
+                if copy.status == 'o':
+                    overdue = rng.random() < OVERDUE_SHARE
+                    copy.due_back = today + datetime.timedelta(
+                        days=-rng.randint(1, 60) if overdue else rng.randint(0, LOAN_DAYS))
+                field = STATUS_COUNTER_FIELDS[copy.status]
+                setattr(book, field, getattr(book, field) + 1)
+                book_copies.append(copy)
+            chunk.append((book, book_genres, book_copies))
+
+        with transaction.atomic():
+            created = bulk_create_with_pks(Book, [book for book, book_genres, book_copies in chunk], batch_size)
+            Book.genre.through.objects.bulk_create(
+                [Book.genre.through(book_id=book.pk, genre_id=genre_id)
+                 for book, book_genres, book_copies in chunk for genre_id in sorted(book_genres)],
+                batch_size=batch_size)
+            for book, book_genres, book_copies in chunk:
+                for copy in book_copies:
+                    copy.book_id = book.pk
+                    copies.append(copy)
+            BookInstance.objects.bulk_create(copies, batch_size=batch_size)
+            search.index_books([book.pk for book in created])
+            facets.add_books([book.pk for book in created])
+        stats.books += len(created)
+        stats.copies += len(copies)
+        if on_batch:
+            on_batch(stats)
+
+    invalidate_dashboard_counts()
+    bump_versions('catalog.book', 'catalog.author', 'catalog.genre', 'catalog.language', 'catalog.bookinstance')
+    return stats
@@ -0,0 +1,262 @@
+"""
+Signal handlers that keep derived catalog data in sync with the models.
+They are connected in CatalogConfig.ready().
+"""
+from collections import Counter
+
+from django.contrib.auth.models import Group, Permission, User
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .counters import apply_copy_transition
+from .facets import apply_deltas, book_keys, genre_keys
+from . import search
+from .models import Author, Book, BookInstance, Genre, Language
+from .stats import invalidate_dashboard_counts
+from .versions import bump_versions, user_version_label
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=BookInstance)
+@receiver(post_delete, sender=BookInstance)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def invalidate_dashboard_counts_on_change(sender, **kwargs):
+    """
+    Throws away only the home page counters that belong to the changed model.
+    """
+    invalidate_dashboard_counts(sender._meta.model_name)
+
+
+#記住BookInstance從db載入時的book/status，存檔的時候才知道是從哪個狀態變成哪個狀態
+#用__dict__取值是為了避免.only()/.defer()的時候又多查一次db
+_UNKNOWN = object()
+
+
+def _remember_counted_state(instance):
+    instance._counted_state = (
+        instance.__dict__.get('book_id', _UNKNOWN),
+        instance.__dict__.get('status', _UNKNOWN),
+    )
+
+
+@receiver(post_init, sender=BookInstance)
+def remember_copy_state(sender, instance, **kwargs):
+    #post_init的時候_state.adding一定還是True(from_db之後才改)，新物件存檔時看created參數即可
+    _remember_counted_state(instance)
+
+
+@receiver(pre_save, sender=BookInstance)
+def load_unknown_copy_state(sender, instance, raw=False, **kwargs):
+    """
+    If book/status were deferred when the copy was loaded, reads them back now,
+    before the row is overwritten.
+    """
+    if raw or instance._state.adding or _UNKNOWN not in instance._counted_state:
+        return
+    instance._counted_state = (BookInstance.objects.filter(pk=instance.pk)
+                               .values_list('book_id', 'status').first() or (None, None))
+
+
+@receiver(post_save, sender=BookInstance)
+def update_copy_counters_on_save(sender, instance, created, raw=False, **kwargs):
+    """
+    Moves the copy from its old (book, status) counter to the new one.
+    """
+    if raw:
+        #loaddata的時候不處理，載入完之後再跑 manage.py rebuild_copy_counts
+        return
+    old_book_id, old_status = (None, None) if created else instance._counted_state
+    apply_copy_transition(old_book_id, old_status, instance.book_id, instance.status)
+    _remember_counted_state(instance)
+
+
+@receiver(post_delete, sender=BookInstance)
+def update_copy_counters_on_delete(sender, instance, **kwargs):
+    apply_copy_transition(instance.book_id, instance.status, None, None)
+
+
+#全文檢索索引：書本身、作者名字、genre名稱有變動的時候，都要重新建立相關書的索引
+@receiver(post_save, sender=Book)
+def index_book_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_books([instance.pk])
+
+
+@receiver(post_delete, sender=Book)
+def remove_book_from_index(sender, instance, **kwargs):
+    search.remove_books([instance.pk])
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def index_books_on_genre_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        #genre.book_set.clear()的post_clear不會給pk_set，要先記下來
+        instance._search_book_ids = list(instance.book_set.values_list('pk', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        search.index_books([instance.pk])
+    elif action == 'post_clear':
+        search.index_books(instance.__dict__.pop('_search_book_ids', []))
+    else:
+        search.index_books(pk_set)
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def touch_books_on_genre_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Updates Book.updated_at when its genres change, so incremental exports pick the book up.
+    """
+    if reverse and action == 'pre_clear':
+        instance._touch_book_ids = list(instance.book_set.values_list('pk', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        book_ids = [instance.pk]
+    elif action == 'post_clear':
+        book_ids = instance.__dict__.pop('_touch_book_ids', [])
+    else:
+        book_ids = pk_set
+    Book.objects.filter(pk__in=book_ids).update(updated_at=timezone.now())
+
+
+def _related_book_ids(instance):
+    if isinstance(instance, Author):
+        return list(Book.objects.filter(author=instance).values_list('pk', flat=True))
+    return list(Book.objects.filter(genre=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Genre)
+def index_related_books_on_save(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        search.index_books(_related_book_ids(instance))
+
+
+@receiver(pre_delete, sender=Author)
+@receiver(pre_delete, sender=Genre)
+def remember_related_books(sender, instance, **kwargs):
+    #刪除之後就查不到是哪些書了(SET_NULL / 中介表直接刪除，不會送signal)
+    instance._search_book_ids = _related_book_ids(instance)
+
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Genre)
+def index_related_books_on_delete(sender, instance, **kwargs):
+    search.index_books(instance.__dict__.pop('_search_book_ids', []))
+
+
+#瀏覽用的種類/語言數量(catalog/facets.py)
+#跟副本計數器一樣，記住Book載入時的語言，存檔的時候才知道是從哪個語言換到哪個語言
+@receiver(post_init, sender=Book)
+def remember_book_language(sender, instance, **kwargs):
+    instance._faceted_language = instance.__dict__.get('language_id', _UNKNOWN)
+
+
+@receiver(pre_save, sender=Book)
+def load_unknown_book_language(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding or instance._faceted_language is not _UNKNOWN:
+        return
+    instance._faceted_language = Book.objects.filter(pk=instance.pk).values_list('language_id', flat=True).first()
+
+
+def _genre_ids(book_id):
+    return list(Book.genre.through.objects.filter(book_id=book_id).values_list('genre_id', flat=True))
+
+
+@receiver(post_save, sender=Book)
+def update_facets_on_book_save(sender, instance, created, raw=False, **kwargs):
+    """
+    Counts a new book in its language, or moves a book (and its genres) to its new language.
+    """
+    if raw:
+        return
+    old_language, new_language = None if created else instance._faceted_language, instance.language_id
+    instance._faceted_language = new_language
+    if old_language == new_language:
+        return
+    #新書還沒有genre(genre是存檔之後才加的)
+    genre_ids = [] if created else _genre_ids(instance.pk)
+    deltas = Counter(book_keys(genre_ids, new_language))
+    deltas.subtract(book_keys(genre_ids, old_language))
+    apply_deltas(deltas)
+
+
+@receiver(pre_delete, sender=Book)
+def remember_book_facets(sender, instance, **kwargs):
+    #刪除的時候中介表的列會先被直接刪掉(不會送m2m_changed)
+    instance._facet_keys = book_keys(_genre_ids(instance.pk), instance.language_id)
+
+
+@receiver(post_delete, sender=Book)
+def update_facets_on_book_delete(sender, instance, **kwargs):
+    apply_deltas(Counter({key: -1 for key in instance.__dict__.pop('_facet_keys', [])}))
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def update_facets_on_genre_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Counts added genre links and uncounts removed ones, from either side (book.genre / genre.book_set).
+    """
+    if action == 'pre_clear':
+        links = Book.genre.through.objects.filter(**{'genre_id' if reverse else 'book_id': instance.pk})
+        instance._facet_links = set(links.values_list('book_id' if reverse else 'genre_id', flat=True))
+        return
+    if action == 'pre_remove':
+        #remove()的pk_set是要求移除的全部，沒有連結的也在裡面
+        links = Book.genre.through.objects.filter(**{'genre_id' if reverse else 'book_id': instance.pk})
+        instance._facet_links = set(links.filter(**{'book_id__in' if reverse else 'genre_id__in': pk_set})
+                                    .values_list('book_id' if reverse else 'genre_id', flat=True))
+        return
+    if action == 'post_add':
+        linked, sign = pk_set, 1
+    elif action in ('post_remove', 'post_clear'):
+        linked, sign = instance.__dict__.pop('_facet_links', set()), -1
+    else:
+        return
+    deltas = Counter()
+    if reverse:
+        for language_id in Book.objects.filter(pk__in=linked).values_list('language_id', flat=True):
+            deltas.update(genre_keys(instance.pk, language_id))
+    else:
+        for genre_id in linked:
+            deltas.update(genre_keys(genre_id, instance.language_id))
+    apply_deltas({key: sign * number for key, number in deltas.items()})
+
+
+#HTTP cache(ETag/Last-Modified)用的版本戳記，見catalog/versions.py
+VERSIONED_MODELS = (Author, Book, BookInstance, Genre, Language, Group, Permission)
+
+
+def bump_model_version(sender, **kwargs):
+    bump_versions(sender._meta.label_lower)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def bump_user_version(sender, instance, **kwargs):
+    #每次登入都會更新last_login，只讓這個使用者自己的頁面失效
+    bump_versions(sender._meta.label_lower, user_version_label(instance.pk))
+
+
+def bump_m2m_versions(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    labels = [instance._meta.label_lower, model._meta.label_lower]
+    if isinstance(instance, User):
+        labels.append(user_version_label(instance.pk))
+    elif model is User:
+        #從group那一側修改成員時，pk_set是使用者(clear的時候沒有pk_set，不過auth.group的版本也變了)
+        labels.extend(user_version_label(pk) for pk in pk_set or ())
+    bump_versions(*labels)
+
+
+for versioned_model in VERSIONED_MODELS:
+    post_save.connect(bump_model_version, sender=versioned_model, dispatch_uid='bump_version_save_' + versioned_model._meta.label_lower)
+    post_delete.connect(bump_model_version, sender=versioned_model, dispatch_uid='bump_version_delete_' + versioned_model._meta.label_lower)
+
+for through in (Book.genre.through, User.groups.through, User.user_permissions.through, Group.permissions.through):
+    m2m_changed.connect(bump_m2m_versions, sender=through, dispatch_uid='bump_version_m2m_' + through._meta.label_lower)
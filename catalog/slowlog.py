@@ -0,0 +1,291 @@
+"""
+Slow query log for the catalog views and the admin.
+
+Every SQL statement run while one of those views handles a request and
+taking longer than SLOW_QUERY_MS milliseconds is appended to the
+SLOW_QUERY_LOG file (JSON lines). Each entry holds:
+- the statement's fingerprint: literals and placeholders replaced by ?,
+  IN lists collapsed;
+- the view and the line of catalog code that ran it;
+- a sample of the parameters, only if SLOW_QUERY_LOG_PARAMS is True;
+- the plan: EXPLAIN on PostgreSQL, EXPLAIN QUERY PLAN on SQLite.
+
+Statements on the session, user and token tables never have their
+parameters or plan recorded, because these hold session keys, session
+data and password hashes (a PostgreSQL plan shows the parameter values).
+
+The file is a ring buffer. It keeps the last SLOW_QUERY_LOG_SIZE entries
+of all processes, which take an flock on SLOW_QUERY_LOG + '.lock' to
+append or trim it. "manage.py slow_queries" lists the fingerprints that
+cost the most time in total.
+
+The log is off unless SLOW_QUERY_MS is set (the default None turns it
+off). Queries outside these views cost one context variable lookup.
+"""
+import contextlib
+import datetime
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import traceback
+from contextvars import ContextVar
+
+try:
+    import fcntl
+except ImportError:
+    #Windows沒有flock，只鎖同一個process裡的thread
+    fcntl = None
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+PARAMS_SAMPLE_LENGTH = 200
+SQL_LENGTH = 2000
+#只對讀取的語句跑EXPLAIN(PostgreSQL的EXPLAIN不會真的執行，但保守一點)
+EXPLAINABLE = ('SELECT', 'WITH')
+#這些表的參數是session key、session內容、密碼hash，不寫進檔案(plan裡也會有參數值)
+REDACTED_TABLES = ('django_session', 'auth_user', 'authtoken_token')
+
+_request = ContextVar('catalog_slowlog_request', default=None)
+_file_lock = threading.Lock()
+_appended = 0
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_RE = re.compile(r'%s|\?')
+_IN_LIST_RE = re.compile(r'\bIN \((?:\?, )*\?\)', re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s+')
+_REDACTED_RE = re.compile(r'\b(?:{0})\b'.format('|'.join(REDACTED_TABLES)))
+_CATALOG_DIR = os.path.dirname(os.path.abspath(__file__))
+#middleware和execute wrapper本身不算呼叫的地方
+_SKIPPED_FILES = {os.path.join(_CATALOG_DIR, name) for name in ('slowlog.py', 'perf.py', 'routers.py')}
+
+
+class RequestInfo:
+    """
+    The view handling the current request; None until process_view, and for views that are not logged.
+    """
+
+    def __init__(self):
+        self.view = None
+        self.explaining = False
+
+
+def fingerprint(sql):
+    """
+    Returns (id, normalized statement): the same query with other values gives the same id.
+    """
+    statement = _STRING_RE.sub('?', sql)
+    statement = _PLACEHOLDER_RE.sub('?', statement)
+    statement = _NUMBER_RE.sub('?', statement)
+    statement = _IN_LIST_RE.sub('IN (...)', statement)
+    statement = _SPACE_RE.sub(' ', statement).strip()
+    return hashlib.md5(statement.encode()).hexdigest()[:12], statement
+
+
+def call_site():
+    """
+    The innermost frame of catalog code (not this module) that led to the query, as "file:line in function".
+    """
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if filename.startswith(_CATALOG_DIR) and filename not in _SKIPPED_FILES:
+            return '{0}:{1} in {2}'.format(os.path.relpath(filename, os.path.dirname(_CATALOG_DIR)), frame.lineno,
+                                           frame.name)
+    return None
+
+
+def explain(connection, sql, params):
+    """
+    Returns the plan of a SELECT as a list of lines, or None.
+    """
+    if not sql.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    try:
+        #EXPLAIN失敗也不能弄壞外面的transaction
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute('{0} {1}'.format(connection.ops.explain_query_prefix(), sql), params)
+                return [str(row[-1]) for row in cursor.fetchall()]
+    except DatabaseError:
+        return None
+
+
+@contextlib.contextmanager
+def _locked(path):
+    #別的process也會寫同一個檔案：寫入和截短都要拿同一個鎖檔的flock，
+    #不然截短時讀完舊內容、還沒os.replace之前別人寫的那幾筆會不見
+    with _file_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(path + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _trim(path, size):
+    with open(path, encoding='utf-8') as log:
+        lines = log.readlines()
+    if len(lines) <= size:
+        return
+    temporary = path + '.tmp'
+    with open(temporary, 'w', encoding='utf-8') as log:
+        log.writelines(lines[-size:])
+    os.replace(temporary, path)
+
+
+def append_entry(entry):
+    """
+    Appends an entry to SLOW_QUERY_LOG, dropping the oldest ones beyond SLOW_QUERY_LOG_SIZE.
+    """
+    global _appended
+    path = settings.SLOW_QUERY_LOG
+    size = getattr(settings, 'SLOW_QUERY_LOG_SIZE', 1000)
+    with _locked(path):
+        with open(path, 'a', encoding='utf-8') as log:
+            log.write(json.dumps(entry, default=str) + '\n')
+        #不用每次都數行數：每寫size筆檢查一次，檔案最多是size的兩倍左右
+        _appended += 1
+        if _appended >= size:
+            _appended = 0
+            _trim(path, size)
+
+
+def read_entries(path=None):
+    path = path or settings.SLOW_QUERY_LOG
+    if not os.path.exists(path):
+        return []
+    entries = []
+    with open(path, encoding='utf-8') as log:
+        for line in log:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                #另一個process寫到一半的行
+                continue
+    return entries[-getattr(settings, 'SLOW_QUERY_LOG_SIZE', 1000):]
+
+
+def clear_entries():
+    path = settings.SLOW_QUERY_LOG
+    with _locked(path):
+        if os.path.exists(path):
+            os.remove(path)
+    if os.path.exists(path + '.lock'):
+        os.remove(path + '.lock')
+
+
+def top_offenders(entries, limit=10):
+    """
+    Groups entries by fingerprint, most total time first.
+    """
+    groups = {}
+    for entry in entries:
+        group = groups.setdefault(entry['fingerprint'], {
+            'fingerprint': entry['fingerprint'],
+            'statement': entry['statement'],
+            'count': 0,
+            'total_ms': 0.0,
+            'max_ms': 0.0,
+            'views': set(),
+            'call_sites': set(),
+        })
+        group['count'] += 1
+        group['total_ms'] += entry['ms']
+        group['max_ms'] = max(group['max_ms'], entry['ms'])
+        group['views'].add(entry['view'])
+        if entry.get('call_site'):
+            group['call_sites'].add(entry['call_site'])
+        #最新一筆的參數跟plan
+        group['params'] = entry.get('params')
+        group['plan'] = entry.get('plan')
+    offenders = sorted(groups.values(), key=lambda group: group['total_ms'], reverse=True)[:limit]
+    for group in offenders:
+        group['total_ms'] = round(group['total_ms'], 2)
+        group['mean_ms'] = round(group['total_ms'] / group['count'], 2)
+        group['views'] = sorted(group['views'])
+        group['call_sites'] = sorted(group['call_sites'])
+    return offenders
+
+
+def _logged_view(request):
+    match = request.resolver_match
+    if match.namespace == 'admin' or 'admin' in match.namespaces:
+        return match.view_name
+    if getattr(match.func, '__module__', '').startswith('catalog.'):
+        return match.view_name
+    return None
+
+
+class SlowQueryLogMiddleware:
+    """
+    Marks the requests handled by catalog views and the admin, whose slow queries are logged.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if getattr(settings, 'SLOW_QUERY_MS', None) is None:
+            return self.get_response(request)
+        token = _request.set(RequestInfo())
+        try:
+            return self.get_response(request)
+        finally:
+            _request.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        info = _request.get()
+        if info is not None:
+            info.view = _logged_view(request)
+
+
+def _log_slow_query(execute, sql, params, many, context):
+    info = _request.get()
+    if info is None or info.view is None or info.explaining:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    elapsed = (time.perf_counter() - started) * 1000
+    threshold = getattr(settings, 'SLOW_QUERY_MS', None)
+    if threshold is None or elapsed < threshold:
+        return result
+    connection = context['connection']
+    redacted = bool(_REDACTED_RE.search(sql))
+    #EXPLAIN自己也會經過這個wrapper
+    info.explaining = True
+    try:
+        plan = None if many or redacted else explain(connection, sql, params)
+    finally:
+        info.explaining = False
+    #參數預設不記錄，要看的時候才打開SLOW_QUERY_LOG_PARAMS
+    record_params = getattr(settings, 'SLOW_QUERY_LOG_PARAMS', False) and not many and not redacted
+    fingerprint_id, statement = fingerprint(sql)
+    append_entry({
+        'time': datetime.datetime.now().isoformat(timespec='seconds'),
+        'ms': round(elapsed, 2),
+        'fingerprint': fingerprint_id,
+        'statement': statement,
+        'sql': sql[:SQL_LENGTH],
+        'params': repr(params)[:PARAMS_SAMPLE_LENGTH] if record_params else None,
+        'database': connection.alias,
+        'view': info.view,
+        'call_site': call_site(),
+        'plan': plan,
+    })
+    return result
+
+
+@receiver(connection_created)
+def log_slow_queries(sender, connection, **kwargs):
+    if _log_slow_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_log_slow_query)
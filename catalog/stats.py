@@ -0,0 +1,95 @@
+"""
+Dashboard statistics for the catalog home page (index view).
+
+The counters are split into one group per model so that a change to a
+Book only throws away the Book counters. Every group is computed with a
+single aggregate query (conditional aggregation) and cached with
+cached_query() (catalog/caching.py) under the group's version, which the
+signal handlers in catalog/signals.py bump on every change. While one
+worker recomputes a group, the others keep showing the previous counts.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db.models import Count, Q
+
+from .async_utils import db_thread
+from .caching import cached_query
+from .models import Author, Book, BookInstance
+from .versions import bump_versions, get_versions
+
+STATS_CACHE_PREFIX = 'catalog:stats:'
+#就算signal漏掉了，cache最多也只會舊5分鐘
+STATS_CACHE_TIMEOUT = 300
+
+
+def _book_counts():
+    return Book.objects.aggregate(
+        num_books=Count('pk'),
+        num_book_title_icontain_how=Count('pk', filter=Q(title__icontains='how')),
+    )
+
+
+def _bookinstance_counts():
+    return BookInstance.objects.aggregate(
+        num_instances=Count('pk'),
+        num_instances_available=Count('pk', filter=Q(status__exact='a')),
+    )
+
+
+def _author_counts():
+    return Author.objects.aggregate(num_authors=Count('pk'))
+
+
+#key是model_name，signal handler就是用sender._meta.model_name來找要清掉哪一組
+COUNTER_GROUPS = {
+    'book': _book_counts,
+    'bookinstance': _bookinstance_counts,
+    'author': _author_counts,
+}
+
+
+def _cache_key(group):
+    return STATS_CACHE_PREFIX + group
+
+
+def _version_label(group):
+    #每一組計數器有自己的版本戳記(catalog/versions.py)，失效就是換一個新版本
+    return 'catalog.stats.' + group
+
+
+def _group_counts(group, versions):
+    return cached_query(_cache_key(group), COUNTER_GROUPS[group], STATS_CACHE_TIMEOUT,
+                        version=versions[_version_label(group)])
+
+
+def get_dashboard_counts():
+    """
+    Returns a dict with all the counters shown on the home page.
+    Only the groups missing from the cache hit the database.
+    """
+    versions = get_versions([_version_label(group) for group in COUNTER_GROUPS])
+    counts = {}
+    for group in COUNTER_GROUPS:
+        counts.update(_group_counts(group, versions))
+    return counts
+
+
+async def aget_dashboard_counts():
+    """
+    Async variant of get_dashboard_counts() for the ASGI views: the missing
+    groups are computed at the same time, each in its own thread.
+    """
+    versions = await sync_to_async(get_versions)([_version_label(group) for group in COUNTER_GROUPS])
+    results = await asyncio.gather(*(db_thread(_group_counts)(group, versions) for group in COUNTER_GROUPS))
+    counts = {}
+    for values in results:
+        counts.update(values)
+    return counts
+
+
+def invalidate_dashboard_counts(*groups):
+    """
+    Marks the counters of the given groups (all groups if none given) as out of date.
+    """
+    bump_versions(*(_version_label(group) for group in (groups or COUNTER_GROUPS)))
@@ -0,0 +1,186 @@
+"""
+Test helpers shared by the catalog tests.
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test.utils import CaptureQueriesContext, override_settings
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin for checking that a view runs a fixed number of queries,
+    whatever the number of rows it shows.
+
+    Typical use: create a few rows, call assertQueryBudget(), create many more
+    rows, and call assertQueryBudget() again with the same budget.
+    """
+
+    def assertQueryBudget(self, budget, url, data=None, **extra):
+        """
+        GETs `url` with the test client and fails if it needed more than
+        `budget` queries. Returns the response.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(url, data, **extra)
+        self.assertLess(resp.status_code, 400, '{0} returned {1}'.format(url, resp.status_code))
+        if len(queries) > budget:
+            self.fail('{0} ran {1} queries, budget is {2}:\n{3}'.format(
+                url, len(queries), budget,
+                '\n'.join('{0}. {1}'.format(n, q['sql']) for n, q in enumerate(queries.captured_queries, 1))))
+        return resp
+
+
+class SqliteReplicaMixin:
+    """
+    TestCase mixin adding a read replica: a second SQLite database in a file,
+    registered as REPLICA_ALIAS in DATABASE_REPLICAS for the test.
+
+    The replica is a copy of the test database taken by sync_replica() (in
+    setUp and whenever the test calls it), so the test decides when the
+    replica catches up. Changes made in between only exist on the primary.
+    Use it with TransactionTestCase: SQLite cannot copy a database while a
+    transaction (the one of TestCase) is open on it.
+    """
+    REPLICA_ALIAS = 'replica'
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.replica_path = os.path.join(directory.name, 'replica.sqlite3')
+        connections.databases[self.REPLICA_ALIAS] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': self.replica_path}
+        self.addCleanup(self._remove_replica)
+        replicas = override_settings(DATABASE_REPLICAS=[self.REPLICA_ALIAS])
+        replicas.enable()
+        self.addCleanup(replicas.disable)
+        self.sync_replica()
+
+    def sync_replica(self):
+        """
+        Copies the test database to the replica.
+        """
+        source = connections[DEFAULT_DB_ALIAS]
+        if source.in_atomic_block:
+            raise RuntimeError('sync_replica() cannot run inside a transaction, use TransactionTestCase.')
+        source.ensure_connection()
+        connections[self.REPLICA_ALIAS].close()
+        target = sqlite3.connect(self.replica_path)
+        try:
+            source.connection.backup(target)
+        finally:
+            target.close()
+
+    def _remove_replica(self):
+        connections[self.REPLICA_ALIAS].close()
+        del connections[self.REPLICA_ALIAS]
+        del connections.databases[self.REPLICA_ALIAS]
+
+
+class FakeRedis:
+    """
+    In-memory stand-in for a redis.Redis client, with the commands used by
+    catalog.cache_backends.RedisCache. Clients created with the same URL share
+    their data, like clients of one server.
+
+        CACHES = {'default': {'BACKEND': 'catalog.cache_backends.RedisCache',
+                              'LOCATION': 'redis://fake/0',
+                              'OPTIONS': {'CLIENT_CLASS': 'catalog.testing.FakeRedis'}}}
+    """
+    _servers = {}
+    _servers_lock = threading.Lock()
+
+    def __init__(self, url='redis://fake/0'):
+        with self._servers_lock:
+            #(資料, 到期時間)，整個伺服器共用一把鎖
+            self._data, self._expires, self._lock = self._servers.setdefault(url, ({}, {}, threading.Lock()))
+
+    @classmethod
+    def from_url(cls, url, **options):
+        return cls(url)
+
+    def _alive(self, name):
+        expires = self._expires.get(name)
+        if expires is not None and expires <= time.monotonic():
+            self._data.pop(name, None)
+            self._expires.pop(name, None)
+        return name in self._data
+
+    @staticmethod
+    def _encode(value):
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def get(self, name):
+        with self._lock:
+            return self._data[name] if self._alive(name) else None
+
+    def mget(self, names):
+        with self._lock:
+            return [self._data[name] if self._alive(name) else None for name in names]
+
+    def set(self, name, value, ex=None, nx=False):
+        with self._lock:
+            if nx and self._alive(name):
+                return None
+            self._data[name] = self._encode(value)
+            if ex is None:
+                self._expires.pop(name, None)
+            else:
+                self._expires[name] = time.monotonic() + ex
+            return True
+
+    def delete(self, *names):
+        with self._lock:
+            deleted = sum(1 for name in names if self._alive(name))
+            for name in names:
+                self._data.pop(name, None)
+                self._expires.pop(name, None)
+            return deleted
+
+    def exists(self, *names):
+        with self._lock:
+            return sum(1 for name in names if self._alive(name))
+
+    def expire(self, name, seconds):
+        with self._lock:
+            if not self._alive(name):
+                return False
+            self._expires[name] = time.monotonic() + seconds
+            return True
+
+    def persist(self, name):
+        with self._lock:
+            return self._alive(name) and self._expires.pop(name, None) is not None
+
+    def incrby(self, name, amount=1):
+        with self._lock:
+            value = int(self._data[name]) + amount if self._alive(name) else amount
+            self._data[name] = self._encode(value)
+            return value
+
+    def flushdb(self):
+        with self._lock:
+            self._data.clear()
+            self._expires.clear()
+
+    def pipeline(self):
+        return _FakePipeline(self)
+
+
+class _FakePipeline:
+
+    def __init__(self, client):
+        self._client = client
+        self._commands = []
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+        return lambda *args, **kwargs: self._commands.append((method, args, kwargs))
+
+    def execute(self):
+        commands, self._commands = self._commands, []
+        return [method(*args, **kwargs) for method, args, kwargs in commands]
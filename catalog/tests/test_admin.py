@@ -0,0 +1,83 @@
+import json
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.admin import BookInline, BooksInstanceInline
+from catalog.models import Author, Book, BookInstance, Genre, Language
+
+
+def post_data(resp):
+    """
+    The POST data of the change form in `resp`, as the browser would send it unchanged.
+    """
+    data = {}
+    forms = [resp.context['adminform'].form]
+    for inline in resp.context['inline_admin_formsets']:
+        formset = inline.formset
+        forms.append(formset.management_form)
+        forms.extend(formset.forms)
+    for form in forms:
+        for name in form.fields:
+            value = form[name].value()
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple)):
+                value = [getattr(item, 'pk', item) for item in value]
+            data[form.add_prefix(name)] = value
+    return data
+
+
+class BoundedInlineTest(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser(username='admin', password='pw',
+                                                              email='admin@example.com'))
+        self.author = Author.objects.create(first_name='Ursula', last_name='Le Guin')
+        genre = Genre.objects.create(name='Fantasy')
+        language = Language.objects.create(name='English')
+        for n in range(BookInline.max_rows + 5):
+            book = Book.objects.create(title='Book {0:02d}'.format(n), summary='summary', isbn='ISBN',
+                                       author=self.author, language=language)
+            book.genre.add(genre)
+
+    def test_author_form_shows_first_rows_and_count(self):
+        resp = self.client.get(reverse('admin:catalog_author_change', args=[self.author.pk]))
+        formset = resp.context['inline_admin_formsets'][0].formset
+        self.assertEqual(formset.initial_form_count(), BookInline.max_rows)
+        self.assertEqual(formset.forms[0].instance.title, 'Book 00')
+        self.assertContains(resp, 'Showing {0} of {1} books.'.format(BookInline.max_rows, BookInline.max_rows + 5))
+        self.assertContains(resp, 'href="{0}?author__id__exact={1}"'.format(reverse('admin:catalog_book_changelist'),
+                                                                          self.author.pk))
+
+    def test_save_keeps_rows_not_shown(self):
+        resp = self.client.get(reverse('admin:catalog_author_change', args=[self.author.pk]))
+        data = post_data(resp)
+        data['book_set-0-title'] = 'Renamed'
+        data['last_name'] = 'Le Guin-Kroeber'
+        resp = self.client.post(reverse('admin:catalog_author_change', args=[self.author.pk]), data)
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(Book.objects.filter(author=self.author).count(), BookInline.max_rows + 5)
+        self.assertTrue(Book.objects.filter(title='Renamed').exists())
+        self.assertEqual(Author.objects.get(pk=self.author.pk).last_name, 'Le Guin-Kroeber')
+
+    def test_small_inline_has_no_summary(self):
+        book = Book.objects.first()
+        for n in range(3):
+            BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+        resp = self.client.get(reverse('admin:catalog_book_change', args=[book.pk]))
+        formset = resp.context['inline_admin_formsets'][0].formset
+        self.assertEqual((formset.initial_form_count(), formset.total_count), (3, 3))
+        self.assertNotContains(resp, 'bounded-inline-summary')
+        self.assertLess(BooksInstanceInline.max_rows, 50)
+
+    def test_bench_change_forms(self):
+        out = StringIO()
+        call_command('bench_change_forms', '--books', str(BookInline.max_rows + 2), '--copies', '30', '--repeat', '1',
+                     '--json', stdout=out)
+        results = {result['name']: result for result in json.loads(out.getvalue())}
+        self.assertEqual(results['admin:catalog_author_change']['rows'], BookInline.max_rows + 2)
+        self.assertEqual({result['status'] for result in results.values()}, {200})
@@ -0,0 +1,110 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import Author, Book, BookInstance, Genre, Language
+from catalog.pagination import NEXT, encode_cursor
+
+
+class ApiTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [Author.objects.create(first_name='First{0}'.format(i), last_name='Last{0}'.format(i))
+                       for i in range(3)]
+        cls.language = Language.objects.create(name='English')
+        cls.genres = [Genre.objects.create(name='Fantasy'), Genre.objects.create(name='Poetry')]
+        reader = User.objects.create_user(username='reader', password='pw')
+        cls.books = []
+        for i in range(12):
+            book = Book.objects.create(title='Book {0:02d}'.format(i), summary='summary', isbn='ISBN{0}'.format(i),
+                                       author=cls.authors[i % 3], language=cls.language)
+            book.genre.set(cls.genres[:i % 3])
+            BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=reader,
+                                        due_back=datetime.date.today())
+            cls.books.append(book)
+
+    def setUp(self):
+        self.client.force_login(User.objects.get(username='reader'))
+
+    def get(self, resource, **params):
+        resp = self.client.get(reverse('api-list', args=[resource]), params)
+        return resp, resp.json()
+
+    def test_list_and_cursor(self):
+        resp, body = self.get('books', limit=5)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([book['title'] for book in body['data']], ['Book 00', 'Book 01', 'Book 02', 'Book 03', 'Book 04'])
+        self.assertIsNone(body['previous'])
+        titles = []
+        url = reverse('api-list', args=['books']) + '?limit=5'
+        while url:
+            body = self.client.get(url).json()
+            titles += [book['title'] for book in body['data']]
+            url = body['next']
+        self.assertEqual(titles, [book.title for book in self.books])
+
+    def test_fields(self):
+        resp, body = self.get('books', fields='title,genres', limit=3)
+        self.assertEqual(body['data'][2], {'id': self.books[2].pk, 'title': 'Book 02',
+                                           'genres': [genre.pk for genre in self.genres]})
+        resp, body = self.get('books', fields='title,borrower')
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn('borrower', body['error'])
+
+    def test_includes_without_n_plus_one(self):
+        #session跟user各一次，書、作者、語言、genre中介表、genre、副本各一次，跟筆數無關
+        with self.assertNumQueries(8):
+            resp, body = self.get('books', include='author,language,genres,copies', limit=12)
+        book = body['data'][4]
+        self.assertEqual(book['author']['last_name'], 'Last1')
+        self.assertEqual(book['language'], {'id': self.language.pk, 'name': 'English'})
+        self.assertEqual([genre['name'] for genre in book['genres']], ['Fantasy'])
+        self.assertEqual(book['copies'][0]['status'], 'o')
+        self.assertNotIn('borrower', book['copies'][0])
+
+    def test_reverse_include(self):
+        resp, body = self.get('authors', include='books')
+        self.assertEqual(len(body['data'][0]['books']), 4)
+
+    def test_ids(self):
+        ids = [self.books[5].pk, self.books[1].pk, 99999]
+        resp, body = self.get('books', ids=','.join(map(str, ids)), fields='title')
+        self.assertEqual(body['data'], [{'id': self.books[5].pk, 'title': 'Book 05'},
+                                        {'id': self.books[1].pk, 'title': 'Book 01'}])
+        resp, body = self.get('books', ids='1,x')
+        self.assertEqual(resp.status_code, 400)
+        resp, body = self.get('books', ids=','.join(str(i) for i in range(101)))
+        self.assertEqual(resp.status_code, 400)
+        #超過64位元的id
+        resp, body = self.get('books', ids='1,99999999999999999999999')
+        self.assertEqual(resp.status_code, 400)
+
+    def test_detail(self):
+        copy = BookInstance.objects.first()
+        resp = self.client.get(reverse('api-detail', args=['copies', copy.pk]), {'include': 'book'})
+        self.assertEqual(resp.json()['data']['book']['title'], copy.book.title)
+        resp = self.client.get(reverse('api-detail', args=['copies', '00000000-0000-0000-0000-000000000000']))
+        self.assertEqual(resp.status_code, 404)
+        resp = self.client.get(reverse('api-detail', args=['books', '99999999999999999999999']))
+        self.assertEqual(resp.status_code, 400)
+
+    def test_errors(self):
+        self.assertEqual(self.get('borrowers')[0].status_code, 404)
+        self.assertEqual(self.get('books', cursor='garbage')[0].status_code, 400)
+        #格式正確但是pk不是數字
+        self.assertEqual(self.get('books', cursor=encode_cursor(NEXT, ['T', 'abc']))[0].status_code, 400)
+        self.assertEqual(self.get('authors', cursor=encode_cursor(NEXT, ['L', 'F', {}]))[0].status_code, 400)
+        self.assertEqual(self.get('books', limit='x')[0].status_code, 400)
+        resp = self.client.post(reverse('api-list', args=['books']))
+        self.assertEqual(resp.status_code, 405)
+
+    def test_login_required(self):
+        self.client.logout()
+        resp, body = self.get('books')
+        self.assertEqual(resp.status_code, 401)
+        self.assertEqual(body, {'error': 'Authentication required.'})
+        resp = self.client.get(reverse('api-detail', args=['books', self.books[0].pk]))
+        self.assertEqual(resp.status_code, 401)
@@ -0,0 +1,101 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TransactionTestCase
+from django.urls import reverse
+
+from catalog import search
+from catalog.loadtest import run_load
+from catalog.models import Author, Book, BookInstance, Genre
+
+
+class AsyncViewsTest(TransactionTestCase):
+    #資料要真的寫進db，其他執行緒的連線才看得到
+    #(Django 3.2的AsyncClient.get()會把data參數弄丟，查詢字串直接寫在網址上)
+
+    def setUp(self):
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+        genre = Genre.objects.create(name='Fantasy')
+        self.books = []
+        for i in range(12):
+            book = Book.objects.create(title='Book {0:02d}'.format(i), summary='Summary {0}'.format(i),
+                                       isbn='ISBN', author=self.author)
+            book.genre.add(genre)
+            BookInstance.objects.create(book=book, imprint='Imprint {0}'.format(i), status='a')
+            self.books.append(book)
+        #flush不會清掉全文檢索的虛擬資料表，重建一次把前一個測試的書拿掉
+        search.rebuild_index()
+        self.user = User.objects.create_user(username='reader', password='pw')
+        self.async_client.force_login(self.user)
+
+    async def test_index(self):
+        resp = await self.async_client.get(reverse('async-index'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual((resp.context['num_books'], resp.context['num_instances_available'],
+                          resp.context['num_authors'], resp.context['num_visits']), (12, 12, 1, 0))
+
+    async def test_book_list_pages(self):
+        resp = await self.async_client.get(reverse('async-books') + '?page=2')
+        self.assertEqual([book.title for book in resp.context['book_list']], ['Book 10', 'Book 11'])
+        self.assertEqual(resp.context['paginator'].count, 12)
+        resp = await self.async_client.get(reverse('async-books') + '?page=3')
+        self.assertEqual(resp.status_code, 404)
+
+    async def test_book_list_cursor(self):
+        resp = await self.async_client.get(reverse('async-books') + '?cursor=&count=1')
+        page = resp.context['page_obj']
+        self.assertEqual((len(page), page.paginator.count), (10, 12))
+        resp = await self.async_client.get(reverse('async-books') + '?cursor=' + page.next_cursor)
+        self.assertEqual(len(resp.context['book_list']), 2)
+
+    async def test_book_detail(self):
+        resp = await self.async_client.get(reverse('async-book-detail', args=[self.books[3].pk]))
+        self.assertContains(resp, 'Imprint 3')
+        self.assertContains(resp, 'Fantasy')
+        resp = await self.async_client.get(reverse('async-book-detail', args=[9999]))
+        self.assertEqual(resp.status_code, 404)
+
+    async def test_author_pages(self):
+        resp = await self.async_client.get(reverse('async-author-detail', args=[self.author.pk]))
+        self.assertContains(resp, 'Summary 11')
+        resp = await self.async_client.get(reverse('async-authors'))
+        self.assertEqual(list(resp.context['author_list']), [self.author])
+
+    async def test_author_list_requires_login(self):
+        #跟AuthorListView(LoginRequiredMixin)一樣導向登入頁
+        await sync_to_async(self.async_client.logout)()
+        resp = await self.async_client.get(reverse('async-authors'))
+        self.assertRedirects(resp, '{0}?next={1}'.format(settings.LOGIN_URL, reverse('async-authors')),
+                             fetch_redirect_response=False)
+
+    async def test_search(self):
+        resp = await self.async_client.get(reverse('async-search') + '?q=Summary')
+        self.assertEqual(resp.context['page_obj'].paginator.count, 12)
+        #跟sync的search一樣(Paginator.get_page())，超出範圍顯示最後一頁
+        resp = await self.async_client.get(reverse('async-search') + '?q=Summary&page=99')
+        self.assertEqual((resp.status_code, resp.context['page_obj'].number, len(resp.context['hits'])), (200, 2, 2))
+        resp = await self.async_client.get(reverse('async-search') + '?q=Summary&page=x')
+        self.assertEqual(resp.context['page_obj'].number, 1)
+
+
+class LoadTestTest(SimpleTestCase):
+
+    def test_run_load(self):
+        async def handle(reader, writer):
+            await reader.readuntil(b'\r\n\r\n')
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\nConnection: close\r\n\r\nok')
+            await writer.drain()
+            writer.close()
+
+        async def run():
+            server = await asyncio.start_server(handle, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                return await run_load('http://127.0.0.1:{0}/'.format(port), concurrency=20, total=100)
+
+        result = asyncio.run(run())
+        self.assertEqual((result.requests, result.errors, result.statuses), (100, 0, {200: 100}))
+        self.assertLessEqual(result.percentile(50), result.percentile(99))
+        self.assertEqual(result.as_dict()['requests'], 100)
@@ -0,0 +1,159 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from catalog.cache_backends import RedisCache
+from catalog.caching import LOCK_SUFFIX, cached_query
+from catalog.models import Author
+from catalog.stats import get_dashboard_counts
+from catalog.testing import FakeRedis
+
+
+class Counter:
+
+    def __init__(self, value='value', delay=0):
+        self.calls = 0
+        self.value = value
+        self.delay = delay
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self.value
+
+
+class CachedQueryTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_per_version(self):
+        compute = Counter()
+        self.assertEqual(cached_query('key', compute, version=1), 'value')
+        self.assertEqual(cached_query('key', compute, version=1), 'value')
+        self.assertEqual(compute.calls, 1)
+        cached_query('key', compute, version=2)
+        self.assertEqual(compute.calls, 2)
+
+    def test_early_expiration(self):
+        compute = Counter(delay=0.001)
+        cached_query('key', compute, timeout=60)
+        #計算時間 x beta x -log(1-r) 超過剩下的時間，還沒到期也會提早重算
+        with mock.patch('catalog.caching.random.random', return_value=0.5):
+            cached_query('key', compute, timeout=60, beta=1e6)
+            self.assertEqual(compute.calls, 2)
+            cached_query('key', compute, timeout=60)
+            cached_query('key', compute, timeout=60, beta=0)
+        self.assertEqual(compute.calls, 2)
+
+    def test_early_recompute_only_by_lock_holder(self):
+        compute = Counter(delay=0.001)
+        cached_query('key', compute, timeout=60)
+        cache.add('key' + LOCK_SUFFIX, 1)
+        with mock.patch('catalog.caching.random.random', return_value=0.5):
+            self.assertEqual(cached_query('key', compute, timeout=60, beta=1e6), 'value')
+        self.assertEqual(compute.calls, 1)
+
+    def test_stale_value_while_locked(self):
+        cached_query('key', Counter('old'), version=1)
+        cache.add('key:v2' + LOCK_SUFFIX, 1)
+        compute = Counter('new')
+        self.assertEqual(cached_query('key', compute, version=2), 'old')
+        self.assertEqual(compute.calls, 0)
+
+    def test_waits_for_lock_holder_then_gives_up(self):
+        cache.add('key' + LOCK_SUFFIX, 1)
+        compute = Counter()
+        self.assertEqual(cached_query('key', compute, wait=0.1), 'value')
+        self.assertEqual(compute.calls, 1)
+
+    def test_lock_released_on_error(self):
+        def fail():
+            raise RuntimeError
+        with self.assertRaises(RuntimeError):
+            cached_query('key', fail)
+        self.assertIsNone(cache.get('key' + LOCK_SUFFIX))
+
+    def test_single_flight(self):
+        compute = Counter(delay=0.2)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cached_query('key', compute)))
+                   for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['value'] * 20)
+        self.assertEqual(compute.calls, 1)
+
+
+class StatsInvalidationTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_invalidated_group_recomputed_once(self):
+        get_dashboard_counts()
+        Author.objects.create(first_name='Jane', last_name='Doe')
+        with self.assertNumQueries(1):
+            self.assertEqual(get_dashboard_counts()['num_authors'], 1)
+
+
+FAKE_REDIS = {
+    'default': {
+        'BACKEND': 'catalog.cache_backends.RedisCache',
+        'LOCATION': 'redis://fake/0',
+        'OPTIONS': {'CLIENT_CLASS': 'catalog.testing.FakeRedis'},
+    }
+}
+
+
+class RedisCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = RedisCache('redis://fake/1', {'OPTIONS': {'CLIENT_CLASS': 'catalog.testing.FakeRedis'}})
+        self.cache.clear()
+
+    def test_get_set_add_delete(self):
+        self.cache.set('a', {'x': [1, 2]})
+        self.assertEqual(self.cache.get('a'), {'x': [1, 2]})
+        self.assertFalse(self.cache.add('a', 'other'))
+        self.assertTrue(self.cache.add('b', True))
+        self.assertIs(self.cache.get('b'), True)
+        self.assertTrue(self.cache.delete('a'))
+        self.assertEqual(self.cache.get('a', 'missing'), 'missing')
+
+    def test_many_and_incr(self):
+        self.cache.set_many({'a': 1, 'b': 'two'})
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 'two'})
+        self.assertEqual(self.cache.incr('a', 5), 6)
+        with self.assertRaises(ValueError):
+            self.cache.incr('c')
+        self.cache.delete_many(['a', 'b'])
+        self.assertEqual(self.cache.get_many(['a', 'b']), {})
+
+    def test_timeouts(self):
+        self.cache.set('a', 1, timeout=0)
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.set('a', 1, timeout=None)
+        self.assertTrue(self.cache.touch('a', 0.01))
+        time.sleep(0.02)
+        self.assertFalse(self.cache.has_key('a'))
+
+    def test_shared_between_clients(self):
+        other = RedisCache('redis://fake/1', {'OPTIONS': {'CLIENT_CLASS': 'catalog.testing.FakeRedis'}})
+        self.cache.set('a', 'value')
+        self.assertEqual(other.get('a'), 'value')
+
+    @override_settings(CACHES=FAKE_REDIS)
+    def test_cached_query_on_redis(self):
+        from django.core.cache import caches
+        compute = Counter()
+        with mock.patch('catalog.caching.cache', caches['default']):
+            cached_query('key', compute)
+            cached_query('key', compute)
+        self.assertEqual(compute.calls, 1)
+        self.assertIsInstance(caches['default']._client, FakeRedis)
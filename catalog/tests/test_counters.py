@@ -0,0 +1,69 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from catalog.models import Book, BookInstance
+
+
+class CopyCountersTest(TestCase):
+
+    def setUp(self):
+        self.book1 = Book.objects.create(title='Book 1', summary='summary', isbn='1')
+        self.book2 = Book.objects.create(title='Book 2', summary='summary', isbn='2')
+
+    def counters(self, book):
+        book.refresh_from_db()
+        return (book.copies_available, book.copies_on_loan, book.copies_maintenance, book.copies_reserved)
+
+    def test_create_counts_copy(self):
+        BookInstance.objects.create(book=self.book1, imprint='Imprint', status='a')
+        BookInstance.objects.create(book=self.book1, imprint='Imprint')  # default status 'm'
+        self.assertEqual(self.counters(self.book1), (1, 0, 1, 0))
+        self.assertEqual(self.book1.copies_total, 2)
+
+    def test_status_change_moves_copy(self):
+        copy = BookInstance.objects.create(book=self.book1, imprint='Imprint', status='a')
+        copy = BookInstance.objects.get(pk=copy.pk)
+        copy.status = 'o'
+        copy.save()
+        copy.save()
+        self.assertEqual(self.counters(self.book1), (0, 1, 0, 0))
+
+    def test_book_change_moves_copy(self):
+        copy = BookInstance.objects.create(book=self.book1, imprint='Imprint', status='r')
+        copy.book = self.book2
+        copy.save()
+        self.assertEqual(self.counters(self.book1), (0, 0, 0, 0))
+        self.assertEqual(self.counters(self.book2), (0, 0, 0, 1))
+
+    def test_deferred_status_is_read_back_before_save(self):
+        copy = BookInstance.objects.create(book=self.book1, imprint='Imprint', status='a')
+        copy = BookInstance.objects.only('imprint').get(pk=copy.pk)
+        copy.status = 'o'
+        copy.save()
+        self.assertEqual(self.counters(self.book1), (0, 1, 0, 0))
+
+    def test_saving_a_stale_book_keeps_the_counters(self):
+        stale = Book.objects.get(pk=self.book1.pk)
+        BookInstance.objects.create(book=self.book1, imprint='Imprint', status='a')
+        stale.title = 'Book 1, revised'
+        stale.save()
+        self.assertEqual(self.counters(self.book1), (1, 0, 0, 0))
+        self.assertEqual(self.book1.title, 'Book 1, revised')
+
+    def test_delete_removes_copy(self):
+        copy = BookInstance.objects.create(book=self.book1, imprint='Imprint', status='a')
+        copy.delete()
+        self.assertEqual(self.counters(self.book1), (0, 0, 0, 0))
+
+    def test_rebuild_command_verifies_and_fixes(self):
+        BookInstance.objects.create(book=self.book1, imprint='Imprint', status='a')
+        #QuerySet.update()不會觸發signal，計數就會對不起來
+        BookInstance.objects.update(status='o')
+        with self.assertRaises(CommandError):
+            call_command('rebuild_copy_counts', verify=True, stdout=StringIO())
+        call_command('rebuild_copy_counts', stdout=StringIO())
+        self.assertEqual(self.counters(self.book1), (0, 1, 0, 0))
+        call_command('rebuild_copy_counts', verify=True, stdout=StringIO())
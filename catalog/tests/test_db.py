@@ -0,0 +1,62 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import SimpleTestCase
+
+from catalog.dbbench import run_benchmark
+
+
+class SqlitePragmasTest(SimpleTestCase):
+
+    def _connection(self, pragmas):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        connection = DatabaseWrapper({
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(directory.name, 'test.sqlite3'),
+            'OPTIONS': {},
+            'TIME_ZONE': None,
+            'CONN_MAX_AGE': 0,
+            'AUTOCOMMIT': True,
+            'ATOMIC_REQUESTS': False,
+            'PRAGMAS': pragmas,
+        }, alias='pragmas-test')
+        self.addCleanup(connection.close)
+        return connection
+
+    def _pragma(self, connection, name):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA {0}'.format(name))
+            return cursor.fetchone()[0]
+
+    def test_applied_to_new_connections(self):
+        connection = self._connection(settings.SQLITE_PRAGMAS)
+        self.assertEqual(self._pragma(connection, 'journal_mode'), 'wal')
+        #NORMAL = 1
+        self.assertEqual(self._pragma(connection, 'synchronous'), 1)
+        self.assertEqual(self._pragma(connection, 'busy_timeout'), 5000)
+
+    def test_without_pragmas(self):
+        connection = self._connection({})
+        self.assertEqual(self._pragma(connection, 'journal_mode'), 'delete')
+
+
+class BenchDbTest(SimpleTestCase):
+
+    def test_run_benchmark(self):
+        result = run_benchmark('tuned', True, settings.SQLITE_PRAGMAS, workers=3, writers=1, duration=0.2, rows=50)
+        data = result.as_dict()
+        self.assertEqual((data['profile'], data['workers'], data['writers'], data['errors']), ('tuned', 3, 1, 0))
+        self.assertGreater(data['reads'], 0)
+        self.assertGreater(data['writes'], 0)
+
+    def test_command_json(self):
+        out = StringIO()
+        call_command('bench_db', '--profile', 'default', '--profile', 'tuned', '--workers', '2', '--writers', '1',
+                     '--duration', '0.1', '--rows', '20', '--json', stdout=out)
+        self.assertEqual([result['profile'] for result in json.loads(out.getvalue())], ['default', 'tuned'])
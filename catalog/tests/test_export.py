@@ -0,0 +1,80 @@
+import csv
+import datetime
+import io
+import json
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog.export import iter_book_records
+from catalog.models import Author, Book, BookInstance, Genre, Language
+
+
+class ExportTest(TestCase):
+
+    def setUp(self):
+        author = Author.objects.create(first_name='Ursula', last_name='Le Guin')
+        language = Language.objects.create(name='English')
+        self.genre = Genre.objects.create(name='Fantasy')
+        self.books = []
+        for n in range(5):
+            book = Book.objects.create(title='Book %s' % n, summary='summary', isbn=str(n),
+                                       author=author, language=language)
+            book.genre.add(self.genre)
+            BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+            self.books.append(book)
+
+    def export(self, **options):
+        out = StringIO()
+        call_command('export_catalog', stdout=out, **options)
+        return out.getvalue()
+
+    def test_ndjson(self):
+        records = [json.loads(line) for line in self.export(chunk_size=2).splitlines()]
+        self.assertEqual([r['title'] for r in records], ['Book %s' % n for n in range(5)])
+        self.assertEqual(records[0]['author']['last_name'], 'Le Guin')
+        self.assertEqual(records[0]['genres'], ['Fantasy'])
+        self.assertEqual(records[0]['language'], 'English')
+        self.assertEqual(records[0]['copies'][0]['status'], 'a')
+
+    def test_csv(self):
+        rows = list(csv.DictReader(io.StringIO(self.export(format='csv'))))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['author'], 'Le Guin, Ursula')
+        self.assertEqual(rows[0]['copies'], '1')
+
+    def test_queries_per_chunk_not_per_book(self):
+        #每個chunk三個查詢，再加上最後確認沒有資料的那一次
+        with self.assertNumQueries(3 * 3 + 1):
+            list(iter_book_records(chunk_size=2))
+
+    def test_since(self):
+        since = timezone.now() + datetime.timedelta(seconds=1)
+        Book.objects.update(updated_at=timezone.now() - datetime.timedelta(days=1))
+        BookInstance.objects.update(updated_at=timezone.now() - datetime.timedelta(days=1))
+        Author.objects.update(updated_at=timezone.now() - datetime.timedelta(days=1))
+        self.assertEqual(self.export(since=since.isoformat()), '')
+
+        copy = self.books[1].bookinstance_set.get()
+        copy.status = 'o'
+        copy.save()
+        self.books[3].genre.remove(self.genre)
+        since = (timezone.now() - datetime.timedelta(minutes=1)).isoformat()
+        records = [json.loads(line) for line in self.export(since=since).splitlines()]
+        self.assertEqual([r['id'] for r in records], [self.books[1].pk, self.books[3].pk])
+
+    def test_view_is_staff_only_and_streams(self):
+        url = reverse('export-books', args=['csv'])
+        self.assertEqual(self.client.get(url).status_code, 302)
+        User.objects.create_user(username='staff', password='12345', is_staff=True)
+        self.client.login(username='staff', password='12345')
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        self.assertEqual(len(b''.join(resp.streaming_content).decode().splitlines()), 6)
+        self.assertEqual(self.client.get(reverse('export-books', args=['xml'])).status_code, 404)
+        self.assertEqual(self.client.get(url, {'since': 'yesterday'}).status_code, 400)
@@ -0,0 +1,134 @@
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, reset_queries
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog.facets import find_mismatches, genre_facets, language_facets
+from catalog.importer import CatalogImporter
+from catalog.models import Author, Book, FacetCount, Genre, Language
+
+
+class FacetCountTest(TestCase):
+
+    def setUp(self):
+        self.fantasy = Genre.objects.create(name='Fantasy')
+        self.poetry = Genre.objects.create(name='Poetry')
+        self.english = Language.objects.create(name='English')
+        self.french = Language.objects.create(name='French')
+        self.book = Book.objects.create(title='Earthsea', summary='s', isbn='1', language=self.english)
+        self.book.genre.add(self.fantasy, self.poetry)
+
+    def counts(self):
+        return {(row.genre_id, row.language_id): row.books for row in FacetCount.objects.filter(books__gt=0)}
+
+    def assertCorrect(self):
+        self.assertEqual(list(find_mismatches()), [])
+
+    def test_add_and_remove_genres(self):
+        self.assertEqual(self.counts(), {
+            (None, self.english.pk): 1,
+            (self.fantasy.pk, None): 1, (self.fantasy.pk, self.english.pk): 1,
+            (self.poetry.pk, None): 1, (self.poetry.pk, self.english.pk): 1,
+        })
+        #移除沒有連結的種類不會少算
+        self.book.genre.remove(self.poetry, Genre.objects.create(name='Travel'))
+        self.assertCorrect()
+        self.book.genre.clear()
+        self.assertEqual(self.counts(), {(None, self.english.pk): 1})
+        self.assertCorrect()
+
+    def test_reverse_side(self):
+        other = Book.objects.create(title='Tehanu', summary='s', isbn='2', language=self.french)
+        self.poetry.book_set.add(other)
+        self.assertCorrect()
+        self.poetry.book_set.remove(self.book)
+        self.assertCorrect()
+        self.fantasy.book_set.clear()
+        self.assertCorrect()
+        self.poetry.book_set.set([self.book])
+        self.assertCorrect()
+
+    def test_language_change_and_delete(self):
+        self.book.language = self.french
+        self.book.save()
+        self.assertEqual(self.counts()[(self.fantasy.pk, self.french.pk)], 1)
+        self.assertCorrect()
+        #沒有載入language_id的物件存檔
+        book = Book.objects.only('title').get(pk=self.book.pk)
+        book.language = None
+        book.save()
+        self.assertCorrect()
+        Book.objects.get(pk=self.book.pk).delete()
+        self.assertEqual(self.counts(), {})
+        self.assertCorrect()
+
+    def test_import_and_rebuild(self):
+        CatalogImporter().run([{'title': 'Imported', 'isbn': '3', 'language': 'French', 'genres': 'Poetry'}])
+        self.assertCorrect()
+        FacetCount.objects.all().update(books=0)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_facet_counts', '--verify', stdout=StringIO())
+        call_command('rebuild_facet_counts', stdout=StringIO())
+        self.assertCorrect()
+        self.assertEqual([(genre.name, books) for genre, books in genre_facets(self.french.pk)], [('Poetry', 1)])
+        self.assertEqual([(language.name, books) for language, books in language_facets()],
+                         [('English', 1), ('French', 1)])
+
+
+class FacetBrowsingTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fantasy = Genre.objects.create(name='Fantasy')
+        cls.poetry = Genre.objects.create(name='Poetry')
+        cls.english = Language.objects.create(name='English')
+        cls.french = Language.objects.create(name='French')
+        author = Author.objects.create(first_name='Ursula', last_name='Le Guin')
+        for n in range(40):
+            book = Book.objects.create(title='Book {0:02d}'.format(n), summary='s', isbn=str(n), author=author,
+                                       language=cls.english if n % 2 else cls.french)
+            book.genre.add(cls.fantasy if n % 5 else cls.poetry)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user('reader', password='pw'))
+
+    def test_genre_and_language_filters(self):
+        resp = self.client.get(reverse('genre-detail', args=[self.fantasy.pk]), {'language': self.english.pk})
+        self.assertEqual(resp.status_code, 200)
+        expected = Book.objects.filter(genre=self.fantasy, language=self.english)
+        self.assertEqual(resp.context['paginator'].count, expected.count())
+        self.assertEqual(list(resp.context['book_list']), list(expected.order_by('title')[:10]))
+        self.assertContains(resp, '?language={0}&amp;page=2'.format(self.english.pk))
+        self.assertEqual(dict(resp.context['genre_facets'])[self.poetry], 4)
+
+        resp = self.client.get(reverse('books'), {'language': self.french.pk})
+        self.assertEqual(resp.context['paginator'].count, 20)
+        self.assertContains(resp, '{0}?language={1}'.format(self.poetry.get_absolute_url(), self.french.pk))
+
+    def test_bad_filters(self):
+        self.assertEqual(self.client.get(reverse('books'), {'language': 'x'}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('genre-detail', args=[0])).status_code, 404)
+        #超過64位元的id不會讓SQLite OverflowError
+        self.assertEqual(self.client.get(reverse('books'), {'language': '99999999999999999999999'}).status_code, 404)
+        self.assertEqual(self.client.get('/catalog/genre/99999999999999999999999/').status_code, 404)
+        self.assertEqual(self.client.get('/catalog/book/99999999999999999999999').status_code, 404)
+        resp = self.client.get(reverse('books'), {'language': 0})
+        self.assertEqual(list(resp.context['book_list']), [])
+
+    def test_no_count_query(self):
+        #側欄兩個查詢，總數用facet表的數字
+        url = reverse('genre-detail', args=[self.fantasy.pk]) + '?language={0}&page=2'.format(self.english.pk)
+        self.client.get(url)
+        cache.clear()
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertFalse([query['sql'] for query in queries if 'COUNT(' in query['sql'].upper()])
+        self.assertFalse([query['sql'] for query in queries if 'GROUP BY' in query['sql'].upper()])
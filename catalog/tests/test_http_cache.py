@@ -0,0 +1,72 @@
+import datetime
+import time
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils.http import http_date
+from django.contrib.auth.models import User
+
+from catalog.models import Author, Book, BookInstance
+from catalog.testing import QueryBudgetMixin
+
+
+class CachedPageTest(QueryBudgetMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user1 = User.objects.create_user(username='testuser1', password='12345')
+        self.user2 = User.objects.create_user(username='testuser2', password='12345')
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+        self.book = Book.objects.create(title='Book Title', summary='summary', isbn='ISBN', author=self.author)
+        due_back = datetime.date.today() + datetime.timedelta(days=3)
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='o', borrower=self.user1, due_back=due_back)
+
+    def test_etag_and_304(self):
+        url = reverse('book-detail', args=[self.book.pk])
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('ETag', resp)
+        self.assertIn('Last-Modified', resp)
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp.status_code, 304)
+
+    def test_change_gives_new_etag(self):
+        url = reverse('book-detail', args=[self.book.pk])
+        etag = self.client.get(url)['ETag']
+        self.book.title = 'New Title'
+        self.book.save()
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp['ETag'], etag)
+        self.assertContains(resp, 'New Title')
+
+    def test_warm_hit_skips_orm(self):
+        url = reverse('book-detail', args=[self.book.pk])
+        self.client.get(url)
+        #匿名使用者：沒有session/user查詢，也不會查書的資料
+        self.assertQueryBudget(0, url)
+
+    def test_per_user_pages_do_not_leak(self):
+        url = reverse('my-borrowed')
+        self.client.login(username='testuser1', password='12345')
+        resp = self.client.get(url)
+        self.assertContains(resp, 'Book Title')
+        etag = resp['ETag']
+        self.assertIn('private', resp['Cache-Control'])
+        self.client.login(username='testuser2', password='12345')
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotContains(resp, 'Book Title')
+        self.assertNotEqual(resp['ETag'], etag)
+
+    def test_no_last_modified_across_users(self):
+        url = reverse('my-borrowed')
+        self.client.login(username='testuser1', password='12345')
+        resp = self.client.get(url)
+        self.assertNotIn('Last-Modified', resp)
+        #比所有版本都新的If-Modified-Since，換成testuser2也不能得到304
+        self.client.login(username='testuser2', password='12345')
+        resp = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 3600))
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotContains(resp, 'Book Title')
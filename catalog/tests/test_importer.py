@@ -0,0 +1,146 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from catalog.counters import find_copy_count_mismatches
+from catalog.importer import CatalogImporter, normalize_record, read_checkpoint, read_marc
+from catalog.models import Author, Book, BookInstance, Genre, Language
+from catalog.search import SearchResults
+
+
+def marc_record(fields):
+    """
+    Builds a minimal ISO 2709 record from [(tag, data)], data fields given as [(code, value)].
+    """
+    directory, body = b'', b''
+    for tag, data in fields:
+        if isinstance(data, str):
+            value = data.encode() + b'\x1e'
+        else:
+            value = b'  ' + b''.join(b'\x1f' + code.encode() + text.encode() for code, text in data) + b'\x1e'
+        directory += tag.encode() + b'%04d%05d' % (len(value), len(body))
+        body += value
+    base_address = 24 + len(directory) + 1
+    length = base_address + len(body) + 1
+    leader = b'%05dnam a22%05d   4500' % (length, base_address)
+    return leader + directory + b'\x1e' + body + b'\x1d'
+
+
+class ImportCatalogTest(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        Author.objects.create(first_name='Ursula', last_name='Le Guin')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, content):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'wb' if isinstance(content, bytes) else 'w') as f:
+            f.write(content)
+        return path
+
+    def test_csv_import_dedupes_and_keeps_derived_data(self):
+        path = self.write('books.csv', (
+            'title,summary,isbn,author,genres,language,copies,imprint,status\n'
+            'A Wizard of Earthsea,Magic,9780547773742,"Le Guin, Ursula",Fantasy|Classic,English,2,Parnassus,a\n'
+            'The Tombs of Atuan,More magic,9780689845369,"Le Guin, Ursula",Fantasy,English,1,Atheneum,o\n'
+            ',No title,,,,,,,\n'
+        ))
+        call_command('import_catalog', path, chunk_size=1, stdout=StringIO())
+        self.assertEqual(Book.objects.count(), 2)
+        self.assertEqual(Author.objects.count(), 1)
+        self.assertEqual(Genre.objects.count(), 2)
+        self.assertEqual(Language.objects.count(), 1)
+        self.assertEqual(BookInstance.objects.count(), 3)
+        wizard = Book.objects.get(title='A Wizard of Earthsea')
+        self.assertEqual(wizard.genre.count(), 2)
+        self.assertEqual(wizard.copies_available, 2)
+        self.assertEqual(list(find_copy_count_mismatches()), [])
+        self.assertEqual(SearchResults('atuan').count(), 1)
+
+    def test_jsonl_rejects_and_checkpoint_resume(self):
+        records = [
+            {'title': 'Book %s' % n, 'author': 'Smith, John', 'genres': ['Poetry'],
+             'copies': [{'imprint': 'Imprint', 'status': 'o', 'due_back': '2030-01-0%s' % (n + 1)}]}
+            for n in range(5)
+        ]
+        records[2]['copies'][0]['status'] = 'x'
+        path = self.write('books.jsonl', '\n'.join(json.dumps(r) for r in records) + '\n{broken\n')
+        checkpoint = 'books-jsonl'
+        rejects = os.path.join(self.tmpdir, 'rejects.jsonl')
+        call_command('import_catalog', path, chunk_size=2, checkpoint=checkpoint, rejects=rejects, stdout=StringIO())
+        self.assertEqual(Book.objects.count(), 4)
+        self.assertEqual(read_checkpoint(checkpoint, path), 6)
+        with open(rejects) as f:
+            self.assertEqual([json.loads(line)['record'] for line in f], [3, 6])
+
+        #同一個checkpoint再跑一次，不會重複匯入
+        call_command('import_catalog', path, checkpoint=checkpoint, stdout=StringIO())
+        self.assertEqual(Book.objects.count(), 4)
+
+    def test_checkpoint_commits_with_the_chunk(self):
+        path = self.write('books.jsonl', '')
+        records = [{'title': 'Book {0}'.format(n)} for n in range(5)]
+
+        def crash(position, stats):
+            #第一批commit之後、回報進度之前就被kill
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            CatalogImporter(chunk_size=2, on_chunk=crash, checkpoint='crash', source=path).run(iter(records))
+        skip = read_checkpoint('crash', path)
+        self.assertEqual((skip, Book.objects.count()), (2, 2))
+        CatalogImporter(chunk_size=2, checkpoint='crash', source=path).run(iter(records), skip=skip)
+        self.assertEqual(sorted(Book.objects.values_list('title', flat=True)), [r['title'] for r in records])
+        #換了來源檔案就從頭開始
+        self.assertEqual(read_checkpoint('crash', self.write('other.jsonl', '')), 0)
+
+    def test_values_that_are_not_strings(self):
+        #數字的ISBN轉成字串，其他型別變成rejected，不會讓整個匯入中斷
+        self.assertEqual(normalize_record({'title': 'x', 'isbn': 9780306406157})['isbn'], '9780306406157')
+        rejected = []
+        stats = CatalogImporter(on_reject=lambda position, raw, error: rejected.append((position, str(error)))).run(iter([
+            {'title': 'Bad imprint', 'copies': [{'status': 'a', 'imprint': 5}]},
+            {'title': 'Bad copy', 'copies': [{'status': 'a', 'imprint': ['x']}]},
+            {'title': {'en': 'Bad title'}},
+            {'title': 'Bad genres', 'genres': [{'name': 'Poetry'}]},
+            {'title': 'Good', 'isbn': 9780306406157},
+        ]))
+        self.assertEqual([position for position, error in rejected], [2, 3, 4])
+        self.assertIn('imprint must be a string', rejected[0][1])
+        self.assertEqual(BookInstance.objects.get(book__title='Bad imprint').imprint, '5')
+        self.assertEqual(stats.rejects, 3)
+        self.assertEqual(sorted(Book.objects.values_list('title', flat=True)), ['Bad imprint', 'Good'])
+
+    def test_resume_skips_imported_records(self):
+        stats = CatalogImporter(chunk_size=10).run(
+            iter([{'title': 'First'}, {'title': 'Second'}, {'title': 'Third'}]), skip=2)
+        self.assertEqual(list(Book.objects.values_list('title', flat=True)), ['Third'])
+        self.assertEqual(stats.records, 3)
+
+    def test_marc_import(self):
+        path = self.write('books.mrc', marc_record([
+            ('001', 'rec1'),
+            ('008', '210608s2012    mau           000 1 eng d'),
+            ('020', [('a', '9780547773742 (pbk.)')]),
+            ('100', [('a', 'Le Guin, Ursula,')]),
+            ('245', [('a', 'A wizard of Earthsea /'), ('c', 'Ursula K. Le Guin.')]),
+            ('650', [('a', 'Wizards'), ('v', 'Fiction.')]),
+            ('650', [('a', 'Magic.')]),
+        ]) * 2)
+        self.assertEqual(len(list(read_marc(path, buffer_size=50))), 2)
+        call_command('import_catalog', path, copies=1, stdout=StringIO())
+        book = Book.objects.first()
+        self.assertEqual(book.title, 'A wizard of Earthsea')
+        self.assertEqual(book.isbn, '9780547773742')
+        self.assertEqual(str(book.author), 'Le Guin, Ursula')
+        self.assertEqual(book.language.name, 'eng')
+        self.assertEqual(sorted(book.genre.values_list('name', flat=True)), ['Magic', 'Wizards'])
+        self.assertEqual(book.copies_maintenance, 1)
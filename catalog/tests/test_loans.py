@@ -0,0 +1,216 @@
+import datetime
+import threading
+
+from django.contrib.auth.models import Permission, User
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from catalog import loans
+from catalog.counters import find_copy_count_mismatches
+from catalog.models import Book, BookInstance, LoanEvent
+
+
+class LoanOperationsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(title='Book Title', summary='summary', isbn='ISBN')
+        cls.reader = User.objects.create_user(username='reader', password='pw')
+        cls.other = User.objects.create_user(username='other', password='pw')
+        cls.librarian = User.objects.create_user(username='librarian', password='pw')
+
+    def setUp(self):
+        self.copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+
+    def assertCopy(self, status, borrower=None):
+        self.copy.refresh_from_db()
+        self.assertEqual((self.copy.status, self.copy.borrower), (status, borrower))
+        self.assertEqual(list(find_copy_count_mismatches()), [])
+
+    def test_checkout_and_return(self):
+        result = loans.checkout(self.copy.pk, self.reader, actor=self.librarian)
+        self.assertTrue(result)
+        self.assertEqual(result.due_back, datetime.date.today() + loans.DEFAULT_LOAN_PERIOD)
+        self.assertCopy('o', self.reader)
+        self.assertTrue(loans.return_copy(self.copy.pk))
+        self.assertCopy('a')
+        self.assertEqual(self.copy.due_back, None)
+        self.assertEqual([(event.action, event.borrower) for event in self.copy.loan_events.all()],
+                         [('return', self.reader), ('checkout', self.reader)])
+        self.assertEqual(self.copy.loan_events.last().actor, self.librarian)
+
+    def test_checkout_conflict(self):
+        loans.checkout(self.copy.pk, self.reader)
+        result = loans.checkout(self.copy.pk, self.other)
+        self.assertFalse(result)
+        self.assertEqual((result.reason, result.status), (loans.NOT_AVAILABLE, 'o'))
+        self.assertCopy('o', self.reader)
+        self.assertEqual(LoanEvent.objects.count(), 1)
+
+    def test_reserved_copy_only_for_its_reader(self):
+        self.assertTrue(loans.reserve(self.copy.pk, self.reader))
+        self.assertEqual(loans.checkout(self.copy.pk, self.other).reason, loans.RESERVED_FOR_OTHER)
+        self.assertTrue(loans.checkout(self.copy.pk, self.reader))
+        self.assertCopy('o', self.reader)
+
+    def test_cancel_reservation(self):
+        loans.reserve(self.copy.pk, self.reader)
+        self.assertTrue(loans.cancel_reservation(self.copy.pk))
+        self.assertCopy('a')
+        self.assertEqual(loans.cancel_reservation(self.copy.pk).reason, loans.NOT_RESERVED)
+
+    def test_renew_only_on_loan(self):
+        new_date = datetime.date.today() + datetime.timedelta(weeks=2)
+        self.assertEqual(loans.renew(self.copy.pk, new_date).reason, loans.NOT_ON_LOAN)
+        loans.checkout(self.copy.pk, self.reader)
+        self.assertTrue(loans.renew(self.copy.pk, new_date))
+        self.copy.refresh_from_db()
+        self.assertEqual(self.copy.due_back, new_date)
+
+    def test_return_not_on_loan(self):
+        self.assertEqual(loans.return_copy(self.copy.pk).reason, loans.NOT_ON_LOAN)
+        self.assertFalse(LoanEvent.objects.exists())
+
+    def test_missing_copy(self):
+        self.assertEqual(loans.checkout('00000000-0000-0000-0000-000000000000', self.reader).reason, loans.NOT_FOUND)
+
+
+class BulkLoanTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = datetime.date.today()
+        cls.book = Book.objects.create(title='Book Title', summary='summary', isbn='ISBN')
+        cls.reader = User.objects.create_user(username='reader', password='pw')
+        cls.librarian = User.objects.create_user(username='librarian', password='pw', is_staff=True)
+        cls.librarian.user_permissions.add(Permission.objects.get(codename='change_bookinstance'))
+
+    def setUp(self):
+        due = self.today + datetime.timedelta(days=1)
+        self.on_loan = [BookInstance.objects.create(book=self.book, imprint='Imprint', status='o', due_back=due,
+                                                    borrower=self.reader) for _ in range(5)]
+        self.available = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        self.reserved = BookInstance.objects.create(book=self.book, imprint='Imprint', status='r', borrower=self.reader)
+
+    def test_bulk_renew(self):
+        new_date = self.today + datetime.timedelta(weeks=2)
+        ids = [copy.pk for copy in self.on_loan] + [self.available.pk]
+        #每批2筆共3批，每批：savepoint、SELECT、UPDATE、INSERT歷史、release，跟筆數無關
+        with self.assertNumQueries(3 * 5):
+            results = loans.bulk_renew(ids, new_date, batch_size=2)
+        self.assertEqual([result.ok for result in results], [True] * 5 + [False])
+        self.assertEqual(results[-1].reason, loans.NOT_ON_LOAN)
+        self.assertEqual(BookInstance.objects.filter(due_back=new_date).count(), 5)
+        self.assertEqual(LoanEvent.objects.filter(action='renew', borrower=self.reader).count(), 5)
+
+    def test_bulk_renew_queryset(self):
+        results = loans.bulk_renew(BookInstance.objects.filter(borrower=self.reader), self.today)
+        self.assertEqual(sum(1 for result in results if result), 5)
+
+    def test_bulk_set_status(self):
+        results = loans.bulk_set_status(BookInstance.objects.all(), 'a')
+        self.assertEqual(sorted(result.reason or 'ok' for result in results), ['ok'] * 6 + [loans.UNCHANGED])
+        self.assertEqual(BookInstance.objects.filter(status='a', borrower=None, due_back=None).count(), 7)
+        self.assertEqual(list(find_copy_count_mismatches()), [])
+        self.assertEqual(sorted(LoanEvent.objects.values_list('action', flat=True)), ['cancel'] + ['return'] * 5)
+        with self.assertRaises(ValueError):
+            loans.bulk_set_status([self.available.pk], 'o')
+
+    def test_bulk_renew_view(self):
+        self.client.login(username='librarian', password='pw')
+        new_date = self.today + datetime.timedelta(weeks=2)
+        resp = self.client.post(reverse('renew-books-bulk'), {
+            'renewal_date': new_date, 'borrower': 'reader', 'status': 'o'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context['renewed'], 5)
+        self.assertEqual(BookInstance.objects.filter(due_back=new_date).count(), 5)
+
+    def test_bulk_renew_view_validation(self):
+        self.client.login(username='librarian', password='pw')
+        resp = self.client.post(reverse('renew-books-bulk'), {
+            'renewal_date': self.today + datetime.timedelta(weeks=5), 'ids': 'not-a-uuid'})
+        self.assertFormError(resp, 'form', 'renewal_date', 'Invalid date - renewal more than 4 weeks ahead')
+        self.assertFormError(resp, 'form', 'ids', 'Invalid copy id: not-a-uuid')
+        resp = self.client.post(reverse('renew-books-bulk'), {'renewal_date': self.today})
+        self.assertFormError(resp, 'form', None, 'Enter copy ids or at least one of borrower and due date range.')
+
+    def test_bulk_renew_view_permission(self):
+        self.client.login(username='reader', password='pw')
+        resp = self.client.get(reverse('renew-books-bulk'))
+        self.assertEqual(resp.status_code, 302)
+
+    def test_admin_actions(self):
+        self.client.login(username='librarian', password='pw')
+        url = reverse('admin:catalog_bookinstance_changelist')
+        ids = [str(self.on_loan[0].pk), str(self.available.pk)]
+        resp = self.client.post(url, {'action': 'renew_loans', '_selected_action': ids}, follow=True)
+        self.assertContains(resp, '1 of 2 copies renewed')
+        self.assertContains(resp, 'This copy is not on loan.: 1')
+        self.client.post(url, {'action': 'mark_maintenance', '_selected_action': ids})
+        self.assertEqual(BookInstance.objects.filter(status='m').count(), 2)
+        self.assertEqual(list(find_copy_count_mismatches()), [])
+
+
+class LoanStressTest(TransactionTestCase):
+    """
+    Many workers hammering one copy at the same time.
+    """
+    workers = 50
+
+    def setUp(self):
+        book = Book.objects.create(title='Book Title', summary='summary', isbn='ISBN')
+        self.copy = BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+        self.readers = [User.objects.create_user(username='reader{0}'.format(i)) for i in range(self.workers)]
+
+    def hammer(self, work):
+        barrier = threading.Barrier(self.workers)
+        results, errors = [], []
+
+        def run(reader):
+            try:
+                barrier.wait()
+                results.extend(work(reader))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(reader,)) for reader in self.readers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        return results
+
+    def test_one_checkout_wins(self):
+        results = self.hammer(lambda reader: [loans.checkout(self.copy.pk, reader)])
+        winners = [result for result in results if result]
+        self.assertEqual(len(winners), 1)
+        self.assertEqual({result.reason for result in results if not result}, {loans.NOT_AVAILABLE})
+        self.copy.refresh_from_db()
+        self.assertEqual(self.copy.status, 'o')
+        self.assertEqual(LoanEvent.objects.get().borrower, self.copy.borrower)
+        book = Book.objects.get()
+        self.assertEqual((book.copies_available, book.copies_on_loan), (0, 1))
+
+    def test_checkout_return_cycles(self):
+        def work(reader):
+            results = []
+            for _ in range(5):
+                result = loans.checkout(self.copy.pk, reader)
+                results.append(result)
+                if result:
+                    results.append(loans.return_copy(self.copy.pk))
+            return results
+
+        results = self.hammer(work)
+        succeeded = [result for result in results if result]
+        self.assertEqual(LoanEvent.objects.count(), len(succeeded))
+        #每一次借出後面都緊接著歸還，歷史紀錄要一借一還交錯
+        actions = list(LoanEvent.objects.order_by('id').values_list('action', flat=True))
+        self.assertEqual(actions, ['checkout', 'return'] * (len(actions) // 2))
+        self.copy.refresh_from_db()
+        self.assertEqual(self.copy.status, 'a')
+        self.assertEqual(list(find_copy_count_mismatches()), [])
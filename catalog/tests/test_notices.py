@@ -0,0 +1,96 @@
+import datetime
+import smtplib
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from catalog.models import Book, BookInstance, OverdueNotice
+from catalog.notices import send_overdue_notices
+
+
+class RefusingBackend(locmem.EmailBackend):
+    """
+    Refuses the messages to the addresses in `refused`, like an SMTP server partway through a batch.
+    """
+    refused = set()
+
+    def send_messages(self, messages):
+        for message in messages:
+            if set(message.to) & self.refused:
+                raise smtplib.SMTPRecipientsRefused({address: (550, b'refused') for address in message.to})
+        return super().send_messages(messages)
+
+
+class SendOverdueNoticesTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = datetime.date.today()
+        late = cls.today - datetime.timedelta(days=5)
+        book = Book.objects.create(title='Book Title', summary='summary', isbn='ISBN')
+        cls.users = [User.objects.create_user(username='user{0}'.format(i), password='pw',
+                                              email='user{0}@example.com'.format(i)) for i in range(7)]
+        cls.no_email = User.objects.create_user(username='noemail', password='pw')
+        for user in cls.users:
+            for _ in range(2):
+                BookInstance.objects.create(book=book, imprint='Imprint', status='o', due_back=late, borrower=user)
+        BookInstance.objects.create(book=book, imprint='Imprint', status='o', due_back=late, borrower=cls.no_email)
+        BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=cls.users[0],
+                                    due_back=cls.today + datetime.timedelta(days=3))
+
+    def test_one_digest_per_borrower(self):
+        #batch_size小於借閱數，同一個人的借閱會被拆到兩批讀取
+        stats = send_overdue_notices(batch_size=3, send_batch_size=2, workers=2)
+        self.assertEqual((stats.borrowers, stats.loans, stats.sent, stats.skipped, stats.failed), (8, 15, 7, 1, 0))
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         sorted(user.email for user in self.users))
+        self.assertIn('2 overdue books', mail.outbox[0].subject)
+        self.assertIn('5 days overdue', mail.outbox[0].body)
+        self.assertEqual(OverdueNotice.objects.count(), 14)
+
+    def test_rerun_sends_nothing(self):
+        send_overdue_notices()
+        mail.outbox = []
+        stats = send_overdue_notices()
+        self.assertEqual((stats.sent, stats.loans), (0, 1))
+        self.assertEqual(mail.outbox, [])
+
+    def test_renewed_loan_is_notified_again(self):
+        send_overdue_notices()
+        copy = BookInstance.objects.filter(borrower=self.users[1]).first()
+        copy.due_back = self.today - datetime.timedelta(days=1)
+        copy.save()
+        mail.outbox = []
+        send_overdue_notices()
+        self.assertEqual([message.to[0] for message in mail.outbox], [self.users[1].email])
+        self.assertIn('1 overdue book', mail.outbox[0].subject)
+
+    #用__name__：test runner載入這個檔案的模組名稱不一定是catalog.tests.test_notices
+    @override_settings(EMAIL_BACKEND=__name__ + '.RefusingBackend')
+    def test_failure_partway_through_a_batch(self):
+        RefusingBackend.refused = {self.users[3].email}
+        self.addCleanup(setattr, RefusingBackend, 'refused', set())
+        stats = send_overdue_notices(send_batch_size=10, workers=1)
+        self.assertEqual((stats.sent, stats.failed), (6, 1))
+        #前後寄出的都有記錄，重跑只寄失敗的那一封
+        self.assertEqual(OverdueNotice.objects.count(), 12)
+        self.assertFalse(OverdueNotice.objects.filter(borrower=self.users[3]).exists())
+        RefusingBackend.refused = set()
+        mail.outbox = []
+        stats = send_overdue_notices(send_batch_size=10, workers=1)
+        self.assertEqual((stats.sent, stats.failed), (1, 0))
+        self.assertEqual([message.to[0] for message in mail.outbox], [self.users[3].email])
+
+    def test_dry_run(self):
+        stats = send_overdue_notices(dry_run=True)
+        self.assertEqual((stats.borrowers, stats.sent), (8, 0))
+        self.assertEqual(mail.outbox, [])
+        self.assertFalse(OverdueNotice.objects.exists())
+
+    def test_command(self):
+        call_command('send_overdue_notices', '--workers=1', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 7)
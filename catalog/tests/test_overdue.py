@@ -0,0 +1,61 @@
+import datetime
+
+from django.contrib.auth.models import Permission, User
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import Book, BookInstance
+
+
+class OverdueQuerySetTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = datetime.date.today()
+        book = Book.objects.create(title='Book Title', summary='summary', isbn='ISBN')
+        cls.late = BookInstance.objects.create(book=book, imprint='Imprint', status='o',
+                                               due_back=cls.today - datetime.timedelta(days=3))
+        cls.on_time = BookInstance.objects.create(book=book, imprint='Imprint', status='o',
+                                                  due_back=cls.today + datetime.timedelta(days=3))
+        cls.returned = BookInstance.objects.create(book=book, imprint='Imprint', status='a',
+                                                   due_back=cls.today - datetime.timedelta(days=3))
+        cls.no_date = BookInstance.objects.create(book=book, imprint='Imprint', status='o')
+
+    def test_overdue(self):
+        self.assertEqual(list(BookInstance.objects.overdue()), [self.late])
+        self.assertEqual(BookInstance.objects.overdue(today=self.today + datetime.timedelta(days=4)).count(), 2)
+
+    def test_annotate_overdue(self):
+        rows = {copy.pk: copy for copy in BookInstance.objects.annotate_overdue()}
+        self.assertEqual((rows[self.late.pk].overdue, rows[self.late.pk].days_overdue), (True, 3))
+        self.assertEqual((rows[self.on_time.pk].overdue, rows[self.on_time.pk].days_overdue), (False, 0))
+        self.assertEqual((rows[self.returned.pk].overdue, rows[self.returned.pk].days_overdue), (False, 0))
+        self.assertEqual((rows[self.no_date.pk].overdue, rows[self.no_date.pk].days_overdue), (False, 0))
+
+    def test_is_overdue_uses_annotation(self):
+        copy = BookInstance.objects.annotate_overdue().get(pk=self.returned.pk)
+        self.assertFalse(copy.is_overdue)
+
+
+class OverdueLoansListViewTest(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(username='librarian', password='12345')
+        user.user_permissions.add(Permission.objects.get(codename='can_view_all_borrowed_books'))
+        User.objects.create_user(username='reader', password='12345')
+        book = Book.objects.create(title='Book Title', summary='summary', isbn='ISBN')
+        today = datetime.date.today()
+        for days in (-10, -1, 5):
+            BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=user,
+                                        due_back=today + datetime.timedelta(days=days))
+
+    def test_requires_permission(self):
+        self.client.login(username='reader', password='12345')
+        self.assertEqual(self.client.get(reverse('overdue-borrowed')).status_code, 403)
+
+    def test_lists_only_overdue_most_overdue_first(self):
+        self.client.login(username='librarian', password='12345')
+        resp = self.client.get(reverse('overdue-borrowed'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTemplateUsed(resp, 'catalog/bookinstance_list_overdue.html')
+        self.assertEqual([copy.days_overdue for copy in resp.context['bookinstance_list']], [10, 1])
@@ -0,0 +1,139 @@
+import datetime
+
+from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth.models import User
+
+from catalog.models import Author, Book, BookInstance
+from catalog.pagination import (NEXT, EstimatedCountPaginator, KeysetPaginator, InvalidCursor, encode_cursor,
+                                estimated_row_count)
+
+
+class KeysetPaginatorTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        #故意讓last_name重複，排序要靠first_name跟id分出先後
+        for n in range(7):
+            Author.objects.create(first_name='First %s' % (n % 3), last_name='Last %s' % (n % 2))
+        book = Book.objects.create(title='Title', summary='summary', isbn='ISBN')
+        today = datetime.date.today()
+        for n in range(9):
+            due_back = None if n % 4 == 0 else today + datetime.timedelta(days=n % 3)
+            BookInstance.objects.create(book=book, imprint='Imprint', status='o', due_back=due_back)
+
+    def walk(self, paginator):
+        """
+        Follows next cursors to the end, then previous cursors back to the start.
+        """
+        forward, pages = [], []
+        page = paginator.page()
+        while True:
+            pages.append(page)
+            forward.extend(page.object_list)
+            if not page.has_next():
+                break
+            page = paginator.page(page.next_cursor)
+        backward = list(page.object_list)
+        while page.has_previous():
+            page = paginator.page(page.previous_cursor)
+            backward[:0] = page.object_list
+        return forward, backward, pages
+
+    def check_ordering(self, queryset, ordering, expected):
+        forward, backward, pages = self.walk(KeysetPaginator(queryset, 3, ordering))
+        self.assertEqual(forward, list(expected))
+        self.assertEqual(backward, list(expected))
+        self.assertFalse(pages[0].has_previous())
+
+    def test_author_ordering(self):
+        self.check_ordering(Author.objects.all(), ('last_name', 'first_name', 'id'),
+                            Author.objects.order_by('last_name', 'first_name', 'id'))
+
+    def test_nullable_ascending(self):
+        from django.db.models import F
+        self.check_ordering(BookInstance.objects.all(), ('due_back', 'id'),
+                            BookInstance.objects.order_by(F('due_back').asc(nulls_first=True), 'id'))
+
+    def test_nullable_descending(self):
+        from django.db.models import F
+        self.check_ordering(BookInstance.objects.all(), ('-due_back', '-id'),
+                            BookInstance.objects.order_by(F('due_back').desc(nulls_last=True), '-id'))
+
+    def test_count_is_optional(self):
+        self.assertIsNone(KeysetPaginator(Author.objects.all(), 3, ('id',)).count)
+        self.assertEqual(KeysetPaginator(Author.objects.all(), 3, ('id',), with_count=True).count, 7)
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InvalidCursor):
+            KeysetPaginator(Author.objects.all(), 3, ('id',)).page('not-a-cursor')
+
+    def test_cursor_values_must_fit_the_fields(self):
+        paginator = KeysetPaginator(Author.objects.all(), 3, ('last_name', 'first_name', 'id'))
+        for values in (['B', 'A', 'notint'], ['B', 'A', [1]], ['B', None, 1], ['B', 'A', 10 ** 30]):
+            with self.assertRaises(InvalidCursor):
+                paginator.page(encode_cursor(NEXT, values))
+        #字串的數字跟日期會轉成欄位的型別
+        self.assertEqual(len(paginator.page(encode_cursor(NEXT, ['A', 'A', '0']))), 3)
+        copies = KeysetPaginator(BookInstance.objects.all(), 3, ('due_back', 'id'))
+        with self.assertRaises(InvalidCursor):
+            copies.page(encode_cursor(NEXT, ['2021-13-45', '5f1c2a7e-0000-4000-8000-000000000000']))
+
+    def test_deep_page_costs_the_same_as_first_page(self):
+        paginator = KeysetPaginator(Author.objects.all(), 1, ('last_name', 'first_name', 'id'))
+        with self.assertNumQueries(1):
+            page = paginator.page()
+        for n in range(5):
+            page = paginator.page(page.next_cursor)
+        with self.assertNumQueries(1):
+            paginator.page(page.next_cursor)
+
+
+class CursorModeViewTest(TestCase):
+
+    def setUp(self):
+        User.objects.create_user(username='testuser1', password='12345')
+        self.client.login(username='testuser1', password='12345')
+        for n in range(13):
+            Author.objects.create(first_name='Christian %s' % n, last_name='Surname %s' % n)
+
+    def test_cursor_pages_through_authors(self):
+        resp = self.client.get(reverse('authors'), {'cursor': ''})
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.context['is_paginated'])
+        self.assertEqual(len(resp.context['author_list']), 10)
+        resp = self.client.get(reverse('authors'), {'cursor': resp.context['page_obj'].next_cursor})
+        self.assertEqual(len(resp.context['author_list']), 3)
+        self.assertFalse(resp.context['page_obj'].has_next())
+
+    def test_invalid_cursor_is_404(self):
+        resp = self.client.get(reverse('authors'), {'cursor': 'garbage'})
+        self.assertEqual(resp.status_code, 404)
+
+    def test_cursor_with_wrong_types_is_404(self):
+        for url, values in ((reverse('books'), ['B', 'x']), (reverse('authors'), ['B', 'A', 'notint']),
+                            (reverse('my-borrowed'), ['not-a-date', 'x'])):
+            resp = self.client.get(url, {'cursor': encode_cursor(NEXT, values)})
+            self.assertEqual(resp.status_code, 404, url)
+
+
+class EstimatedCountPaginatorTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for n in range(30):
+            Author.objects.create(first_name='First %s' % n, last_name='Last %s' % (n % 3))
+        #刪掉的列還算在max(rowid)裡
+        Author.objects.filter(first_name='First 0').delete()
+
+    def test_unfiltered_count_is_estimated(self):
+        paginator = EstimatedCountPaginator(Author.objects.order_by('pk'), 10)
+        paginator.estimate_above = 20
+        self.assertEqual(paginator.count, estimated_row_count(Author, 'default'))
+        self.assertGreaterEqual(paginator.count, 29)
+
+    def test_small_or_filtered_count_is_exact(self):
+        self.assertEqual(EstimatedCountPaginator(Author.objects.all(), 10).count, 29)
+        paginator = EstimatedCountPaginator(Author.objects.filter(last_name='Last 1'), 10)
+        paginator.estimate_above = 0
+        self.assertEqual(paginator.count, 10)
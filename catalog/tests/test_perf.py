@@ -0,0 +1,84 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from catalog import perf
+from catalog.models import Author, Book
+
+
+@override_settings(PERF_SAMPLE_RATE=1, PERF_SERVER_TIMING=True, METRICS_TOKEN='secret')
+class PerformanceMiddlewareTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='Ursula', last_name='Le Guin')
+        cls.book = Book.objects.create(title='The Dispossessed', summary='s', isbn='1', author=author)
+
+    def setUp(self):
+        #頁面快取命中的話就沒有查詢也沒有render
+        cache.clear()
+        perf.reset_metrics()
+
+    def test_server_timing_header(self):
+        resp = self.client.get(reverse('book-detail', args=[self.book.pk]))
+        timing = resp['Server-Timing']
+        self.assertRegex(timing, r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries, 0 duplicates", tpl;dur=[\d.]+$')
+        self.assertNotIn('desc="0 queries', timing)
+
+    def test_metrics_by_url_name(self):
+        self.client.get(reverse('book-detail', args=[self.book.pk]))
+        self.client.get(reverse('book-detail', args=[self.book.pk]) + '?page=1')
+        self.client.get('/no/such/page/')
+        text = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret').content.decode()
+        self.assertIn('catalog_request_duration_seconds_count{view="book-detail",method="GET"} 2', text)
+        self.assertIn('catalog_request_duration_seconds_bucket{view="book-detail",method="GET",le="+Inf"} 2', text)
+        self.assertIn('catalog_request_queries_count{view="book-detail"} 2', text)
+        self.assertIn('catalog_request_template_duration_seconds_count{view="book-detail"} 2', text)
+        self.assertIn('view="unresolved"', text)
+
+    @override_settings(PERF_SAMPLE_RATE=0)
+    def test_sampling_off(self):
+        resp = self.client.get(reverse('book-detail', args=[self.book.pk]))
+        self.assertNotIn('Server-Timing', resp)
+        self.assertNotIn('book-detail', perf.render_metrics())
+
+    def test_metrics_needs_token_or_staff(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+        self.client.force_login(User.objects.create_user('reader', password='pw'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.client.force_login(User.objects.create_user('staff', password='pw', is_staff=True))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.1'])
+    def test_metrics_allowed_ips(self):
+        #token對了還是要從允許的位址來
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret').status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1',
+                                         HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1').status_code, 403)
+
+
+class RequestProfileTest(SimpleTestCase):
+
+    def test_duplicates(self):
+        profile = perf.RequestProfile()
+        profile.record_query('SELECT 1 WHERE id = %s', (1,), False, 0.001)
+        profile.record_query('SELECT 1 WHERE id = %s', (1,), False, 0.001)
+        profile.record_query('SELECT 1 WHERE id = %s', (1,), False, 0.001)
+        profile.record_query('SELECT 1 WHERE id = %s', (2,), False, 0.001)
+        self.assertEqual((profile.queries, profile.duplicates), (4, 2))
+
+    def test_histogram_buckets(self):
+        histogram = perf.Histogram('test_seconds', 'Test.', ('view',), (0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(('a"b',), value)
+        self.assertEqual(histogram.expose()[2:], [
+            'test_seconds_bucket{view="a\\"b",le="0.1"} 2',
+            'test_seconds_bucket{view="a\\"b",le="1"} 3',
+            'test_seconds_bucket{view="a\\"b",le="+Inf"} 4',
+            'test_seconds_sum{view="a\\"b"} 3.65',
+            'test_seconds_count{view="a\\"b"} 4',
+        ])
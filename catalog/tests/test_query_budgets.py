@@ -0,0 +1,96 @@
+import datetime
+
+from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth.models import Permission, User
+
+from catalog.models import Author, Book, BookInstance, Genre, Language
+from catalog.testing import QueryBudgetMixin
+
+#session + user是每個需要登入的網頁都會有的兩個查詢
+AUTH_QUERIES = 2
+
+
+class ViewQueryBudgetTest(QueryBudgetMixin, TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='librarian', password='12345')
+        self.user.user_permissions.add(Permission.objects.get(codename='can_view_all_borrowed_books'))
+        self.client.login(username='librarian', password='12345')
+        self.language = Language.objects.create(name='English')
+        self.genres = [Genre.objects.create(name='Genre %s' % n) for n in range(3)]
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+        self.book = Book.objects.create(title='Detail', summary='summary', isbn='ISBN',
+                                        author=self.author, language=self.language)
+        self.book.genre.set(self.genres)
+
+    def add_rows(self, number):
+        """
+        Adds `number` books (each with its own author, genres and a copy on loan to self.user),
+        plus one more copy of self.book and one more book of self.author per book.
+        """
+        books = []
+        for n in range(number):
+            author = Author.objects.create(first_name='First %s' % n, last_name='Last %s' % n)
+            book = Book.objects.create(title='Title %s' % n, summary='summary', isbn='ISBN',
+                                       author=author, language=self.language)
+            book.genre.set(self.genres)
+            BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=self.user,
+                                        due_back=datetime.date.today() + datetime.timedelta(days=n))
+            BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+            Book.objects.create(title='Title by %s' % n, summary='summary', isbn='ISBN', author=self.author)
+            books.append(book)
+        return books
+
+    def check_budgets(self):
+        #另外兩個是側欄的種類/語言數量(facet表)
+        self.assertQueryBudget(AUTH_QUERIES + 4, reverse('books'))
+        self.assertQueryBudget(AUTH_QUERIES + 3, reverse('book-detail', args=[self.book.pk]))
+        self.assertQueryBudget(AUTH_QUERIES + 2, reverse('author-detail', args=[self.author.pk]))
+        self.assertQueryBudget(AUTH_QUERIES + 2, reverse('authors'))
+        self.assertQueryBudget(AUTH_QUERIES + 2, reverse('my-borrowed'))
+        #permission檢查會多查兩次(user permissions, group permissions)
+        self.assertQueryBudget(AUTH_QUERIES + 4, reverse('all-borrowed'))
+
+    def test_budget_does_not_grow_with_rows(self):
+        self.add_rows(10)
+        self.check_budgets()
+        self.add_rows(40)
+        self.check_budgets()
+
+
+class AdminQueryBudgetTest(QueryBudgetMixin, TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='pw', email='admin@example.com')
+        self.client.force_login(self.admin)
+        self.language = Language.objects.create(name='English')
+        self.genres = [Genre.objects.create(name='Genre %s' % n) for n in range(3)]
+        self.book = Book.objects.create(title='Detail', summary='summary', isbn='ISBN', language=self.language)
+
+    def add_rows(self, number):
+        for n in range(Book.objects.count(), Book.objects.count() + number):
+            author = Author.objects.create(first_name='First %s' % n, last_name='Last %s' % n)
+            book = Book.objects.create(title='Title %s' % n, summary='summary', isbn='ISBN', author=author)
+            book.genre.set(self.genres)
+            borrower = User.objects.create_user(username='reader %s' % n)
+            BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=borrower,
+                                        due_back=datetime.date.today())
+
+    def check_budgets(self):
+        #changelist：估計筆數(表很小的時候再COUNT一次)、資料列(+genre的prefetch)，不另外算全部筆數
+        self.assertQueryBudget(AUTH_QUERIES + 4, reverse('admin:catalog_book_changelist'))
+        self.assertQueryBudget(AUTH_QUERIES + 3, reverse('admin:catalog_bookinstance_changelist'))
+        self.assertQueryBudget(AUTH_QUERIES + 2, reverse('admin:catalog_author_changelist'))
+        copy = BookInstance.objects.first()
+        #change view包在transaction裡(SAVEPOINT/RELEASE兩個)，第一次還會查ContentType
+        resp = self.assertQueryBudget(AUTH_QUERIES + 7, reverse('admin:catalog_bookinstance_change', args=[copy.pk]))
+        #autocomplete只放目前選的那一個，不會把每本書、每個使用者都列出來
+        self.assertContains(resp, '<option value="{0}" selected>'.format(copy.borrower_id))
+        self.assertLess(resp.content.count(b'<option'), 10)
+
+    def test_budget_does_not_grow_with_rows(self):
+        self.add_rows(5)
+        self.check_budgets()
+        self.add_rows(30)
+        self.check_budgets()
@@ -0,0 +1,85 @@
+import json
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from catalog import search
+from catalog.models import Author, Book
+from catalog.routers import PIN_COOKIE, ReplicaRouter, use_replicas
+from catalog.testing import SqliteReplicaMixin
+
+
+#落後時間設成0，剛改過的頁面也可以從副本讀
+@override_settings(REPLICA_LAG_SECONDS=0)
+class ReplicaRoutingTest(SqliteReplicaMixin, TransactionTestCase):
+
+    def setUp(self):
+        self.author = Author.objects.create(first_name='Ursula', last_name='Le Guin')
+        self.old = Book.objects.create(title='Old Book', summary='s', isbn='1', author=self.author)
+        #TransactionTestCase不會清掉FTS虛擬表
+        search.rebuild_index()
+        super().setUp()
+        #只寫進主資料庫，副本還沒跟上
+        self.new = Book.objects.create(title='New Book', summary='s', isbn='2', author=self.author)
+
+    def titles(self, resp):
+        return [book.title for book in resp.context['book_list']]
+
+    def test_catalog_pages_read_from_replica(self):
+        self.assertEqual(self.titles(self.client.get(reverse('books'))), ['Old Book'])
+        self.assertEqual(self.client.get(reverse('book-detail', args=[self.new.pk])).status_code, 404)
+        self.sync_replica()
+        self.assertEqual(self.titles(self.client.get(reverse('books') + '?page=1')), ['New Book', 'Old Book'])
+
+    def test_api_search_and_export_read_from_replica(self):
+        self.client.force_login(User.objects.create_user('reader', password='pw'))
+        body = self.client.get(reverse('api-list', args=['books'])).json()
+        self.assertEqual([book['title'] for book in body['data']], ['Old Book'])
+        resp = self.client.get(reverse('search'), {'q': 'book'})
+        self.assertEqual([hit['book'].title for hit in resp.context['hits']], ['Old Book'])
+        out = StringIO()
+        call_command('export_catalog', stdout=out)
+        self.assertEqual([json.loads(line)['title'] for line in out.getvalue().splitlines()], ['Old Book'])
+
+    def test_loan_path_reads_from_primary(self):
+        with use_replicas():
+            self.assertEqual(Book.objects.count(), 1)
+        self.assertEqual(Book.objects.count(), 2)
+
+    def test_pinned_browser_reads_from_primary(self):
+        self.client.cookies[PIN_COOKIE] = '1'
+        self.assertEqual(self.titles(self.client.get(reverse('books'))), ['New Book', 'Old Book'])
+
+    def test_write_pins_the_browser(self):
+        resp = self.client.post(reverse('author_create'), {'first_name': 'Iain', 'last_name': 'Banks'})
+        self.assertEqual(resp.status_code, 302)
+        self.assertIn(PIN_COOKIE, resp.cookies)
+        User.objects.create_user(username='reader', password='pw')
+        self.client.login(username='reader', password='pw')
+        authors = self.client.get(reverse('authors')).context['author_list']
+        self.assertIn('Banks', [author.last_name for author in authors])
+
+    def test_session_writes_do_not_pin(self):
+        self.client.force_login(User.objects.create_user(username='reader', password='pw'))
+        resp = self.client.get(reverse('index'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn(PIN_COOKIE, resp.cookies)
+
+    @override_settings(REPLICA_LAG_SECONDS=60)
+    def test_recently_changed_pages_read_from_primary(self):
+        self.assertEqual(self.titles(self.client.get(reverse('books'))), ['New Book', 'Old Book'])
+
+    def test_objects_read_from_replica_are_saved_on_primary(self):
+        router = ReplicaRouter()
+        with use_replicas():
+            book = Book.objects.get(pk=self.old.pk)
+        self.assertEqual(book._state.db, self.REPLICA_ALIAS)
+        self.assertEqual(router.db_for_write(Book, instance=book), DEFAULT_DB_ALIAS)
+        self.assertFalse(router.allow_migrate(self.REPLICA_ALIAS, 'catalog'))
+        book.title = 'Renamed'
+        book.save()
+        self.assertEqual(Book.objects.get(pk=self.old.pk).title, 'Renamed')
@@ -0,0 +1,69 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import Author, Book, Genre
+from catalog.search import SearchResults, SimpleBackend
+
+
+class SearchTest(TestCase):
+
+    def setUp(self):
+        self.author = Author.objects.create(first_name='Ursula', last_name='Le Guin')
+        self.genre = Genre.objects.create(name='Fantasy')
+        self.wizard = Book.objects.create(title='A Wizard of Earthsea', summary='A boy <b>learns</b> magic.',
+                                          isbn='9780547773742', author=self.author)
+        self.wizard.genre.add(self.genre)
+        self.other = Book.objects.create(title='Dragons', summary='Not really about a wizard.', isbn='123')
+
+    def book_ids(self, query):
+        return [hit['book_id'] for hit in SearchResults(query)[0:10]]
+
+    def test_title_match_ranks_first(self):
+        self.assertEqual(self.book_ids('wizard'), [self.wizard.pk, self.other.pk])
+
+    def test_prefix_and_all_words_must_match(self):
+        self.assertEqual(self.book_ids('earth wiz'), [self.wizard.pk])
+        self.assertEqual(self.book_ids('wizard dragons'), [self.other.pk])
+
+    def test_author_genre_and_isbn_are_searchable(self):
+        self.assertEqual(self.book_ids('ursula'), [self.wizard.pk])
+        self.assertEqual(self.book_ids('fantasy'), [self.wizard.pk])
+        self.assertEqual(self.book_ids('9780547773742'), [self.wizard.pk])
+
+    def test_index_follows_changes(self):
+        self.author.first_name = 'Ged'
+        self.author.save()
+        self.assertEqual(self.book_ids('ged'), [self.wizard.pk])
+        self.genre.book_set.clear()
+        self.assertEqual(self.book_ids('fantasy'), [])
+        self.other.genre.add(self.genre)
+        self.assertEqual(self.book_ids('fantasy'), [self.other.pk])
+        self.wizard.delete()
+        self.assertEqual(self.book_ids('earthsea'), [])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.book_ids('"wizard* (^'), [self.wizard.pk, self.other.pk])
+        self.assertEqual(SearchResults('  ""  ').count(), 0)
+
+    def test_highlight_escapes_content(self):
+        hit = SearchResults('learns')[0]
+        self.assertIn('&lt;b&gt;<mark>learns</mark>&lt;/b&gt;', hit['snippet'])
+
+    def test_simple_backend(self):
+        hits = SearchResults('wiz earth', backend=SimpleBackend())[0:10]
+        self.assertEqual([hit['book_id'] for hit in hits], [self.wizard.pk])
+        self.assertEqual(str(hits[0]['title']), 'A <mark>Wiz</mark>ard of <mark>Earth</mark>sea')
+
+    def test_rebuild_command(self):
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.book_ids('wizard'), [self.wizard.pk, self.other.pk])
+
+    def test_search_view(self):
+        resp = self.client.get(reverse('search'), {'q': 'wizard'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertTemplateUsed(resp, 'catalog/search_results.html')
+        self.assertEqual(resp.context['page_obj'].paginator.count, 2)
+        self.assertContains(resp, '<mark>Wizard</mark>')
@@ -0,0 +1,96 @@
+import datetime
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from catalog import search, urls
+from catalog.benchmark import CATALOG_CASES, compare
+from catalog.counters import find_copy_count_mismatches
+from catalog.models import Author, Book, BookInstance
+from catalog.search import SearchResults
+from catalog.seeding import seed_catalog
+
+
+class SeedCatalogTest(TestCase):
+
+    def snapshot(self):
+        books = [(book.isbn, book.title, book.language.name, book.author.last_name, sorted(g.name for g in book.genre.all()))
+                 for book in Book.objects.order_by('pk').select_related('author', 'language').prefetch_related('genre')]
+        copies = list(BookInstance.objects.order_by('book__pk', 'id').values_list('id', 'status', 'due_back'))
+        return books, copies
+
+    def test_same_seed_same_rows(self):
+        today = datetime.date(2024, 5, 1)
+        seed_catalog(30, users=5, seed=7, today=today, batch_size=8)
+        first = self.snapshot()
+        BookInstance.objects.all().delete()
+        Book.objects.all().delete()
+        Author.objects.all().delete()
+        seed_catalog(30, users=5, seed=7, today=today, batch_size=8)
+        self.assertEqual(self.snapshot(), first)
+        #再執行一次是接著產生新的書
+        seed_catalog(30, users=5, seed=7, today=today)
+        self.assertEqual(Book.objects.count(), 60)
+        self.assertNotEqual(self.snapshot()[0][30:], first[0])
+
+    def test_derived_data(self):
+        stats = seed_catalog(200, copies_per_book=4, users=20, seed=1, batch_size=64)
+        self.assertEqual((stats.books, stats.copies), (Book.objects.count(), BookInstance.objects.count()))
+        self.assertEqual(list(find_copy_count_mismatches()), [])
+        self.assertFalse(BookInstance.objects.filter(status='o', borrower=None).exists())
+        self.assertTrue(BookInstance.objects.filter(status='o', due_back__lt=datetime.date.today()).exists())
+        word = Book.objects.order_by('pk').first().title.split()[0].lower()
+        matching = [book for book in Book.objects.all()
+                    if word in (book.title + ' ' + book.summary).lower().replace('.', '').split()]
+        self.assertEqual(SearchResults(word).count(), len(matching))
+
+    def test_command(self):
+        out = StringIO()
+        call_command('seed_catalog', '--books', '20', '--users', '3', stdout=out)
+        self.assertIn('20 books', out.getvalue())
+
+
+class BenchCatalogTest(TransactionTestCase):
+    #非同步的頁面在別的執行緒用自己的連線，資料要真的寫進db
+
+    def setUp(self):
+        #flush不會清掉全文檢索的虛擬資料表
+        search.rebuild_index()
+
+    def test_every_catalog_url_has_a_case(self):
+        names = {pattern.name for pattern in urls.urlpatterns if pattern.name}
+        self.assertEqual(names - {name.split(':')[0] for name, make in CATALOG_CASES}, set())
+
+    @override_settings(CACHES={'default': {'BACKEND': 'catalog.cache_backends.RedisCache', 'LOCATION': 'redis://fake/0',
+                                           'OPTIONS': {'CLIENT_CLASS': 'catalog.testing.FakeRedis'}}})
+    def test_shared_cache_is_not_flushed_by_default(self):
+        cache.set('other-process', 1)
+        with self.assertRaisesMessage(CommandError, '--flush-cache'):
+            call_command('bench_catalog', '--sizes', '10', '--repeat', '1', stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(cache.get('other-process'), 1)
+        self.assertEqual(Book.objects.count(), 0)
+        call_command('bench_catalog', '--only', 'index', '--repeat', '1', '--flush-cache', stdout=StringIO(),
+                     stderr=StringIO())
+        self.assertIsNone(cache.get('other-process'))
+
+    def test_json_report(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench.json')
+            call_command('bench_catalog', '--sizes', '40', '--repeat', '1', '--users', '3', '--output', path,
+                         stderr=StringIO())
+            with open(path) as f:
+                report = json.load(f)
+        self.assertIn('commit', report['meta'])
+        [run] = report['runs']
+        self.assertEqual(run['rows']['books'], 40)
+        results = {result['name']: result for result in run['results']}
+        self.assertIn('admin:catalog_book_changelist', results)
+        self.assertEqual({name for name, result in results.items() if result.get('status') != 200}, set())
+        self.assertGreater(results['books']['queries'], 0)
+        self.assertEqual([change[:2] for change in compare(report, report)][:1], [(40, 'index')])
@@ -0,0 +1,105 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from catalog.models import Author, Book
+from catalog.slowlog import append_entry, fingerprint, read_entries, top_offenders
+
+
+class FingerprintTest(SimpleTestCase):
+
+    def test_values_do_not_matter(self):
+        first = fingerprint('SELECT * FROM "catalog_book" WHERE ("id" IN (%s, %s, %s) AND "title" = \'x\') LIMIT 21')
+        second = fingerprint('SELECT *  FROM "catalog_book" WHERE ("id" IN (%s) AND "title" = \'it\'\'s\') LIMIT 5')
+        self.assertEqual(first, second)
+        self.assertEqual(first[1], 'SELECT * FROM "catalog_book" WHERE ("id" IN (...) AND "title" = ?) LIMIT ?')
+        self.assertNotEqual(first[0], fingerprint('SELECT * FROM "catalog_author"')[0])
+
+
+class SlowQueryLogTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='Ursula', last_name='Le Guin')
+        Book.objects.create(title='The Dispossessed', summary='s', isbn='1', author=author)
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.log = os.path.join(directory.name, 'slow.jsonl')
+        #門檻0：每個查詢都算慢
+        settings = override_settings(SLOW_QUERY_MS=0, SLOW_QUERY_LOG=self.log, SLOW_QUERY_LOG_SIZE=1000)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_catalog_view_queries_with_plan(self):
+        self.client.get(reverse('books'))
+        entries = read_entries()
+        self.assertTrue(entries)
+        self.assertEqual({entry['view'] for entry in entries}, {'books'})
+        book_query = next(entry for entry in entries if 'FROM "catalog_book"' in entry['statement'])
+        self.assertTrue(book_query['call_site'].startswith('catalog'))
+        self.assertTrue(book_query['plan'])
+        self.assertTrue(any('catalog_book' in line for line in book_query['plan']))
+
+    def test_admin_is_logged_other_views_are_not(self):
+        self.client.post(reverse('login'), {'username': 'nobody', 'password': 'wrong'})
+        self.assertEqual(read_entries(), [])
+        User.objects.create_superuser(username='admin', password='pw', email='admin@example.com')
+        self.client.login(username='admin', password='pw')
+        self.client.get(reverse('admin:catalog_book_changelist'))
+        self.assertIn('admin:catalog_book_changelist', {entry['view'] for entry in read_entries()})
+
+    def test_params_are_not_recorded_by_default(self):
+        self.client.get(reverse('books'))
+        self.assertEqual({entry['params'] for entry in read_entries()}, {None})
+
+    @override_settings(SLOW_QUERY_LOG_PARAMS=True)
+    def test_session_and_user_params_are_never_recorded(self):
+        User.objects.create_superuser(username='admin', password='pw', email='admin@example.com')
+        self.client.login(username='admin', password='pw')
+        self.client.get(reverse('admin:catalog_book_changelist'))
+        entries = read_entries()
+        for table in ('django_session', 'auth_user'):
+            redacted = [entry for entry in entries if '"{0}"'.format(table) in entry['statement']]
+            self.assertTrue(redacted, table)
+            self.assertEqual({(entry['params'], entry['plan']) for entry in redacted}, {(None, None)})
+        book_query = next(entry for entry in entries if 'FROM "catalog_book"' in entry['statement'])
+        self.assertIsNotNone(book_query['params'])
+
+    @override_settings(SLOW_QUERY_MS=None)
+    def test_off(self):
+        self.client.get(reverse('books'))
+        self.assertEqual(read_entries(), [])
+
+    @override_settings(SLOW_QUERY_LOG_SIZE=3)
+    def test_ring_buffer(self):
+        for i in range(10):
+            append_entry({'fingerprint': 'f{0}'.format(i % 2), 'statement': 'SELECT ?', 'ms': i, 'view': 'books'})
+        self.assertEqual([entry['ms'] for entry in read_entries()], [7, 8, 9])
+        with open(self.log) as log:
+            self.assertLessEqual(len(log.readlines()), 6)
+
+    def test_top_offenders_and_command(self):
+        for ms, statement in ((5, 'SELECT a'), (30, 'SELECT b'), (10, 'SELECT a'), (20, 'SELECT a')):
+            append_entry({'fingerprint': statement[-1], 'statement': statement, 'ms': ms, 'view': 'books',
+                          'call_site': 'catalog/views.py:1 in get', 'params': '()', 'plan': ['SCAN catalog_book']})
+        offenders = top_offenders(read_entries())
+        self.assertEqual([(o['statement'], o['count'], o['total_ms']) for o in offenders],
+                         [('SELECT a', 3, 35.0), ('SELECT b', 1, 30.0)])
+        out = StringIO()
+        call_command('slow_queries', '--json', '--limit', '1', stdout=out)
+        self.assertEqual([o['statement'] for o in json.loads(out.getvalue())], ['SELECT a'])
+        out = StringIO()
+        call_command('slow_queries', '--plan', stdout=out)
+        self.assertIn('| SCAN catalog_book', out.getvalue())
+        call_command('slow_queries', '--clear', stdout=StringIO())
+        self.assertEqual(read_entries(), [])
@@ -0,0 +1,48 @@
+from django.test import TestCase
+from django.core.cache import cache
+
+from catalog.models import Author, Book, BookInstance
+from catalog.stats import get_dashboard_counts
+
+
+class DashboardCountsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.book = Book.objects.create(title='How to test', summary='summary', isbn='ABCDEFG', author=cls.author)
+        BookInstance.objects.create(book=cls.book, imprint='Imprint', status='a')
+        BookInstance.objects.create(book=cls.book, imprint='Imprint', status='o')
+
+    def setUp(self):
+        #locmem cache不會跟著測試的transaction rollback，每個測試都要先清掉
+        cache.clear()
+
+    def test_counts(self):
+        counts = get_dashboard_counts()
+        self.assertEqual(counts, {
+            'num_books': 1,
+            'num_book_title_icontain_how': 1,
+            'num_instances': 2,
+            'num_instances_available': 1,
+            'num_authors': 1,
+        })
+
+    def test_one_query_per_group_when_cold_and_none_when_warm(self):
+        with self.assertNumQueries(3):
+            get_dashboard_counts()
+        with self.assertNumQueries(0):
+            get_dashboard_counts()
+
+    def test_save_only_recomputes_changed_group(self):
+        get_dashboard_counts()
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        with self.assertNumQueries(1):
+            counts = get_dashboard_counts()
+        self.assertEqual(counts['num_instances'], 3)
+        self.assertEqual(counts['num_instances_available'], 2)
+
+    def test_delete_invalidates(self):
+        get_dashboard_counts()
+        Author.objects.create(first_name='Jane', last_name='Doe').delete()
+        self.assertEqual(get_dashboard_counts()['num_authors'], 1)
@@ -0,0 +1,63 @@
+import json
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog.visits import COOKIE_NAME
+
+
+class VisitCounterTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', password='pw')
+        self.client.force_login(self.user)
+
+    def visits(self, times=3):
+        return [self.client.get(reverse('index')).context['num_visits'] for _ in range(times)]
+
+    def writes(self):
+        self.client.get(reverse('index'))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('index'))
+        return [query['sql'] for query in queries if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+
+    def test_engines_count(self):
+        for engine in ('session', 'cookie', 'cache'):
+            with self.subTest(engine=engine), override_settings(VISIT_COUNTER=engine):
+                self.client.cookies.pop(COOKIE_NAME, None)
+                self.client.force_login(User.objects.create_user(username=engine))
+                self.assertEqual(self.visits(), [0, 1, 2])
+
+    @override_settings(VISIT_COUNTER='session')
+    def test_session_engine_writes(self):
+        self.assertEqual(len(self.writes()), 1)
+
+    def test_cookie_and_cache_engines_do_not_write(self):
+        for engine in ('cookie', 'cache'):
+            with self.subTest(engine=engine), override_settings(VISIT_COUNTER=engine):
+                self.assertEqual(self.writes(), [])
+
+    @override_settings(VISIT_COUNTER='cookie')
+    def test_forged_cookie_is_ignored(self):
+        self.visits(2)
+        self.client.cookies[COOKIE_NAME] = '1000'
+        self.assertEqual(self.visits(1), [0])
+
+    @override_settings(VISIT_COUNTER='cache')
+    def test_async_index(self):
+        self.assertEqual(self.visits(1), [0])
+        self.assertEqual(self.client.get(reverse('async-index')).context['num_visits'], 1)
+
+    def test_bench_visits(self):
+        out = StringIO()
+        call_command('bench_visits', '--requests', '3', '--json', stdout=out)
+        results = {result['engine']: result for result in json.loads(out.getvalue())}
+        self.assertEqual(results['session']['writes_per_request'], 1)
+        self.assertEqual((results['cookie']['writes_per_request'], results['cache']['writes_per_request']), (0, 0))
@@ -1,6 +1,10 @@
-from django.urls import path
+from django.urls import path, register_converter
 from django.conf.urls import include
 from . import views
+from .converters import IdConverter
+
+#<id:pk>：跟<int:pk>一樣，但是太大的數字直接404
+register_converter(IdConverter, 'id')
 
 
 urlpatterns = [
@@ -10,8 +14,8 @@ urlpatterns = [
      #加入Books資料表的list清單網頁的url mapping
     path('books/', views.BookListView.as_view(), name='books'),
     #加入Books資料表的詳細資料網頁的url mapping
-    path('book/<int:pk>', views.BookDetailView.as_view(), name='book-detail'),
-    path('author/<int:pk>', views.AuthorDetailView.as_view(), name='author-detail'),
+    path('book/<id:pk>', views.BookDetailView.as_view(), name='book-detail'),
+    path('author/<id:pk>', views.AuthorDetailView.as_view(), name='author-detail'),
     
 
 ]
@@ -31,9 +35,15 @@ urlpatterns += [
 #圖書館管理人員限定的all borrowed books網頁
 urlpatterns += [   
     path('borrowed/', views.AllLoanedBooksListView.as_view(), name='all-borrowed'),
+    path('borrowed/overdue/', views.OverdueLoansListView.as_view(), name='overdue-borrowed'),
 ]
 
 
+#圖書館管理人員限定的 批次續借
+urlpatterns += [
+    path('book/renew/bulk/', views.bulk_renew_librarian, name='renew-books-bulk'),
+]
+
 #圖書館管理人員限定的 更新讀者書本到期日的功能(改用modelform的方式實做)
 #網址格式：/catalog/book/<bookinstance id>/renew_bymodelform/ 
 #renew_book_librarian是底線分隔，表示這是一個function-based view
@@ -46,11 +56,46 @@ urlpatterns += [
 #modelform的快速建立功能相當類似asp.net mvc的skeleton
 urlpatterns += [  
     path('author/create/', views.AuthorCreate.as_view(), name='author_create'),
-    path('author/<int:pk>/update/', views.AuthorUpdate.as_view(), name='author_update'),
-    path('author/<int:pk>/delete/', views.AuthorDelete.as_view(), name='author_delete'),
+    path('author/<id:pk>/update/', views.AuthorUpdate.as_view(), name='author_update'),
+    path('author/<id:pk>/delete/', views.AuthorDelete.as_view(), name='author_delete'),
 ]
 
 #加入Authors資料表的list清單網頁的url mapping
 urlpatterns += [   
     path('authors/', views.AuthorListView.as_view(), name='authors'),
-]
\ No newline at end of file
+]
+
+#依種類瀏覽(書單的語言篩選是?language=<id>)
+urlpatterns += [
+    path('genre/<id:pk>/', views.GenreDetailView.as_view(), name='genre-detail'),
+]
+
+#全文檢索
+urlpatterns += [
+    path('search/', views.search, name='search'),
+]
+
+#目錄匯出(限staff)
+urlpatterns += [
+    path('export/books.<str:format>', views.export_books, name='export-books'),
+]
+
+#唯讀的JSON API(mobile app與館內查詢機使用)
+from . import api
+
+urlpatterns += [
+    path('api/<str:resource>/', api.resource_list, name='api-list'),
+    path('api/<str:resource>/<str:pk>/', api.resource_detail, name='api-detail'),
+]
+
+#唯讀頁面的async版本(用ASGI部署時，同一頁互不相關的查詢會同時執行)
+from . import async_views
+
+urlpatterns += [
+    path('async/', async_views.index, name='async-index'),
+    path('async/books/', async_views.book_list, name='async-books'),
+    path('async/book/<id:pk>', async_views.book_detail, name='async-book-detail'),
+    path('async/authors/', async_views.author_list, name='async-authors'),
+    path('async/author/<id:pk>', async_views.author_detail, name='async-author-detail'),
+    path('async/search/', async_views.search, name='async-search'),
+]
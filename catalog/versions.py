@@ -0,0 +1,55 @@
+"""
+Per-model version stamps used for HTTP caching (ETag/Last-Modified) and for
+the rendered page cache in catalog/http_cache.py.
+
+A version is the time of the last change of a model, in milliseconds. It is
+bumped by the signal handlers in catalog/signals.py. Code that writes with
+QuerySet.update() or bulk_create() must call bump_versions() itself.
+"""
+import time
+
+from django.core.cache import cache
+
+VERSION_CACHE_PREFIX = 'catalog:version:'
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def _cache_key(label):
+    return VERSION_CACHE_PREFIX + label
+
+
+def user_version_label(user_id):
+    """
+    Label of the version stamp of one user (their name, groups and permissions).
+    """
+    return 'auth.user.{0}'.format(user_id)
+
+
+def get_versions(labels):
+    """
+    Returns {label: version} for model labels like 'catalog.book'.
+    A model that has no version yet (e.g. the cache was flushed) starts at the current time,
+    so a flushed cache never hands out an old version again.
+    """
+    keys = {label: _cache_key(label) for label in labels}
+    cached = cache.get_many(keys.values())
+    versions = {}
+    for label, key in keys.items():
+        if key not in cached:
+            cache.add(key, _now_ms(), None)
+            cached[key] = cache.get(key, _now_ms())
+        versions[label] = cached[key]
+    return versions
+
+
+def bump_versions(*labels):
+    """
+    Marks the given models as changed now.
+    """
+    now = _now_ms()
+    current = cache.get_many([_cache_key(label) for label in labels])
+    #同一毫秒內改了兩次，版本也要不一樣
+    cache.set_many({_cache_key(label): max(now, current.get(_cache_key(label), 0) + 1) for label in labels}, None)
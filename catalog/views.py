@@ -1,7 +1,14 @@
 from django.shortcuts import render
 
 # Create your views here.
-from .models import Book, Author, BookInstance, Genre
+from .models import Book, Author, BookInstance, Genre, Language
+from .stats import get_dashboard_counts
+from django.db.models import Prefetch
+from .pagination import KeysetPaginationMixin, KnownCountPaginator, field_value
+from .http_cache import CachedPageMixin
+from .routers import ReplicaReadsMixin, replica_reads
+from .visits import count_visit, remember_visit
+from . import facets
 
 #def index()是function-based view，因此需利用＠login_required decorator來做網頁驗證
 from django.contrib.auth.decorators import login_required
@@ -12,20 +19,15 @@ def index(request):
     View function for home page of site.
     """
     # Generate counts of some of the main objects
-    num_books=Book.objects.all().count()
-    num_instances=BookInstance.objects.all().count()
-    # Available books (status = 'a')
-    num_instances_available=BookInstance.objects.filter(status__exact='a').count()
-    num_authors=Author.objects.count()  # The 'all()' is implied by default.
-    num_book_title_icontain_how = Book.objects.filter(title__icontains = 'how').count()
+    #計數器改由catalog/stats.py統一計算並放在cache裡，cache還在的時候完全不會查db
+    counts = get_dashboard_counts()
     
-    #這是利用session來記錄訪客的來訪次數
-    # Number of visits to this view, as counted in the session variable.
-    num_visits=request.session.get('num_visits', 0)
-    request.session['num_visits'] = num_visits+1
+    #記錄訪客的來訪次數，存在哪裡由settings.VISIT_COUNTER決定(catalog/visits.py)
+    # Number of visits to this view.
+    num_visits = count_visit(request)
     
     # Render the HTML template index.html with the data in the context variable
-    return render(
+    response = render(
         request,
         #index()最後將會導向到下列這個.html檔案:index.html
         'index.html',
@@ -33,17 +35,23 @@ def index(request):
         # context={'num_books':num_books,'num_instances':num_instances,'num_instances_available':num_instances_available,'num_authors':num_authors},
         # context={'num_books':num_books,'num_instances':num_instances,'num_instances_available':num_instances_available,'num_authors':num_authors,'num_book_title_icontain_how':num_book_title_icontain_how},
         
-        #把session的num_visits變數也加進去
-        context={'num_books':num_books,'num_instances':num_instances,
-        'num_instances_available':num_instances_available,'num_authors':num_authors,
-        'num_book_title_icontain_how':num_book_title_icontain_how,'num_visits':num_visits},
+        #把num_visits變數也加進去
+        context=dict(counts, num_visits=num_visits),
     )
+    return remember_visit(request, response)
 
     #建立Book資料的List清單網頁
 from django.views import generic
 
-class BookListView(generic.ListView):
+class BookListView(ReplicaReadsMixin, CachedPageMixin, KeysetPaginationMixin, generic.ListView):
     model = Book
+    #書單上的數量是BookInstance算出來的，所以也跟bookinstance有關
+    #側欄的種類/語言名稱來自genre, language
+    cache_models = ('catalog.book', 'catalog.author', 'catalog.bookinstance', 'catalog.genre', 'catalog.language')
+    #每一列都會顯示{{book.author}}，先用select_related一起JOIN進來，避免N+1查詢
+    queryset = Book.objects.select_related('author')
+    #篩選後的總數直接用facet表的數字，不用COUNT(*)
+    paginator_class = KnownCountPaginator
     
     #等等要去哪個路徑找.html檔案
     #不定義這個template_name的話，Django就會去預設的路徑尋找.html
@@ -51,6 +59,39 @@ class BookListView(generic.ListView):
     #不過目前暫時程式碼設定路徑的方式跟預設一樣就好    
     template_name = '/locallibrary/catalog/templates/catalog/book_list.html'
 
+    #?language=<id>篩選語言；種類的篩選是GenreDetailView(/catalog/genre/<id>/)
+    genre = None
+
+    def get_language_id(self):
+        value = self.request.GET.get('language', '')
+        if not value:
+            return None
+        try:
+            return field_value(Language._meta.pk, value)
+        except ValueError:
+            raise Http404('Invalid language.')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        genre_id = self.genre.pk if self.genre else None
+        self.language_id = self.get_language_id()
+        #側欄：每個種類在目前語言的書數、每個語言在目前種類的書數，各一個查詢(catalog/facets.py)
+        self.genre_facets = facets.genre_facets(self.language_id)
+        self.language_facets = facets.language_facets(genre_id)
+        self.filtered_count = None
+        if genre_id is not None:
+            queryset = queryset.filter(genre=genre_id)
+            self.filtered_count = dict((genre.pk, books) for genre, books in self.genre_facets).get(genre_id, 0)
+        if self.language_id is not None:
+            queryset = queryset.filter(language=self.language_id)
+            if genre_id is None:
+                self.filtered_count = dict((language.pk, books) for language, books in self.language_facets).get(self.language_id, 0)
+        return queryset
+
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        return super().get_paginator(queryset, per_page, orphans, allow_empty_first_page,
+                                     count=self.filtered_count, **kwargs)
+
     #get_context_data()是用來建立自訂的Server side variable的
     #跟.Net MVC也挺像的
     def get_context_data(self, **kwargs):
@@ -58,21 +99,49 @@ class BookListView(generic.ListView):
         context = super(BookListView, self).get_context_data(**kwargs)
         # Create any data and add it to the context
         context['some_data'] = 'This is just some data'
+        language = next((language for language, books in self.language_facets if language.pk == self.language_id), None)
+        context.update({
+            'genre': self.genre,
+            'language_id': self.language_id,
+            'language': language,
+            'genre_facets': self.genre_facets,
+            'language_facets': self.language_facets,
+            #分頁的連結要帶著篩選條件
+            'filter_query': 'language={0}&'.format(self.language_id) if self.language_id is not None else '',
+        })
         return context
 
-    #這是分頁機制, 以下設定一頁的最多資料筆數 = 1
-    paginate_by = 1  
+    #這是分頁機制, 以下設定一頁的最多資料筆數 = 10
+    #(原本是1，爬整個書單就要每本書來回一次)
+    paginate_by = 10
+    #?cursor=的keyset分頁用的排序，最後一個欄位必須是唯一值
+    keyset_ordering = ('title', 'pk')
+
+
+#某個種類的書單，一樣可以用?language=再篩選語言
+class GenreDetailView(BookListView):
+
+    def get(self, request, *args, **kwargs):
+        self.genre = get_object_or_404(Genre, pk=kwargs['pk'])
+        return super().get(request, *args, **kwargs)
 
 #從db取得某本Book的明細資料
 #不需要寫什麼特殊的Query語法，Django將會自動做好binding
-class BookDetailView(generic.DetailView):
+class BookDetailView(ReplicaReadsMixin, CachedPageMixin, generic.DetailView):
     model = Book   
+    cache_models = ('catalog.book', 'catalog.author', 'catalog.language', 'catalog.genre', 'catalog.bookinstance')
+    #book_detail.html會用到author, language, genre.all, bookinstance_set.all
+    queryset = Book.objects.select_related('author', 'language').prefetch_related('genre', 'bookinstance_set')
 
-class AuthorDetailView(generic.DetailView):
+class AuthorDetailView(ReplicaReadsMixin, CachedPageMixin, generic.DetailView):
     """
     Generic class-based detail view for an author.
     """
     model = Author    
+    cache_models = ('catalog.author', 'catalog.book')
+    #author_detail.html只用到book的title跟summary
+    queryset = Author.objects.prefetch_related(
+        Prefetch('book_set', queryset=Book.objects.only('id', 'author_id', 'title', 'summary')))
 
 
 #renew_book_librarian用於讀書館員幫讀者手動更新書的到期日	
@@ -84,6 +153,7 @@ from django.urls import reverse
 import datetime
 
 from .forms import RenewBookForm
+from . import loans
 
 #加上適當的權限，限制此功能只有圖書館員可使用
 @permission_required('catalog.can_edit_all_borrowed_books')
@@ -93,7 +163,7 @@ def renew_book_librarian(request, pk):
     """
 	#執行query到db找這筆資料
     #找不到這筆資料的話，會丟出404網頁錯誤
-    book_inst=get_object_or_404(BookInstance, pk = pk)
+    book_inst=get_object_or_404(BookInstance.objects.select_related('book', 'borrower'), pk = pk)
 
 	#if post == true, 表示是user編輯完畢
     # If this is a POST request then process the Form data
@@ -107,11 +177,12 @@ def renew_book_librarian(request, pk):
         # Check if the form is valid:
         if form.is_valid():
             # process the data in form.cleaned_data as required (here we just write it to the model due_back field)
-            book_inst.due_back = form.cleaned_data['renewal_date']
-            book_inst.save()
-
-            # redirect to a new URL:
-            return HttpResponseRedirect(reverse('all-borrowed') )
+            #用條件式UPDATE續借(catalog/loans.py)，書已經被還回來的話不會蓋掉
+            result = loans.renew(book_inst.pk, form.cleaned_data['renewal_date'], actor=request.user)
+            if result:
+                # redirect to a new URL:
+                return HttpResponseRedirect(reverse('all-borrowed') )
+            form.add_error(None, result.message)
 
 	#if post == false, 表示是user初次載入這個編輯頁，僅給予一些欄位預設value而已
     #預設給讀者多三個禮拜的時間續借			
@@ -125,7 +196,7 @@ def renew_book_librarian(request, pk):
 #限制LoanedBooksByUserListView功能必須登入：LoginRequiredMixin
 from django.contrib.auth.mixins import LoginRequiredMixin
 
-class LoanedBooksByUserListView(LoginRequiredMixin,generic.ListView):
+class LoanedBooksByUserListView(LoginRequiredMixin, CachedPageMixin, KeysetPaginationMixin, generic.ListView):
     """
     Generic class-based view listing books on loan to current user. 
     """
@@ -133,22 +204,71 @@ class LoanedBooksByUserListView(LoginRequiredMixin,generic.ListView):
     #自定義.html檔案的路徑，這次不使用預設路徑了！
     template_name ='catalog/bookinstance_list_borrowed_user.html'
     paginate_by = 10
+    keyset_ordering = ('due_back', 'id')
+    #ETag跟頁面cache都是以使用者區分的，不會拿到別人的借書清單
+    cache_models = ('catalog.bookinstance', 'catalog.book')
+    cache_vary_on_date = True
     
     def get_queryset(self):
-        return BookInstance.objects.filter(borrower=self.request.user).filter(status__exact='o').order_by('due_back')
+        #逾期與否由db一起算好(annotate_overdue)，不用每一筆在Python裡判斷
+        return (BookInstance.objects.filter(borrower=self.request.user).on_loan().annotate_overdue()
+                .select_related('book').order_by('due_back'))
 
 #僅圖書館工作人員librarian可確認所有已經借出的書籍
 from django.contrib.auth.mixins import PermissionRequiredMixin
 
-class AllLoanedBooksListView(PermissionRequiredMixin, generic.ListView):
+class AllLoanedBooksListView(PermissionRequiredMixin, CachedPageMixin, KeysetPaginationMixin, generic.ListView):
     #這個系統功能需要有can_view_all_borrowed_books權限
     permission_required = 'catalog.can_view_all_borrowed_books'
     model = BookInstance
     template_name ='catalog/bookinstance_list_borrowed_all.html'
     def get_queryset(self):
         #排序order by due_back desc
-        return BookInstance.objects.filter(status__exact='o').order_by('-due_back')
+        return (BookInstance.objects.on_loan().annotate_overdue()
+                .select_related('book', 'borrower').order_by('-due_back'))
+    paginate_by = 10
+    keyset_ordering = ('-due_back', '-id')
+    #會顯示借書人的名字，所以所有使用者的資料都有關係
+    cache_models = ('catalog.bookinstance', 'catalog.book', 'auth.user')
+    cache_vary_on_date = True
+
+
+#批次續借：用copy id清單或篩選條件(借書人、到期日區間、狀態)一次續借很多本
+from .forms import BulkRenewForm
+
+@permission_required('catalog.change_bookinstance')
+def bulk_renew_librarian(request):
+    """
+    View function for renewing many BookInstances at once, with a per-copy report.
+    """
+    results = None
+    if request.method == 'POST':
+        form = BulkRenewForm(request.POST)
+        if form.is_valid():
+            results = loans.bulk_renew(form.get_queryset(), form.cleaned_data['renewal_date'], actor=request.user)
+    else:
+        form = BulkRenewForm(initial={'renewal_date': datetime.date.today() + datetime.timedelta(weeks=3)})
+
+    context = {'form': form, 'results': results}
+    if results is not None:
+        context.update(renewed=sum(1 for result in results if result), due_back=form.cleaned_data['renewal_date'])
+    return render(request, 'catalog/book_renew_bulk.html', context)
+
+#僅圖書館工作人員librarian可看的逾期清單，只會查出逾期的那幾筆
+class OverdueLoansListView(PermissionRequiredMixin, CachedPageMixin, KeysetPaginationMixin, generic.ListView):
+    """
+    Generic class-based view listing overdue loans, most overdue first.
+    """
+    permission_required = 'catalog.can_view_all_borrowed_books'
+    model = BookInstance
+    template_name = 'catalog/bookinstance_list_overdue.html'
     paginate_by = 10
+    keyset_ordering = ('due_back', 'id')
+    cache_models = ('catalog.bookinstance', 'catalog.book', 'auth.user')
+    cache_vary_on_date = True
+
+    def get_queryset(self):
+        return BookInstance.objects.overdue().annotate_overdue().select_related('book', 'borrower').order_by('due_back')
 
     #renew_book_librarian用於讀書館員幫讀者手動更新書的到期日
 #****************改用modelform的方式實做！***********
@@ -163,7 +283,7 @@ from .forms import RenewBookModelForm
 
 def renew_book_librarian_modelform(request, pk):
     
-    book_inst=get_object_or_404(BookInstance, pk = pk)
+    book_inst=get_object_or_404(BookInstance.objects.select_related('book', 'borrower'), pk = pk)
   
     if request.method == 'POST':
       
@@ -176,10 +296,10 @@ def renew_book_librarian_modelform(request, pk):
             
             #用modelform方式實做的話，與之前的差異點：欄位名稱需改成due_back
             #book_inst.due_back = form.cleaned_data['renewal_date']
-            book_inst.due_back = form.cleaned_data['due_back']
-            book_inst.save()
-            
-            return HttpResponseRedirect(reverse('all-borrowed') )
+            result = loans.renew(book_inst.pk, form.cleaned_data['due_back'], actor=request.user)
+            if result:
+                return HttpResponseRedirect(reverse('all-borrowed') )
+            form.add_error(None, result.message)
     
     else:
         proposed_renewal_date = datetime.date.today() + datetime.timedelta(weeks=3)
@@ -217,7 +337,7 @@ from django.views import generic
 
 #這是class-based views的限制網頁必須登入的作法
 from django.contrib.auth.mixins import LoginRequiredMixin
-class AuthorListView(LoginRequiredMixin, generic.ListView):
+class AuthorListView(LoginRequiredMixin, ReplicaReadsMixin, CachedPageMixin, KeysetPaginationMixin, generic.ListView):
 
 # class AuthorListView(generic.ListView):
     model = Author
@@ -225,7 +345,9 @@ class AuthorListView(LoginRequiredMixin, generic.ListView):
     #沒有要自定義的話就註解掉get_queryset()
     def get_queryset(self):
         # return Author.objects.filter(title__icontains='bike')[:5] #取前五筆資料，title包含關鍵字'bike'的
-        return Author.objects.filter()[:100] #取前100筆資料
+        # return Author.objects.filter()[:100] #取前100筆資料
+        #不再限制前100筆，改用分頁；切片過的queryset沒辦法再加keyset分頁的條件
+        return Author.objects.all()
     #等等要去哪個路徑找.html檔案
     #不定義這個template_name的話，Django就會去預設的路徑尋找.html
     #預設的路徑是：/locallibrary/catalog/templates/catalog/author_list.html
@@ -242,4 +364,49 @@ class AuthorListView(LoginRequiredMixin, generic.ListView):
         return context
 
     #這是分頁機制, 以下設定每頁最多10筆資料
-    paginate_by = 10        
\ No newline at end of file
+    paginate_by = 10
+    #跟Author.Meta.ordering一樣，再加上id讓排序唯一
+    keyset_ordering = ('last_name', 'first_name', 'id')
+    cache_models = ('catalog.author',)        
+
+#全文檢索：/catalog/search/?q=關鍵字
+#搜尋的實作(sqlite FTS5 / postgres tsvector)在catalog/search.py
+from django.core.paginator import Paginator
+from .search import SearchResults
+
+@replica_reads
+def search(request):
+    """
+    View function for the book search page (ranked, highlighted and paginated results).
+    """
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(SearchResults(query), 10)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    return render(request, 'catalog/search_results.html', {
+        'query': query,
+        'page_obj': page_obj,
+        'hits': page_obj.object_list,
+    })
+
+
+#匯出整個目錄：/catalog/export/books.ndjson 或 books.csv，可加?since=2021-06-01T00:00:00
+#用StreamingHttpResponse邊查邊送，記憶體用量不會隨著書的數量增加
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
+from .export import FORMATS, iter_book_records, parse_since
+
+@staff_member_required
+def export_books(request, format):
+    """
+    View function streaming the whole catalog (or the books changed since ?since=).
+    """
+    if format not in FORMATS:
+        raise Http404('Unknown export format.')
+    try:
+        since = parse_since(request.GET.get('since'))
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    lines, content_type = FORMATS[format]
+    response = StreamingHttpResponse(lines(iter_book_records(since=since)), content_type=content_type)
+    response['Content-Disposition'] = 'attachment; filename="books.{0}"'.format(format)
+    return response
@@ -0,0 +1,78 @@
+"""
+The "You have visited this page N times" counter of the home page.
+
+Where the count is kept depends on settings.VISIT_COUNTER:
+- 'session': in request.session, as the tutorial does it. With the
+  database session engine every visit is an UPDATE of django_session.
+  On SQLite that write takes the database lock.
+- 'cookie': in a signed cookie (salted, so it cannot be forged or copied
+  from another signed value). Nothing is written on the server.
+- 'cache': per user, with cache.incr(). Nothing is written to the
+  database, but the counts are lost when the cache is cleared.
+
+    num_visits = count_visit(request)
+    response = render(...)
+    remember_visit(request, response)
+
+`manage.py bench_visits` compares the engines on the home page.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+ENGINES = ('session', 'cookie', 'cache')
+COOKIE_NAME = 'num_visits'
+COOKIE_SALT = 'catalog.visits'
+#cookie留一年
+COOKIE_MAX_AGE = 365 * 24 * 60 * 60
+CACHE_PREFIX = 'catalog:visits:'
+
+
+def get_engine():
+    engine = getattr(settings, 'VISIT_COUNTER', 'session')
+    if engine not in ENGINES:
+        raise ValueError('VISIT_COUNTER must be one of {0}, not {1!r}.'.format(', '.join(ENGINES), engine))
+    return engine
+
+
+def _cache_visit(request):
+    key = CACHE_PREFIX + str(request.user.pk)
+    #第一次來：add成功就是0次
+    if cache.add(key, 1, timeout=None):
+        return 0
+    try:
+        return cache.incr(key) - 1
+    except ValueError:
+        #add跟incr中間剛好過期或被清掉
+        cache.set(key, 1, timeout=None)
+        return 0
+
+
+def count_visit(request):
+    """
+    Counts this visit and returns the number of earlier visits.
+    """
+    engine = get_engine()
+    if engine == 'cookie':
+        try:
+            num_visits = int(request.get_signed_cookie(COOKIE_NAME, default=0, salt=COOKIE_SALT))
+        except ValueError:
+            num_visits = 0
+        #回應的時候remember_visit()才寫進cookie
+        request._num_visits = num_visits + 1
+        return num_visits
+    if engine == 'cache':
+        return _cache_visit(request)
+    num_visits = request.session.get('num_visits', 0)
+    request.session['num_visits'] = num_visits + 1
+    return num_visits
+
+
+def remember_visit(request, response):
+    """
+    Sends the new count to the browser (only the 'cookie' engine needs the response).
+    """
+    num_visits = getattr(request, '_num_visits', None)
+    if num_visits is not None:
+        response.set_signed_cookie(COOKIE_NAME, num_visits, salt=COOKIE_SALT, max_age=COOKIE_MAX_AGE,
+                                   httponly=True, samesite='Lax', secure=request.is_secure())
+    return response
@@ -0,0 +1,18 @@
+"""
+ASGI config for locallibrary project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Run it with an ASGI server, e.g. ``uvicorn locallibrary.asgi:application``.
+The async variants of the read-only catalog views are under /catalog/async/.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'locallibrary.settings')
+
+application = get_asgi_application()
@@ -43,6 +43,12 @@ urlpatterns += [
     path('', RedirectView.as_view(url='/catalog/')),
 ]
 
+#Prometheus抓效能數據用(catalog/perf.py)
+from catalog import perf
+urlpatterns += [
+    path('metrics', perf.metrics, name='metrics'),
+]
+
 
 # Use static() to add url mapping to serve static files during development (only)
 from django.conf import settings